@@ -5,4 +5,6 @@
 # from .plugin import MacrosPlugin
 # for fixing URLS in macros
 from .context import fix_url, is_relative as is_relative_url
+# for declaring hooks that can be run in worker processes
+from .parallel import parallel_safe
 # from .util import SuperDict, SuperList
\ No newline at end of file
@@ -0,0 +1,281 @@
+"""
+Asynchronous macros (`async def`).
+
+If any macro or filter is a coroutine function, the Jinja2 environment
+is created with `enable_async`, and the pages are rendered
+on an event loop that is shared by all the pages (and by the rebuilds
+of `mkdocs serve`).
+
+Since Jinja2 awaits each call as soon as it is made, two mechanisms
+allow independent awaits to overlap:
+
+1. Within a page: the calls to async macros whose arguments are
+   constants (e.g. `{{ fetch('users') }}`) are started all together
+   at the beginning of the rendering (prefetch); when the template
+   reaches the call, it only waits for the result.
+   The calls that might not be executed (in a branch of an `if`,
+   the body of a loop or of a macro) are not prefetched.
+2. Across pages: the pages are pre-rendered as one batch
+   (concurrently), once the navigation is known.
+
+NOTE: As for parallel rendering, async macros should be free
+      of side effects: a prefetched call whose result is not used
+      (e.g. if the rendering fails) is cancelled, but it might
+      already have been executed.
+
+Laurent Franceschetti (c) 2025
+"""
+
+import asyncio
+import functools
+import contextvars
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+
+from jinja2 import Template, nodes
+
+from mkdocs_macros.cache import hash_text, LRUCache
+from mkdocs_macros.util import spooled_output
+
+
+# ------------------------------------------
+# Async macros
+# ------------------------------------------
+
+# The calls prefetched for the page being rendered:
+# {(name, args, kwargs): [tasks]}
+_PREFETCHED = ContextVar('macros_prefetched', default=None)
+
+
+def async_macro(name: str, func):
+    """
+    Wrap an async macro, so that a call that was prefetched
+    returns the task already started (which Jinja2 awaits).
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        prefetched = _PREFETCHED.get()
+        if prefetched:
+            try:
+                tasks = prefetched.get((name, args,
+                                        tuple(sorted(kwargs.items()))))
+            except TypeError:
+                # unhashable arguments
+                tasks = None
+            if tasks:
+                return tasks.pop(0)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+# The nodes whose children are not always executed:
+# {type of node: the children that are}
+_CONDITIONAL = {
+    nodes.If: ('test',),
+    nodes.CondExpr: ('test',),
+    nodes.For: ('iter',),
+    nodes.And: ('left',),
+    nodes.Or: ('left',),
+    nodes.Macro: (),
+    nodes.CallBlock: ('call',),
+}
+
+
+def executed_calls(node: nodes.Node):
+    "Iterate over the calls that are executed whenever the node is"
+    if isinstance(node, nodes.Call):
+        yield node
+    for node_type, fields in _CONDITIONAL.items():
+        if isinstance(node, node_type):
+            children = [getattr(node, field) for field in fields]
+            break
+    else:
+        children = node.iter_child_nodes()
+    for child in children:
+        yield from executed_calls(child)
+
+
+def constant_calls(ast: nodes.Template, names) -> list:
+    """
+    Find the calls to the functions in `names` whose arguments
+    are all constants, in the abstract syntax tree of a template
+    (only those that are always executed, see `executed_calls()`).
+
+    Returns a list of tuples (name, args, kwargs).
+    """
+    r = []
+    for call in executed_calls(ast):
+        if not (isinstance(call.node, nodes.Name)
+                and call.node.name in names):
+            continue
+        if call.dyn_args is not None or call.dyn_kwargs is not None:
+            continue
+        if not all(isinstance(arg, nodes.Const) for arg in call.args):
+            continue
+        if not all(isinstance(kwarg.value, nodes.Const)
+                   for kwarg in call.kwargs):
+            continue
+        args = tuple(arg.value for arg in call.args)
+        kwargs = tuple(sorted((kwarg.key, kwarg.value.value)
+                              for kwarg in call.kwargs))
+        r.append((call.node.name, args, kwargs))
+    return r
+
+
+# ------------------------------------------
+# Rendering
+# ------------------------------------------
+
+class AsyncRenderer(object):
+    """
+    Renders the pages with an async Jinja2 environment,
+    on a shared event loop (kept from one build to the next).
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.env = None
+        self.macros = {}
+        # calls with constant arguments, by checksum of source:
+        self._calls = LRUCache()
+        # results of the batch, by source path:
+        self._results = {}
+        # statistics, for the trace:
+        self.prefetched = 0
+        self.batched = 0
+        self.fallback = 0
+
+    def new_build(self, env, macros: dict):
+        """
+        Start a new build: register the async macros,
+        and return the wrappers to be used as globals.
+        """
+        if set(macros) != set(self.macros):
+            self._calls.clear()
+        self.env = env
+        self.macros = macros
+        self._results = {}
+        self.prefetched = 0
+        self.batched = 0
+        self.fallback = 0
+        return {name: async_macro(name, func)
+                for name, func in macros.items()}
+
+    def run(self, coro):
+        """
+        Run a coroutine on the shared loop, and return its result.
+
+        If the loop is already running (i.e. a macro renders
+        some markdown while a page is being rendered),
+        the coroutine runs on its own loop, in another thread
+        (with the same context variables, e.g. the current page).
+        """
+        if self.loop.is_running():
+            context = contextvars.copy_context()
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                return executor.submit(context.run, asyncio.run,
+                                       coro).result()
+        return self.loop.run_until_complete(coro)
+
+    def _constant_calls(self, source: str) -> list:
+        "The calls to async macros that can be prefetched in a source"
+        checksum = hash_text(source)
+        try:
+            return self._calls[checksum]
+        except KeyError:
+            pass
+        try:
+            calls = constant_calls(self.env.parse(source), self.macros)
+        except Exception:
+            # a syntax error will be reported by the rendering
+            calls = []
+        self._calls[checksum] = calls
+        return calls
+
+    async def render(self, template: Template, context,
+                     source: str, stream: bool = False) -> str:
+        """
+        Render a template with a layered context,
+        with the prefetch of the calls to async macros.
+
+        If `stream` is set, the chunks are written to a spooled file
+        as they are produced (for a large output).
+        """
+        prefetched = {}
+        for name, args, kwargs in self._constant_calls(source):
+            task = asyncio.ensure_future(
+                self.macros[name](*args, **dict(kwargs)))
+            prefetched.setdefault((name, args, kwargs), []).append(task)
+            self.prefetched += 1
+        token = _PREFETCHED.set(prefetched)
+        try:
+            ctx = template.new_context(context, shared=True)
+            try:
+                if stream:
+                    with spooled_output() as f:
+                        async for s in template.root_render_func(ctx):
+                            f.write(s)
+                        f.seek(0)
+                        return f.read()
+                return self.env.concat(
+                    [s async for s in template.root_render_func(ctx)])
+            except Exception:
+                return self.env.handle_exception()
+        finally:
+            _PREFETCHED.reset(token)
+            # calls not used (e.g. in a branch not taken):
+            unused = [task for tasks in prefetched.values()
+                      for task in tasks]
+            for task in unused:
+                task.cancel()
+            await asyncio.gather(*unused, return_exceptions=True)
+
+    # ----------------------------------
+    # Batch of pages
+    # ----------------------------------
+
+    def render_batch(self, jobs: dict):
+        """
+        Render a batch of pages concurrently.
+
+        Arguments:
+        - jobs: {src_path: (markdown, meta, coroutine)}
+        """
+        async def run_all():
+            return await asyncio.gather(
+                *(coro for _, _, coro in jobs.values()),
+                return_exceptions=True)
+        results = self.run(run_all())
+        for (src_path, (markdown, meta, _)), result in zip(jobs.items(),
+                                                            results):
+            if isinstance(result, BaseException):
+                continue
+            self._results[src_path] = (hash_text(markdown), meta, result)
+
+    def result(self, page, markdown: str):
+        """
+        Get the result of a page rendered in the batch,
+        or None if it must be rendered again
+        (e.g. its source or metadata modified by another plugin
+        in the meantime).
+        """
+        r = self._results.pop(page.file.src_path, None)
+        if r is None:
+            return None
+        checksum, meta, result = r
+        if checksum != hash_text(markdown) or meta != page.meta:
+            self.fallback += 1
+            return None
+        self.batched += 1
+        return result
+
+    def stats(self) -> str:
+        "Short description, for the trace"
+        return ("%s page(s) rendered in batch (%s again), "
+                "%s call(s) prefetched" %
+                (self.batched, self.fallback, self.prefetched))
+
+    def close(self):
+        "Close the event loop"
+        if not self.loop.is_closed():
+            self.loop.close()
@@ -0,0 +1,786 @@
+"""
+Caches for the mkdocs-macros engine.
+
+Compiling a page into a Jinja2 template (lexing, parsing and generating
+Python bytecode) is the most expensive step of the rendering; since
+most pages do not change from one build to the next,
+the compiled code is kept, keyed on the content of the page.
+
+The rendered pages themselves can also be kept on disk, from one build
+to the next (see the `tracking` module for their validity).
+
+Laurent Franceschetti (c) 2025
+"""
+
+import os
+import re
+import sys
+import json
+import inspect
+import time
+import pickle
+import importlib
+import functools
+from collections import OrderedDict
+from hashlib import sha1
+from types import CodeType, FunctionType, ModuleType
+
+import jinja2
+from jinja2 import Environment, Template
+from jinja2.bccache import FileSystemBytecodeCache
+
+
+# ------------------------------------------
+# Fingerprints
+# ------------------------------------------
+
+def hash_text(s: str) -> str:
+    "Return a stable hash of a string (hexadecimal)"
+    return sha1(s.encode('utf-8')).hexdigest()
+
+
+def settings_fingerprint(settings: dict) -> str:
+    """
+    Return a stable fingerprint for the settings
+    of a Jinja2 environment (markers, extensions...).
+
+    Compiled code depends on those settings, so any change
+    in them must produce a different fingerprint.
+    The version of Jinja2 is also taken into account.
+    """
+    items = sorted((str(key), repr(value)) for key, value in settings.items())
+    return hash_text(repr((jinja2.__version__, items)))
+
+
+# memory addresses in the repr() of objects are not stable:
+_ADDRESS = re.compile(r' at 0x[0-9a-fA-F]+')
+
+
+def _describe_const(const) -> str:
+    "Stable description of a constant in code"
+    if isinstance(const, CodeType):
+        return _describe_code(const)
+    elif isinstance(const, (set, frozenset)):
+        # the order of sets varies from one process to the next
+        return repr(sorted(repr(el) for el in const))
+    return repr(const)
+
+
+def _describe_code(code: CodeType) -> str:
+    "Stable description of a code object (function)"
+    consts = [_describe_const(const) for const in code.co_consts]
+    return repr((code.co_name, code.co_code.hex(), consts, code.co_names))
+
+
+# values of closures that are taken into account for functions
+# (containers, if they can be converted to json):
+_SIMPLE_TYPES = (int, float, str, bool, type(None))
+_CONTAINER_TYPES = (dict, list, tuple)
+
+
+def describe(obj) -> str:
+    """
+    Stable description of an object that cannot be converted to json:
+    for a function, its code, default arguments and the closure values
+    that can be converted to json (other objects, e.g. the plugin,
+    are ignored);
+    otherwise its repr.
+    A decorated function is described by the function it wraps.
+
+    An object whose repr contains an address (e.g. the default repr)
+    does not describe its content: it is considered as always changed
+    (the description is different at each call).
+    """
+    if callable(obj):
+        try:
+            obj = inspect.unwrap(obj)
+        except ValueError:
+            # wrapper loop
+            pass
+    code = getattr(obj, '__code__', None)
+    if isinstance(code, CodeType):
+        closure = []
+        for cell in getattr(obj, '__closure__', None) or ():
+            try:
+                value = cell.cell_contents
+            except ValueError:
+                # empty cell
+                continue
+            if isinstance(value, _SIMPLE_TYPES):
+                closure.append(value)
+            elif isinstance(value, _CONTAINER_TYPES):
+                try:
+                    closure.append(json.dumps(value, sort_keys=True))
+                except (TypeError, ValueError, RecursionError):
+                    pass
+        defaults = getattr(obj, '__defaults__', None)
+        return _ADDRESS.sub('', repr((_describe_code(code), defaults,
+                                      closure)))
+    elif isinstance(obj, (set, frozenset)):
+        return _describe_const(obj)
+    s = repr(obj)
+    if _ADDRESS.search(s):
+        return '#opaque:' + os.urandom(8).hex()
+    return s
+
+
+def fingerprint(value) -> str:
+    """
+    Return a stable fingerprint (hash) of a value, e.g. a variable
+    of the environment or a macro:
+    it changes whenever the content (or the code) changes.
+    """
+    try:
+        s = json.dumps(value, sort_keys=True, default=describe)
+    except (TypeError, ValueError, RecursionError):
+        # e.g. keys that are not strings, circular references
+        s = describe(value)
+    return hash_text(s)
+
+
+# ------------------------------------------
+# Memory
+# ------------------------------------------
+
+# Maximum size of each cache kept in memory (bytes),
+# unless specified otherwise (see `set_memory_budget()`):
+MEMORY_BUDGET = 64 * 1024 * 1024
+
+# Maximum number of objects followed to estimate the size of an entry
+# of a cache (beyond, the rest of the content is not counted):
+ESTIMATE_LIMIT = 1000
+
+# objects whose content is not counted in their size:
+_OPAQUE_TYPES = (type, ModuleType, FunctionType)
+
+
+def sizeof(obj, limit: int = None) -> int:
+    """
+    Approximate size of an object in memory, with its content
+    (bytes): the containers (dictionaries, lists, tuples, sets)
+    and code objects are followed, not the attributes of objects.
+    An object referenced several times is counted once.
+
+    If `limit` is given, at most that number of objects are counted
+    (a cheap estimate, for large objects).
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        if limit is not None and len(seen) >= limit:
+            break
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj, 0)
+        if isinstance(obj, _OPAQUE_TYPES):
+            continue
+        elif isinstance(obj, dict):
+            # NOTE: dict methods, so that lazy values are not evaluated
+            stack.extend(dict.keys(obj))
+            stack.extend(dict.values(obj))
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, CodeType):
+            stack.extend((obj.co_code, obj.co_consts, obj.co_names))
+    return total
+
+
+def format_size(n: int) -> str:
+    "Human readable size (bytes)"
+    if n < 1024:
+        return '%d B' % n
+    for unit in ('KB', 'MB', 'GB'):
+        n /= 1024
+        if n < 1024 or unit == 'GB':
+            return '%.1f %s' % (n, unit)
+
+
+class LRUCache(object):
+    """
+    Mapping kept in memory, whose total size (approximate, see `sizeof()`)
+    is bounded: the least recently used entries are evicted.
+    A value larger than the budget is not kept.
+
+    Arguments:
+    - max_bytes: maximum size (bytes); None for `MEMORY_BUDGET`
+    """
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = MEMORY_BUDGET if max_bytes is None else max_bytes
+        # {key: (size, value)}
+        self._entries = OrderedDict()
+        self.nbytes = 0
+        # statistics, for the trace:
+        self.evictions = 0
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __getitem__(self, key):
+        _, value = self._entries[key]
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def set(self, key, value, size: int = None):
+        """
+        Store a value, with its size in bytes, if known
+        (otherwise, it is estimated, see `ESTIMATE_LIMIT`).
+        """
+        self.pop(key, None)
+        if size is None:
+            size = sizeof(key, ESTIMATE_LIMIT) + sizeof(value, ESTIMATE_LIMIT)
+        if size > self.max_bytes:
+            self.rejected += 1
+            return
+        self._entries[key] = (size, value)
+        self.nbytes += size
+        self.shrink()
+
+    def __delitem__(self, key):
+        size, _ = self._entries.pop(key)
+        self.nbytes -= size
+
+    def pop(self, key, *default):
+        try:
+            size, value = self._entries.pop(key)
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        self.nbytes -= size
+        return value
+
+    def popitem(self) -> tuple:
+        "Remove the least recently used entry: (key, value)"
+        key, (size, value) = self._entries.popitem(last=False)
+        self.nbytes -= size
+        self.evictions += 1
+        return key, value
+
+    def shrink(self):
+        """
+        Evict the least recently used entries, until the cache
+        is within its budget.
+        """
+        while self.nbytes > self.max_bytes and self._entries:
+            self.popitem()
+
+    def keys(self):
+        return self._entries.keys()
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    def stats(self) -> str:
+        "Short description, for the trace"
+        return "%s entries, %s (max %s), %s evicted, %s too large" % (
+            len(self), format_size(self.nbytes),
+            format_size(self.max_bytes), self.evictions, self.rejected)
+
+
+# The caches of the process, by name (for the budget and the report):
+MEMORY_CACHES = {}
+
+
+def register_cache(name: str, cache):
+    "Register a cache of the process (returns it)"
+    MEMORY_CACHES[name] = cache
+    return cache
+
+
+def set_memory_budget(max_bytes: int):
+    """
+    Set the maximum size of each cache kept in memory
+    (registered caches, and those created from now on).
+    """
+    global MEMORY_BUDGET
+    MEMORY_BUDGET = max_bytes
+    for cache in MEMORY_CACHES.values():
+        cache.max_bytes = max_bytes
+        cache.shrink()
+
+
+# ------------------------------------------
+# Compiled templates
+# ------------------------------------------
+
+# Memory layer, shared by all instances of the plugin in the process
+# (so that it survives the rebuilds of `mkdocs serve`).
+# Keys are (settings fingerprint, checksum of source),
+# values are code objects (which are independent of the environment).
+_CODE_CACHE = register_cache('templates', LRUCache())
+
+
+class TemplateCache(object):
+    """
+    Cache for the compiled templates of pages.
+
+    It has two layers:
+
+    1. in memory (code objects, for the lifetime of the process)
+    2. on disk, if a directory is given; it uses Jinja2's bytecode
+       cache, so that the compiled pages survive from one
+       `mkdocs build` to the next. The total size of the files
+       is limited to `max_size` (bytes): the least recently used
+       are removed (at the time of `prune()`).
+
+    Templates are always rebuilt from the code for the current
+    environment, so that they see its current globals.
+
+    If `read_only` is set (e.g. in worker processes), nothing is written.
+    """
+
+    PATTERN = '__macros_%s.cache'
+
+    def __init__(self, env: Environment, settings: dict,
+                 cache_dir: str = '', max_size: int = None):
+        self.env = env
+        self.fingerprint = settings_fingerprint(settings)
+        self.directory = cache_dir
+        self.max_size = max_size
+        self.read_only = False
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.bytecode_cache = FileSystemBytecodeCache(
+                cache_dir, pattern=self.PATTERN)
+        else:
+            self.bytecode_cache = None
+        # names of the entries used, since the last prune():
+        self._used = set()
+        # statistics, for the trace:
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_code(self, source: str):
+        "Get the compiled code of a source (compile it if needed)"
+        checksum = hash_text(source)
+        key = (self.fingerprint, checksum)
+        if self.bytecode_cache:
+            self._used.add('%s:%s' % key)
+        code = _CODE_CACHE.get(key)
+        if code is not None:
+            self.hits += 1
+            return code
+        bucket = None
+        if self.bytecode_cache:
+            # the name determines the file, the checksum its validity
+            bucket = self.bytecode_cache.get_bucket(
+                self.env, '%s:%s' % key, None, source)
+            code = bucket.code
+        if code is None:
+            self.misses += 1
+            code = self.env.compile(source)
+            if bucket is not None and not self.read_only:
+                bucket.code = code
+                self.bytecode_cache.set_bucket(bucket)
+        else:
+            self.disk_hits += 1
+        _CODE_CACHE[key] = code
+        return code
+
+    def from_string(self, source: str) -> Template:
+        """
+        Equivalent of `Environment.from_string()`,
+        using the cache.
+        """
+        env = self.env
+        code = self.get_code(source)
+        return env.template_class.from_code(env, code,
+                                            env.make_globals(None))
+
+    def prune(self):
+        """
+        Remove the least recently used files on disk (by time of
+        modification, updated for the entries used since the last call),
+        if their total size exceeds `max_size`.
+        """
+        if (not self.bytecode_cache or self.read_only
+                or self.max_size is None):
+            return
+        now = time.time()
+        for name in self._used:
+            filename = os.path.join(self.directory, self.PATTERN %
+                                    self.bytecode_cache.get_cache_key(name))
+            try:
+                os.utime(filename, (now, now))
+            except OSError:
+                pass
+        self._used.clear()
+        files = []
+        for entry in os.scandir(self.directory):
+            if (entry.name.startswith('__macros_')
+                    and entry.name.endswith('.cache')):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, filename in sorted(files):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            size -= file_size
+
+    def stats(self) -> str:
+        "Short description of the usage of the cache, for the trace"
+        return ("%s compiled, %s from memory, %s from disk" %
+                (self.misses, self.hits, self.disk_hits))
+
+
+def clear_template_cache():
+    "Clear the memory layer of the template cache"
+    _CODE_CACHE.clear()
+
+
+# ------------------------------------------
+# Results of macros (memoization)
+# ------------------------------------------
+
+def _freeze(value):
+    "Hashable equivalent of a value (containers are converted)"
+    if isinstance(value, dict):
+        return ('#dict', frozenset((key, _freeze(item))
+                                   for key, item in value.items()))
+    elif isinstance(value, list):
+        return ('#list', tuple(_freeze(item) for item in value))
+    elif isinstance(value, tuple):
+        return tuple(_freeze(item) for item in value)
+    elif isinstance(value, (set, frozenset)):
+        return ('#set', frozenset(value))
+    return value
+
+
+class MemoCache(object):
+    """
+    Cache for the results of a function, keyed on its arguments.
+
+    Arguments:
+    - size: maximum number of entries (the least recently used
+      are evicted); None for unbounded
+    - ttl: time to live of an entry, in seconds; None for no limit
+    """
+
+    # returned by get() when there is no valid entry
+    MISSING = object()
+
+    def __init__(self, size: int = None, ttl: float = None,
+                 max_bytes: int = None):
+        self.size = size
+        self.ttl = ttl
+        # {key: (time of entry, value)}, bounded in bytes
+        self._entries = LRUCache(max_bytes)
+        # statistics, for the trace:
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def max_bytes(self) -> int:
+        "Maximum size of the entries (bytes)"
+        return self._entries.max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value: int):
+        self._entries.max_bytes = value
+
+    @property
+    def nbytes(self) -> int:
+        "Size of the entries (bytes)"
+        return self._entries.nbytes
+
+    def shrink(self):
+        "Evict entries, until the cache is within its budget"
+        self._entries.shrink()
+
+    @staticmethod
+    def key(args: tuple, kwargs: dict):
+        """
+        Key for the arguments of a call: dictionaries, lists and sets
+        are converted into hashable values; other objects are kept
+        as they are (so that they are compared by equality or identity).
+
+        Returns None if the arguments cannot be keyed reliably
+        (unhashable objects): the call must not be memoized.
+        """
+        try:
+            key = _freeze((args, tuple(sorted(kwargs.items()))))
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key):
+        "Return the value for a key, or MemoCache.MISSING"
+        try:
+            timestamp, value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return self.MISSING
+        if self.ttl is not None and time.monotonic() - timestamp >= self.ttl:
+            del self._entries[key]
+            self.misses += 1
+            return self.MISSING
+        self.hits += 1
+        return value
+
+    def set(self, key, value, size: int = None):
+        "Store a value (with its size in bytes, if known)"
+        self._entries.set(key, (time.monotonic(), value), size)
+        if self.size is not None:
+            while len(self._entries) > self.size:
+                self._entries.popitem()
+
+    def stats(self) -> str:
+        "Short description, for the trace"
+        return "%s hit(s), %s miss(es)" % (self.hits, self.misses)
+
+
+def cache_policy(cache) -> dict:
+    """
+    Interpret the `cache` argument of `env.macro()` or `env.filter()`:
+
+    - True: unbounded
+    - an integer: LRU with that number of entries
+    - a dictionary with `size`, `ttl` (seconds)
+      and/or `max_bytes` (by default, the memory budget of caches)
+
+    Returns the arguments for `MemoCache`.
+    """
+    if cache is True:
+        return {}
+    elif isinstance(cache, int) and not isinstance(cache, bool):
+        return {'size': cache}
+    elif isinstance(cache, dict) and set(cache) <= {'size', 'ttl',
+                                                    'max_bytes'}:
+        return dict(cache)
+    raise ValueError("Illegal value for cache of macro: %r "
+                     "(True, size or {'size': ..., 'ttl': ..., 'max_bytes': ...})" % (cache,))
+
+
+def memoize(func, cache):
+    """
+    Wrap a function (possibly async), so that its results are kept
+    according to a caching policy (see `cache_policy()`).
+
+    The `MemoCache` object is available in the `memo` attribute
+    of the wrapper.
+    """
+    memo = MemoCache(**cache_policy(cache))
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = memo.key(args, kwargs)
+            if key is None:
+                return await func(*args, **kwargs)
+            value = memo.get(key)
+            if value is MemoCache.MISSING:
+                value = await func(*args, **kwargs)
+                memo.set(key, value)
+            return value
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = memo.key(args, kwargs)
+            if key is None:
+                return func(*args, **kwargs)
+            value = memo.get(key)
+            if value is MemoCache.MISSING:
+                value = func(*args, **kwargs)
+                memo.set(key, value)
+            return value
+    wrapper.memo = memo
+    return wrapper
+
+
+# ------------------------------------------
+# Modules
+# ------------------------------------------
+
+def module_fingerprint(module) -> str:
+    """
+    Return a fingerprint of the source of a Python module
+    (for a package: all the Python files of its directory).
+    """
+    filename = getattr(module, '__file__', None)
+    if not filename:
+        return describe(module)
+    if os.path.basename(filename) == '__init__.py':
+        package_dir = os.path.dirname(filename)
+        filenames = []
+        for root, dirs, files in os.walk(package_dir):
+            dirs.sort()
+            filenames += [os.path.join(root, name)
+                          for name in sorted(files) if name.endswith('.py')]
+    else:
+        filenames = [filename]
+    h = sha1()
+    for filename in filenames:
+        try:
+            with open(filename, 'rb') as f:
+                h.update(f.read())
+        except OSError:
+            h.update(filename.encode('utf-8'))
+    return h.hexdigest()
+
+
+def _file_state(filename: str) -> tuple:
+    "State of a file: path, modification time and size (None if missing)"
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return (filename, None)
+    return (filename, stat.st_mtime_ns, stat.st_size)
+
+
+def files_fingerprint(pathnames: list) -> str:
+    """
+    Return a fingerprint of the state of files (modification time
+    and size), without reading them; for a directory,
+    all the Python files it contains.
+    """
+    state = []
+    for pathname in pathnames:
+        if os.path.isdir(pathname):
+            for root, dirs, files in os.walk(pathname):
+                dirs.sort()
+                state += [_file_state(os.path.join(root, name))
+                          for name in sorted(files) if name.endswith('.py')]
+        else:
+            state.append(_file_state(pathname))
+    return hash_text(repr(state))
+
+
+# ------------------------------------------
+# Rendered pages (on disk)
+# ------------------------------------------
+
+# Possible compressions for the files: module with the compress
+# and decompress functions (imported when used)
+COMPRESSION = {
+    'none': None,
+    'zlib': 'zlib',
+    'lzma': 'lzma',
+}
+
+
+class OutputCache(object):
+    """
+    Cache on disk for objects (typically the rendered pages),
+    from one build to the next.
+
+    The total size of the files is limited (in bytes):
+    when it is exceeded, the least recently used entries are evicted
+    (at the time of `flush()`).
+
+    If `read_only` is set (e.g. in worker processes), nothing is written.
+    """
+
+    INDEX = 'index.json'
+
+    def __init__(self, directory: str, max_size: int,
+                 compression: str = 'zlib'):
+        try:
+            module = COMPRESSION[compression]
+        except KeyError:
+            raise ValueError("Illegal value for cache compression '%s' %s" %
+                             (compression, tuple(COMPRESSION)))
+        if module is None:
+            self._compress = self._decompress = bytes
+        else:
+            module = importlib.import_module(module)
+            self._compress, self._decompress = (module.compress,
+                                                module.decompress)
+        self.directory = directory
+        self.max_size = max_size
+        self.read_only = False
+        os.makedirs(directory, exist_ok=True)
+        # for each entry: [size, time of last use]
+        try:
+            with open(os.path.join(directory, self.INDEX)) as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+
+    def _filename(self, name: str) -> str:
+        return os.path.join(self.directory, name + '.cache')
+
+    def get(self, name: str):
+        "Get an object (None if not found)"
+        if name not in self._index:
+            return None
+        try:
+            with open(self._filename(name), 'rb') as f:
+                obj = pickle.loads(self._decompress(f.read()))
+        except Exception:
+            # missing or unreadable (e.g. other compression)
+            self.discard(name)
+            return None
+        self._index[name][1] = time.time()
+        return obj
+
+    def set(self, name: str, obj):
+        "Store an object"
+        if self.read_only:
+            return
+        data = self._compress(pickle.dumps(obj))
+        filename = self._filename(name)
+        # write, then replace (in case of concurrent builds):
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_filename, filename)
+        self._index[name] = [len(data), time.time()]
+
+    def discard(self, name: str):
+        "Remove an object"
+        if self.read_only:
+            return
+        if self._index.pop(name, None) is not None:
+            try:
+                os.remove(self._filename(name))
+            except OSError:
+                pass
+
+    @property
+    def size(self) -> int:
+        "Total size of the files (bytes)"
+        return sum(size for size, _ in self._index.values())
+
+    def flush(self):
+        """
+        Evict the least recently used entries, if the size
+        is exceeded, and save the index.
+        """
+        if self.read_only:
+            return
+        size = self.size
+        if size > self.max_size:
+            by_age = sorted(self._index.items(), key=lambda item: item[1][1])
+            for name, (entry_size, _) in by_age:
+                if size <= self.max_size:
+                    break
+                self.discard(name)
+                size -= entry_size
+        with open(os.path.join(self.directory, self.INDEX), 'w') as f:
+            json.dump(self._index, f)
@@ -16,16 +16,20 @@ import platform
 import traceback
 from importlib.metadata import version as package_version
 import datetime
-from dateutil.parser import parse as date_parse
 from functools import partial
+from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
 
 import mkdocs
-from mkdocs.structure.nav import get_navigation
 from mkdocs.structure.files import File
 from mkdocs.utils import normalize_url
 import jinja2
 from jinja2 import Template
-from markdown import markdown
+
+from mkdocs_macros.git_index import get_git_index
+from mkdocs_macros.cache import LRUCache, register_cache
+from mkdocs_macros.tracking import uncacheable
+from mkdocs_macros.util import trace
 
 
 # ---------------------------------
@@ -37,6 +41,9 @@ SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Name of the package (for version)
 PACKAGE_NAME = 'mkdocs-macros-plugin'
 
+# Index of the git history by file (in the cache directory)
+GIT_INDEX_FILE = 'git_index.json'
+
 # ---------------------------------
 # Documentation utilities
 # ---------------------------------
@@ -85,6 +92,7 @@ def format_value(value):
         # we interpret the markdown in the docstring,
         # since both jinja2 and ourselves use markdown,
         # and we need to produce a HTML table:
+        from markdown import markdown
         docstring = markdown(docstring)
         try:
             varnames = ', '.join(value.__code__.co_varnames)
@@ -132,63 +140,197 @@ def make_html(rows, header=[], tb_class='macros-tb'):
     return templ.render(locals())
 
 
+# Fields of the last commit, obtained with a single `git log -1`
+# (separated by the unit separator character)
+GIT_LOG_FIELDS = {
+    'commit': '%H',
+    'short_commit': '%h',
+    'author': '%an',
+    'author_email': '%ae',
+    'committer': '%cn',
+    'committer_email': '%ce',
+    # %cd is the commit date
+    'date_ISO': '%cd',
+    'message': '%B',
+    # same as the output of `git log -1` (must be last, because of %w):
+    'raw': 'commit %H%nAuthor: %an <%ae>%nDate:   %ad%n%n%w(0,4,4)%B',
+}
+GIT_LOG_SEPARATOR = '\x1f'
+
+# Other commands, run concurrently
+GIT_COMMANDS = {
+    'tag': ['git', 'describe', '--tags'],
+    # With --abbrev set to 0, git will find the closest tagname without any suffix
+    'short_tag': ['git', 'describe', '--tags', '--abbrev=0'],
+    'root_dir': ['git', 'rev-parse', '--show-toplevel']
+}
+
+# The results of get_git_info(), by state of the repository
+_GIT_INFO_CACHE = register_cache('git', LRUCache())
+
+
+def find_git_dir(path: str = ''):
+    """
+    Find the git directory of the repository containing a path
+    (by default the current directory), without calling git.
+    Returns None if not found.
+    """
+    path = os.path.abspath(path or os.getcwd())
+    while True:
+        dot_git = os.path.join(path, '.git')
+        if os.path.isdir(dot_git):
+            return dot_git
+        elif os.path.isfile(dot_git):
+            # worktree or submodule: "gitdir: <path>"
+            try:
+                with open(dot_git) as f:
+                    content = f.read().strip()
+            except OSError:
+                return None
+            if content.startswith('gitdir:'):
+                return os.path.join(path, content[len('gitdir:'):].strip())
+            return None
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def git_state(git_dir: str):
+    """
+    Key of the state of a repository, for the cache of get_git_info():
+    the HEAD ref (and the commit it points to), and the modification
+    times of the git directory and the tags.
+    Returns None if it cannot be determined.
+    """
+    key = []
+    try:
+        with open(os.path.join(git_dir, 'HEAD')) as f:
+            head = f.read().strip()
+        key.append(head)
+        if head.startswith('ref:'):
+            ref_file = os.path.join(git_dir, head[len('ref:'):].strip())
+            if os.path.isfile(ref_file):
+                with open(ref_file) as f:
+                    key.append(f.read().strip())
+        for name in ('', 'packed-refs', os.path.join('refs', 'tags')):
+            filename = os.path.join(git_dir, name)
+            if os.path.exists(filename):
+                key.append(os.stat(filename).st_mtime_ns)
+    except OSError:
+        return None
+    return (os.path.abspath(git_dir), tuple(key))
+
+
+def run_git_command(command: list) -> str:
+    """
+    Run a git command and return its output.
+    In case of error, return an empty string (error 128: generally
+    not a repo or no tag) or an error message.
+    It raises FileNotFoundError if git is not installed.
+    """
+    # NOTE: The 'text' argument is clearer,
+    #       but for Python < 3.7, only `universal_newlines`
+    #       is accepted
+    try:
+        return subprocess.check_output(command,
+                                       universal_newlines=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except subprocess.CalledProcessError as e:
+        if e.returncode == 128:
+            # generally means "unexpected error"
+            # git status (no repo),
+            # git tag (no tag)
+            return ''
+        else:
+            # should be 1, type whatever that is
+            return "# Cannot execute '%s': %s" % (command, e)
+
+
 def get_git_info():
     """
-    Get the abbreviated commit version (not provided by get_git_info())
+    Get the information on the last commit and the repository.
     Returns a dictionary
+
+    The fields of the last commit are obtained with a single `git log`,
+    the other commands are run concurrently; the result is kept
+    as long as the state of the repository (HEAD, tags) does not change.
     """
-    LAST_COMMIT = ['git', 'log', '-1']
-    COMMANDS = {
-        'short_commit': ['git', 'rev-parse', '--short', 'HEAD'],
-        'commit': ['git', 'rev-parse', 'HEAD'],
-        'tag': ['git', 'describe', '--tags'],
-        # With --abbrev set to 0, git will find the closest tagname without any suffix
-        'short_tag': ['git', 'describe', '--tags', '--abbrev=0'],
-        'author': LAST_COMMIT + ["--pretty=format:%an"],
-        'author_email': LAST_COMMIT + ["--pretty=format:%ae"],
-        'committer': LAST_COMMIT + ["--pretty=format:%cn"],
-        'committer_email': LAST_COMMIT + ["--pretty=format:%ce"],
-        # %cd is the commit date
-        'date_ISO': LAST_COMMIT + ['--pretty=format:%cd'],
-        'message': LAST_COMMIT + ["--pretty=format:%B"],
-        'raw': LAST_COMMIT,
-        'root_dir': ['git', 'rev-parse', '--show-toplevel']
-    }
+    git_dir = find_git_dir()
+    key = git_state(git_dir) if git_dir else None
+    if key is not None and key in _GIT_INFO_CACHE:
+        return deepcopy(_GIT_INFO_CACHE[key])
 
     # always return a date, even in case of failure
     r = {'status': False, 'date': None}
+    log_command = ['git', 'log', '-1', '--pretty=format:' +
+                   GIT_LOG_SEPARATOR.join(GIT_LOG_FIELDS.values())]
+    commands = dict(GIT_COMMANDS, log=log_command)
     try:
-        for var, command in COMMANDS.items():
-            # NOTE: The 'text' argument is clearer,
-            #       but for Python < 3.7, only `universal_newlines`
-            #       is accepted
-            try:
-                r[var] = subprocess.check_output(command,
-                                                 universal_newlines=True,
-                                                 stderr=subprocess.DEVNULL).strip()
-                if var == 'date_ISO':
-                    r['date'] = date_parse(r[var])
-                r['status'] = True
-            except subprocess.CalledProcessError as e:
-                if e.returncode == 128:
-                    # generally means "unexpected error"
-                    # git status (no repo),
-                    # git tag (no tag)
-                    r[var] = ''
-                else:
-                    # should be 1, type whatever that is
-                    r[var] = "# Cannot execute '%s': %s" % (command, e)
-            except Exception as e:
-                # any other error, it's probably meaningless at this point
-                r[var] = "# Unexpected error '%s': %s" % (command, e)
-        # convert
-        return r
+        with ThreadPoolExecutor(max_workers=len(commands)) as executor:
+            futures = {var: executor.submit(run_git_command, command)
+                       for var, command in commands.items()}
+            outputs = {}
+            for var, future in futures.items():
+                try:
+                    outputs[var] = future.result()
+                except FileNotFoundError:
+                    raise
+                except Exception as e:
+                    # any other error, it's probably meaningless at this point
+                    outputs[var] = ("# Unexpected error '%s': %s" %
+                                    (commands[var], e))
     except FileNotFoundError as e:
         # not git command
-        return r.update(
+        r.update(
             {'status': False,
              'diagnosis': 'Git command not found',
              'error': str(e)})
+        return r
+    # fields of the last commit:
+    log = outputs.pop('log')
+    values = log.split(GIT_LOG_SEPARATOR)
+    if len(values) == len(GIT_LOG_FIELDS):
+        for var, value in zip(GIT_LOG_FIELDS, values):
+            r[var] = value.strip()
+        r['status'] = True
+        from dateutil.parser import parse as date_parse
+        try:
+            r['date'] = date_parse(r['date_ISO'])
+        except (ValueError, OverflowError):
+            pass
+    else:
+        # no repository, or error message
+        for var in GIT_LOG_FIELDS:
+            r[var] = log
+    for var, value in outputs.items():
+        r[var] = value
+        if value and not value.startswith('#'):
+            r['status'] = True
+    if key is not None:
+        _GIT_INFO_CACHE[key] = deepcopy(r)
+    return r
+
+
+def get_environment():
+    """
+    Get data on the environment (versions)
+    Returns a dictionary (or an error message)
+    """
+    try:
+        return {
+            'system': system_name(),
+            'system_version': system_version(),
+            'python_version': python_version(),
+            'mkdocs_version': mkdocs.__version__,
+            'macros_plugin_version': package_version(PACKAGE_NAME),
+            'jinja2_version': jinja2.__version__,
+            # 'site_git_version': site_git_version(),
+        }
+    except Exception as e:
+        # Avoid breaking the system if error in reading the system info:
+        return ("<i><b>Cannot read system info!</b> %s: %s</i>" %
+                (type(e).__name__, str(e)))
 
 
 def python_version():
@@ -281,33 +423,106 @@ def fix_url(url):
 # ---------------------------------
 
 
+def project_git_index(env):
+    """
+    Get the git index of the project (by file), which will be
+    checked again for new commits when first queried.
+    """
+    cache_dir = env.config['cache_dir']
+    index = get_git_index(env.project_dir,
+        os.path.join(env.project_dir, cache_dir, GIT_INDEX_FILE)
+        if cache_dir else '')
+    # a worker process must not write the shared caches:
+    index.read_only = env._worker
+    return index
+
+
 def define_env(env):
     """
     This is the hook for declaring variables, macros and filters
     """
 
-    # Get data on the environment (versions)
-    try:
-        environment = {
-            'system': system_name(),
-            'system_version': system_version(),
-            'python_version': python_version(),
-            'mkdocs_version': mkdocs.__version__,
-            'macros_plugin_version': package_version(PACKAGE_NAME),
-            'jinja2_version': jinja2.__version__,
-            # 'site_git_version': site_git_version(),
-        }
-    except Exception as e:
-        # Avoid breaking the system if error in reading the system info:
-        environment = ("<i><b>Cannot read system info!</b> %s: %s</i>" %
-                       (type(e).__name__, str(e)))
-    env.variables['environment'] = environment
+    # Data on the environment (versions), computed if used:
+    env.variables.lazy('environment', get_environment)
 
     # configuration of the plugin, in the yaml file:
     env.variables['plugin'] = env.config
 
-    # git information:
-    env.variables['git'] = get_git_info()
+    # git information, computed if used:
+    env.variables.lazy('git', get_git_info)
+
+    # git information by file (the index is built when first used):
+    git_index = project_git_index(env)
+
+    @env.macro
+    def git_file_info(path: str = ''):
+        """
+        *Default Mkdocs-Macro*: Get the git information on a file:
+        last commit, author, date, date of creation, number of commits.
+        The path is relative to the docs directory
+        (by default, the current page).
+        """
+        # the history is not a dependency that can be tracked:
+        uncacheable()
+        if path:
+            path = os.path.join(env.conf['docs_dir'], path)
+        else:
+            path = env.page.file.abs_src_path
+        return git_index.get(path)
+
+    # data sources, in a SQLite database (loaded again if modified):
+    cache_dir = env.config['cache_dir']
+    if env.config['data_sources']:
+        from mkdocs_macros.sources import get_database, DATABASE_FILE
+        if cache_dir and env._worker:
+            # loaded by the main process; not written by the workers:
+            database = get_database(
+                os.path.join(env.project_dir, cache_dir, DATABASE_FILE),
+                read_only=True)
+            loaded = {}
+        else:
+            database = get_database(
+                os.path.join(env.project_dir, cache_dir, DATABASE_FILE)
+                if cache_dir else ':memory:')
+            loaded = database.update(env.config['data_sources'],
+                                     env.project_dir)
+        for name, (count, duration) in loaded.items():
+            trace("Data source '%s':" % name,
+                  "unchanged" if count is None else
+                  "%s row(s) loaded (%.3f s)" % (count, duration))
+        # in the closure, so that the pages that query the data
+        # are rendered again when it changes (incremental rendering):
+        data_version = database.version
+
+        @env.macro
+        def query(sql: str, **params):
+            """
+            *Default Mkdocs-Macro*: Query the data sources (SQL),
+            with named parameters (e.g. `:category`);
+            the rows are read when iterated.
+            """
+            return database.query(sql, params, data_version)
+
+    @env.macro
+    def rows(source: str, columns: list = None, where: dict = None,
+             limit: int = None):
+        """
+        *Default Mkdocs-Macro*: Read the rows of a CSV or JSON Lines file
+        (a data source, or a path relative to the project),
+        as they are iterated; with the columns to keep
+        and the conditions on the rows (e.g. `{'category': 'tools'}`).
+        """
+        from mkdocs_macros.sources import source_spec, Rows
+        # the content of the file is not a dependency that can be tracked:
+        uncacheable()
+        sources = env.config['data_sources']
+        if source in sources:
+            spec = source_spec(source, sources[source])
+            filename, file_format = spec['file'], spec['format']
+        else:
+            filename, file_format = source, ''
+        return Rows(os.path.join(env.project_dir, filename), columns=columns,
+                    where=where, limit=limit, file_format=file_format)
 
     def render_file(filename):
         """
@@ -381,6 +596,8 @@ def define_env(env):
         To get the year use `now().year`, for the month number 
         `now().month`, etc.
         """
+        # the page must be rendered at each build:
+        uncacheable()
         return datetime.datetime.now()
 
     # add fix url function as macro
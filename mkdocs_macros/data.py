@@ -0,0 +1,267 @@
+"""
+Loading of the data files (`include_yaml` parameter).
+
+- The C parser of PyYAML (libyaml) is used, if available.
+- The parsed content of each file is kept in memory (for the rebuilds
+  of `mkdocs serve`), and optionally on disk (in the cache directory,
+  pickled), keyed on the path, modification time and size of the file.
+- If several large files must be parsed, they are parsed concurrently,
+  by worker processes.
+- A file mounted under a key can also be mounted lazily (`lazy_yaml`
+  parameter): only its top-level keys are indexed, and each subtree
+  is parsed when it is first accessed (see `LazyYaml`).
+
+Laurent Franceschetti (c) 2025
+"""
+
+import os
+import time
+from collections.abc import Mapping
+
+import yaml
+try:
+    # libyaml
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+from mkdocs_macros.cache import hash_text, MemoCache, LRUCache, register_cache
+
+
+# Parsing with several processes is worth it only above that total size
+# of the files to parse (bytes), since starting the processes and sending
+# back the content costs seconds (measured: no gain for 2 files of 8 MB
+# on one processor, a loss for 2 files of 0.8 MB):
+PARALLEL_MIN_SIZE = 32 * 1024 * 1024
+
+# The content of the files parsed, by absolute path: (key, content),
+# where key is the state of the file (see file_key());
+# the size of the file is the estimate of the size of the content.
+_YAML_CACHE = register_cache('yaml', LRUCache())
+
+
+def file_key(filename: str) -> tuple:
+    "Key of the state of a file: absolute path, modification time, size"
+    stat = os.stat(filename)
+    return (os.path.abspath(filename), stat.st_mtime_ns, stat.st_size,
+            SafeLoader.__name__)
+
+
+def parse_yaml(filename: str):
+    "Parse a YAML file; return its content and the time it took (s)"
+    start = time.perf_counter()
+    with open(filename, encoding="utf-8") as f:
+        # NOTE: for the SafeLoader argument, see: https://github.com/yaml/pyyaml/wiki/PyYAML-yaml.load(input)-Deprecation
+        content = yaml.load(f, Loader=SafeLoader)
+    return content, time.perf_counter() - start
+
+
+def available_cpus() -> int:
+    "Number of processors that this process can use"
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # not available on all platforms
+        return os.cpu_count() or 1
+
+
+def parse_yaml_files(filenames: list, workers: int = 0) -> dict:
+    """
+    Parse YAML files with a pool of processes;
+    return {filename: (content, time in s)}.
+
+    If the processes cannot be started (e.g. the main module
+    cannot be imported again), the files are parsed by this process.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+    context = multiprocessing.get_context('spawn')
+    max_workers = min(len(filenames), workers or available_cpus())
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 mp_context=context) as executor:
+            return dict(zip(filenames, executor.map(parse_yaml, filenames)))
+    except (BrokenProcessPool, OSError):
+        return {filename: parse_yaml(filename) for filename in filenames}
+
+
+def load_yaml_files(filenames: list, store=None, workers: int = 0) -> dict:
+    """
+    Load YAML files, using the caches.
+
+    Arguments:
+    - filenames: the (existing) files to load
+    - store: an `OutputCache` object, to keep the content
+      on disk (optional)
+    - workers: maximum number of processes for parsing
+      (0: number of processors)
+
+    Returns a dictionary {filename: (content, time in s, origin)},
+    where origin is 'memory', 'disk' or 'parsed'.
+    """
+    r = {}
+    to_parse = {}
+    for filename in filenames:
+        if filename in r or filename in to_parse:
+            continue
+        start = time.perf_counter()
+        key = file_key(filename)
+        cached = _YAML_CACHE.get(key[0])
+        if cached is not None and cached[0] == key:
+            r[filename] = (cached[1], time.perf_counter() - start, 'memory')
+            continue
+        if store is not None:
+            content = store.get(hash_text(repr(key)))
+            if content is not None:
+                _YAML_CACHE.set(key[0], (key, content), size=key[2])
+                r[filename] = (content, time.perf_counter() - start, 'disk')
+                continue
+        to_parse[filename] = key
+    # parse the rest (concurrently, if worth it):
+    total_size = sum(key[2] for key in to_parse.values())
+    if (len(to_parse) > 1 and total_size >= PARALLEL_MIN_SIZE
+            and available_cpus() > 1):
+        results = parse_yaml_files(list(to_parse), workers)
+    else:
+        results = {filename: parse_yaml(filename) for filename in to_parse}
+    for filename, key in to_parse.items():
+        content, duration = results[filename]
+        _YAML_CACHE.set(key[0], (key, content), size=key[2])
+        if store is not None:
+            store.set(hash_text(repr(key)), content)
+        r[filename] = (content, duration, 'parsed')
+    return r
+
+
+# ------------------------------------------
+# Lazy mount of a file
+# ------------------------------------------
+
+# The indexes of the top-level keys of files, by key (see file_key())
+_YAML_INDEXES = register_cache('yaml_indexes', LRUCache())
+
+# The subtrees loaded, by (key of the file, top-level key);
+# the least recently used are evicted:
+SUBTREES = register_cache('yaml_subtrees', MemoCache(size=32))
+
+
+def index_yaml(filename: str):
+    """
+    Index the top-level keys of a YAML file, without loading it:
+    {key: (start, end, column)}, where start and end are offsets (bytes)
+    of the value in the file, and column is the column of its start.
+
+    Returns None if the file cannot be loaded by parts
+    (not a mapping, several documents, non-string keys, anchors).
+    """
+    key = file_key(filename)
+    try:
+        return _YAML_INDEXES[key]
+    except KeyError:
+        pass
+    with open(filename, encoding="utf-8") as f:
+        text = f.read()
+    index = {}
+    # position of the last mark, in characters and bytes:
+    position = [0, 0]
+
+    def offset(mark) -> int:
+        "Convert the index of a mark (characters) into bytes"
+        position[1] += len(text[position[0]:mark.index].encode('utf-8'))
+        position[0] = mark.index
+        return position[1]
+
+    depth = 0
+    documents = 0
+    name = None
+    start = None
+    for event in yaml.parse(text, Loader=SafeLoader):
+        if isinstance(event, yaml.AliasEvent) or getattr(event, 'anchor',
+                                                          None):
+            return None
+        elif isinstance(event, yaml.DocumentStartEvent):
+            documents += 1
+            if documents > 1:
+                return None
+            continue
+        elif isinstance(event, (yaml.StreamStartEvent, yaml.StreamEndEvent,
+                                yaml.DocumentEndEvent)):
+            continue
+        if depth == 0 and not isinstance(event, yaml.MappingStartEvent):
+            # the document is not a mapping
+            return None
+        if depth == 1 and not isinstance(event, yaml.MappingEndEvent):
+            if name is None:
+                # key of the top-level mapping
+                if not (isinstance(event, yaml.ScalarEvent)
+                        and isinstance(yaml.load(text[event.start_mark.index:
+                                                      event.end_mark.index],
+                                                 Loader=SafeLoader), str)):
+                    return None
+                name = event.value
+            elif start is None:
+                start = (offset(event.start_mark), event.start_mark.column)
+        if isinstance(event, yaml.CollectionStartEvent):
+            depth += 1
+        elif isinstance(event, yaml.CollectionEndEvent):
+            depth -= 1
+        if depth == 1 and start is not None:
+            # end of a value
+            index[name] = (start[0], offset(event.end_mark), start[1])
+            name = start = None
+    _YAML_INDEXES[key] = index
+    return index
+
+
+def load_subtree(filename: str, start: int, end: int, column: int):
+    "Load the value at that place in a YAML file (see `index_yaml()`)"
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+    # the first line keeps its indentation:
+    return yaml.load(' ' * column + text, Loader=SafeLoader)
+
+
+class LazyYaml(Mapping):
+    """
+    Content of a YAML file (a mapping), whose subtrees
+    are loaded when first accessed, and kept in the cache
+    `SUBTREES` (from which they can be evicted).
+
+    It is read only; in templates, it can be used as a dictionary,
+    e.g. `{{ catalog.products[0].name }}`.
+    """
+
+    def __init__(self, filename: str, index: dict):
+        self.filename = filename
+        self.index = index
+        self.file_key = file_key(filename)
+
+    def __getitem__(self, name):
+        start, end, column = self.index[name]
+        value = SUBTREES.get((self.file_key, name))
+        if value is MemoCache.MISSING:
+            value = load_subtree(self.filename, start, end, column)
+            SUBTREES.set((self.file_key, name), value, size=end - start)
+        return value
+
+    def __getattr__(self, name):
+        "Allow dot notation, as for the other variables"
+        if name.startswith('_') or name in ('filename', 'index', 'file_key'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError("Cannot find attribute '%s'" % name)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __repr__(self):
+        # stable, and modified with the file (for dependency tracking):
+        path, mtime, size, _ = self.file_key
+        return "<LazyYaml %s (%s, %s)>" % (path, mtime, size)
@@ -0,0 +1,210 @@
+"""
+Index of the git history, by file (for the `git_file_info()` macro).
+
+The index is built with a single `git log --name-only` command,
+whose output is read as a stream: for each file, it records the last
+commit that modified it, the date of the first one and the number
+of commits.
+
+It can be kept in a file (in the cache directory), so that
+the next builds only read the commits made since then.
+
+Laurent Franceschetti (c) 2025
+"""
+
+import os
+import json
+import subprocess
+from datetime import datetime
+
+
+# Fields of each commit (separated by the unit separator character);
+# each commit starts with the record separator character:
+COMMIT_FIELDS = ('commit', 'short_commit', 'author', 'author_email',
+                 'date_ISO', 'message')
+COMMIT_FORMAT = '%x1e' + '%x1f'.join(('%H', '%h', '%an', '%ae', '%cI', '%s'))
+
+# Version of the format of the file
+INDEX_VERSION = 1
+
+# The indexes, by (directory, filename), kept for the rebuilds
+# of `mkdocs serve`
+_INDEXES = {}
+
+
+def run_git(root_dir: str, *args) -> str:
+    "Run a git command in a directory, and return its output (or None)"
+    try:
+        return subprocess.check_output(['git'] + list(args), cwd=root_dir,
+                                       universal_newlines=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+
+class GitIndex(object):
+    """
+    Index of the git history of the files of a repository.
+
+    Arguments:
+    - path: a directory in the repository (e.g. the project directory)
+    - filename: file where the index is kept between builds
+      (optional)
+
+    If `read_only` is set (e.g. in worker processes), the file
+    is not written.
+    """
+
+    def __init__(self, path: str, filename: str = ''):
+        self.path = os.path.abspath(path)
+        self.filename = filename
+        self.read_only = False
+        self.root_dir = None
+        # the last commit read:
+        self.head = None
+        # {path relative to root: {field: value, 'created': ..., 'commits': n}}
+        self.files = {}
+        self._loaded = False
+        # statistics, for the trace:
+        self.commits_read = 0
+
+    # ----------------------------------
+    # Building
+    # ----------------------------------
+
+    def _read_log(self, revisions: str):
+        "Read the log (newest first) and update the index"
+        command = ['git', '-c', 'core.quotepath=off', 'log',
+                   '--name-only', '--format=' + COMMIT_FORMAT, revisions, '--']
+        # files seen in this log (the first commit is the latest),
+        # and those that were not in the index before:
+        seen = set()
+        new_files = set()
+        commit = None
+        with subprocess.Popen(command, cwd=self.root_dir,
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL,
+                              universal_newlines=True,
+                              encoding='utf-8') as process:
+            for line in process.stdout:
+                line = line.rstrip('\n')
+                if line.startswith('\x1e'):
+                    commit = dict(zip(COMMIT_FIELDS,
+                                      line[1:].split('\x1f')))
+                    self.commits_read += 1
+                elif line and commit is not None:
+                    if line not in seen:
+                        seen.add(line)
+                        if line not in self.files:
+                            new_files.add(line)
+                        self._add_last(line, commit)
+                    elif line in new_files:
+                        # an older commit
+                        self.files[line]['created'] = commit['date_ISO']
+                    self.files[line]['commits'] += 1
+        return process.returncode == 0
+
+    def _add_last(self, name: str, commit: dict):
+        "Record the last commit that modified a file"
+        entry = self.files.get(name)
+        if entry is None:
+            self.files[name] = dict(commit, created=commit['date_ISO'],
+                                    commits=0)
+        else:
+            entry.update(commit)
+
+    def _load(self):
+        "Load the index from the file (if any)"
+        if not self.filename or not os.path.isfile(self.filename):
+            return
+        try:
+            with open(self.filename, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (data.get('version') == INDEX_VERSION
+                and data.get('root_dir') == self.root_dir):
+            self.head = data['head']
+            self.files = data['files']
+
+    def _save(self):
+        "Save the index in the file (if any)"
+        if not self.filename or self.read_only:
+            return
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        data = {'version': INDEX_VERSION, 'root_dir': self.root_dir,
+                'head': self.head, 'files': self.files}
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_filename, self.filename)
+
+    def update(self):
+        """
+        Build or update the index: only the commits made since
+        the last update are read.
+        """
+        self._loaded = True
+        if self.root_dir is None:
+            self.root_dir = run_git(self.path, 'rev-parse', '--show-toplevel')
+            if not self.root_dir:
+                # not a repository
+                return
+            self._load()
+        head = run_git(self.root_dir, 'rev-parse', 'HEAD')
+        if not head or head == self.head:
+            return
+        if self.head and run_git(self.root_dir, 'merge-base',
+                                 '--is-ancestor', self.head, head) is not None:
+            revisions = '%s..%s' % (self.head, head)
+        else:
+            # first time, or history rewritten
+            self.files = {}
+            revisions = head
+        if self._read_log(revisions):
+            self.head = head
+            self._save()
+        else:
+            self.files = {}
+            self.head = None
+
+    # ----------------------------------
+    # Querying
+    # ----------------------------------
+
+    def get(self, filename: str):
+        """
+        Get the git information on a file (absolute path or relative
+        to the directory of the index): last commit, author, etc.
+        Returns None if the file is not in the history.
+        """
+        if not self._loaded:
+            self.update()
+        if not self.root_dir:
+            return None
+        filename = os.path.join(self.path, filename)
+        name = os.path.relpath(os.path.realpath(filename),
+                               os.path.realpath(self.root_dir))
+        entry = self.files.get(name.replace(os.sep, '/'))
+        if entry is None:
+            return None
+        r = dict(entry)
+        r['date'] = datetime.fromisoformat(r['date_ISO'])
+        r['created'] = datetime.fromisoformat(r['created'])
+        return r
+
+
+def get_git_index(path: str, filename: str = '') -> GitIndex:
+    """
+    Get the index of a directory (see `GitIndex`);
+    the same object is reused from one build to the next,
+    and it is updated when it is first queried.
+    """
+    key = (os.path.abspath(path), filename)
+    index = _INDEXES.get(key)
+    if index is None:
+        index = _INDEXES[key] = GitIndex(path, filename)
+    else:
+        # check again for new commits
+        index._loaded = False
+    return index
@@ -0,0 +1,259 @@
+"""
+Parallel pre-rendering of the pages, with a pool of worker processes
+(`parallel` parameter of the config file).
+
+Each worker rebuilds its own macros environment, from the config file
+and a picklable snapshot of the main environment (variables,
+navigation, files). The pages are then rendered in the workers,
+while MkDocs is still busy; `on_page_markdown()` collects the results,
+and the statistics of the workers (pages without markers,
+pages reused by the incremental rendering).
+
+NOTE: Since each worker runs `on_config()`, the `define_env()`
+      function of the modules and pluglets is executed again
+      in each worker: it should have no side effects outside
+      of the environment (a module can test
+      `multiprocessing.parent_process()`, which is None only
+      in the main process).
+      The workers read the caches on disk (compiled pages,
+      YAML files, data sources, git index, rendered pages),
+      but never write them: only the main process does.
+
+Whenever a page cannot be safely rendered in a worker
+(different markdown, warning, error, etc.) it is rendered
+normally (serially) by the main process, so that the result
+(including errors and warnings) is always the same.
+
+Laurent Franceschetti (c) 2025
+"""
+
+import pickle
+import logging
+
+from mkdocs_macros.cache import hash_text
+
+
+# ------------------------------------------
+# Marking hooks as safe
+# ------------------------------------------
+
+def parallel_safe(func):
+    """
+    Decorator, to declare that a hook of a module
+    (`on_pre_page_macros()`, `on_post_page_macros()`) can be executed
+    in a worker process, i.e. it only depends on the page
+    and has no side effect on the rest of the environment:
+
+        from mkdocs_macros import parallel_safe
+
+        @parallel_safe
+        def on_post_page_macros(env):
+            env.markdown += "\\n\\nFooter"
+    """
+    func.parallel_safe = True
+    return func
+
+
+def is_parallel_safe(func) -> bool:
+    "Predicate: has the hook been declared as safe for worker processes?"
+    return getattr(func, 'parallel_safe', False)
+
+
+def picklable(items: dict) -> dict:
+    "Return the subset of a dictionary whose values can be pickled"
+    r = {}
+    for key, value in items.items():
+        try:
+            pickle.dumps(value)
+        except Exception:
+            continue
+        r[key] = value
+    return r
+
+
+# ------------------------------------------
+# Worker side
+# ------------------------------------------
+
+# State of the worker process: set by _init_worker()
+_WORKER = {}
+
+
+class _WarningCounter(logging.Handler):
+    "Count the warnings issued while rendering a page in a worker"
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def _init_worker(snapshot: dict):
+    """
+    Initialize a worker process: rebuild the macros environment.
+    """
+    # imported here, to avoid a circular import:
+    from mkdocs.config import load_config
+    from mkdocs_macros.plugin import MacrosPlugin
+
+    # logs are not displayed by the workers, only counted:
+    counter = _WarningCounter()
+    logger = logging.getLogger('mkdocs')
+    logger.addHandler(counter)
+    logger.propagate = False
+
+    config = load_config(config_file=snapshot['config_file'])
+    plugin = MacrosPlugin()
+    plugin.load_config(snapshot['plugin_config'],
+                       snapshot['config_file'])
+    # the caches on disk are only read:
+    plugin._worker = True
+    plugin.on_config(config)
+    variables = snapshot['variables']
+    plugin.variables.update(variables)
+    for name, func in snapshot['macros'].items():
+        plugin.macros.setdefault(name, func)
+        plugin.env.globals.setdefault(name, func)
+    for name, func in snapshot['filters'].items():
+        plugin.filters.setdefault(name, func)
+        plugin.env.filters.setdefault(name, func)
+    # names of the main environment that could not be transmitted:
+    known = set(plugin.variables) | set(plugin.macros) | set(plugin.filters)
+    missing = [name for name in snapshot['names'] if name not in known]
+    # the rendered pages are kept in memory, and stored by the main process:
+    if plugin._tracker:
+        plugin._tracker.in_memory = True
+    # the pages, by source path:
+    files = variables['files']
+    pages = {file.src_path: file.page
+             for file in files.documentation_pages() if file.page}
+    _WORKER.update(plugin=plugin, config=config, files=files,
+                   pages=pages, missing=missing, counter=counter)
+
+
+def _render_page(src_path: str):
+    """
+    Render a page in the worker.
+
+    Returns a tuple (checksum of the source markdown,
+    rendered markdown, new title or None, record of the dependencies
+    or None, statistics), or None if the page must be rendered
+    by the main process.
+
+    The statistics are a tuple (pages without markers,
+    pages reused, pages rendered) for that page.
+    """
+    plugin = _WORKER['plugin']
+    config = _WORKER['config']
+    counter = _WORKER['counter']
+    page = _WORKER['pages'][src_path]
+    tracker = plugin._tracker
+    before = (plugin._unmarked_count,
+              tracker.reused if tracker else 0,
+              tracker.rendered if tracker else 0)
+    try:
+        page.read_source(config)
+        markdown = page.markdown
+        if any(name in markdown for name in _WORKER['missing']):
+            return None
+        title = page.title
+        counter.count = 0
+        result = plugin.on_page_markdown(markdown, page=page, config=config,
+                                         files=_WORKER['files'])
+    except (Exception, SystemExit):
+        return None
+    if counter.count:
+        # warnings must be issued by the main process
+        return None
+    new_title = page.title if page.title != title else None
+    record = tracker.get_record(src_path) if tracker else None
+    after = (plugin._unmarked_count,
+             tracker.reused if tracker else 0,
+             tracker.rendered if tracker else 0)
+    stats = tuple(a - b for a, b in zip(after, before))
+    return hash_text(markdown), result, new_title, record, stats
+
+
+# ------------------------------------------
+# Main side
+# ------------------------------------------
+
+class ParallelRenderer(object):
+    """
+    Pre-renders the pages of the website in a pool of worker processes.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = None
+        self._futures = {}
+        # statistics, for the trace:
+        self.used = 0
+        self.fallback = 0
+
+    def start(self, plugin, config, files):
+        """
+        Start rendering the pages (asynchronously).
+        Typically called in `on_nav()`, once the navigation is known.
+        """
+        variables = picklable(plugin.variables)
+        snapshot = {
+            'config_file': config['config_file_path'],
+            'plugin_config': dict(plugin.config),
+            'variables': variables,
+            'macros': picklable(plugin.macros),
+            'filters': picklable(plugin.filters),
+            'names': (list(plugin.variables) + list(plugin.macros)
+                      + list(plugin.filters)),
+        }
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # spawn: safer than fork, with the threads of `mkdocs serve`
+        context = multiprocessing.get_context('spawn')
+        self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=context,
+                                             initializer=_init_worker,
+                                             initargs=(snapshot,))
+        for file in files.documentation_pages():
+            if file.page is not None:
+                self._futures[file.src_path] = self._executor.submit(
+                    _render_page, file.src_path)
+
+    def result(self, page, markdown: str):
+        """
+        Get the result of a page rendered by a worker:
+        a tuple (rendered markdown, new title or None, record of the
+        dependencies or None, statistics, see `_render_page()`),
+        or None if the page must be rendered by the main process.
+        """
+        future = self._futures.pop(page.file.src_path, None)
+        if future is None:
+            self.fallback += 1
+            return None
+        try:
+            r = future.result()
+        except Exception:
+            # e.g. a worker could not start
+            r = None
+        if r is None or r[0] != hash_text(markdown):
+            # markdown was modified in the meantime (e.g. another plugin)
+            self.fallback += 1
+            return None
+        self.used += 1
+        return r[1:]
+
+    def shutdown(self):
+        "Stop the workers"
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> str:
+        "Short description, for the trace"
+        return ("%s page(s) rendered by %s workers, %s by the main process" %
+                (self.used, self.workers, self.fallback))
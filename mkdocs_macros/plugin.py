@@ -7,15 +7,20 @@
 # --------------------------------------------
 
 import importlib
+import importlib.util
 import os
+import re
+import time
 from copy import copy
+from collections import ChainMap
+from contextvars import ContextVar
 import pathspec
 import json
 from datetime import datetime
-import yaml
 
 from jinja2 import (
     Environment, FileSystemLoader, Undefined, DebugUndefined, StrictUndefined,
+    Template
 )
 from super_collections import SuperDict, yaml_support
 yaml_support()
@@ -25,13 +30,30 @@ from mkdocs.config.config_options import ListOfItems
 from mkdocs.config.config_options import Type as PluginType
 from mkdocs.plugins import BasePlugin
 from mkdocs.structure.pages import Page
+from mkdocs.utils.meta import get_data
 
 from mkdocs_macros.errors import format_error
-from mkdocs_macros.context import define_env
+from mkdocs_macros.context import (
+    define_env, get_git_info, project_git_index
+)
+from mkdocs_macros.cache import (
+    TemplateCache, OutputCache, fingerprint, module_fingerprint, memoize,
+    files_fingerprint, MEMORY_CACHES, set_memory_budget, sizeof
+)
+# NOTE: the modules for parallel and async rendering, data sources
+# and profiling are imported only when their option is enabled.
+from mkdocs_macros.precompile import IncludeLoader, precompile
+from mkdocs_macros.data import (
+    load_yaml_files, index_yaml, LazyYaml, SUBTREES
+)
+from mkdocs_macros.tracking import (
+    DependencyTracker, TrackingContext, uncacheable, variables_fingerprint
+)
 from mkdocs_macros.util import (
-    is_on_pypi, parse_package, trace, debug,
+    find_pluglet, installed_modules, PYPI_CACHE_FILE,
+    parse_package, trace, debug,
     update, import_local_module, format_chatter, LOG, get_log_level,
-    setup_directory
+    setup_directory, spooled_output, Variables, is_async
     # SuperDict, 
 )
 
@@ -45,6 +67,13 @@ YAML_VARIABLES = 'extra'
 # The default name of the Python module:
 DEFAULT_MODULE_NAME = 'main'  # main.py
 
+# The report of the profiling of macros (in cache_dir if set,
+# otherwise in the temporary directory of the system):
+PROFILE_FILE = 'macros_profile.json'
+
+# The report of the timing of pages (same directory):
+PAGE_TIMING_FILE = 'macros_page_timing.json'
+
 
 
 
@@ -84,11 +113,71 @@ DEFAULT_UNDEFINED_BEHAVIOR = 'keep'
 # Return codes in case of error
 ERROR_MACRO = 100
 
+# The page being rendered, and its markdown, when pages are rendered
+# with `render_page()` or concurrently
+# (otherwise, the `_page` and `_markdown` attributes of the plugin):
+_CURRENT_PAGE = ContextVar('macros_page', default=None)
+_CURRENT_MARKDOWN = ContextVar('macros_markdown', default=None)
+
 
 # ------------------------------------------
 # Plugin
 # ------------------------------------------
 
+def j2_markers_regex(env: Environment) -> re.Pattern:
+    """
+    Build a regular expression that finds the first Jinja2 marker
+    in a string, in a single pass, according to the markers
+    of the environment:
+
+    - start strings for variables, blocks and comments (e.g. `{{`)
+    - line statement prefix (only at the start of a line)
+    - line comment prefix
+    """
+    markers = [env.variable_start_string,
+               env.block_start_string,
+               env.comment_start_string,
+               env.line_comment_prefix]
+    patterns = [re.escape(marker) for marker in markers if marker]
+    if env.line_statement_prefix:
+        patterns.append(r'^[ \t\v]*' + re.escape(env.line_statement_prefix))
+    return re.compile('|'.join(patterns), re.MULTILINE)
+
+
+def render_template(template: Template, context: ChainMap) -> str:
+    """
+    Render a template with a layered context, as is.
+
+    Contrary to `Template.render()`, this does not build a new
+    dictionary with all the variables: the context must
+    contain the globals of the template (as its last layer).
+    """
+    ctx = template.new_context(context, shared=True)
+    try:
+        return template.environment.concat(template.root_render_func(ctx))
+    except Exception:
+        return template.environment.handle_exception()
+
+
+def render_template_stream(template: Template, context: ChainMap) -> str:
+    """
+    Same as `render_template()`, for a large output
+    (`render_stream` meta variable): the chunks are written
+    to a spooled file as they are produced (as with
+    `Template.generate()`), instead of being kept in a list
+    to be joined at the end.
+    """
+    ctx = template.new_context(context, shared=True)
+    with spooled_output() as f:
+        try:
+            for chunk in template.root_render_func(ctx):
+                f.write(chunk)
+        except Exception:
+            return template.environment.handle_exception()
+        f.seek(0)
+        return f.read()
+
+
 # little utility for updating a dictionary from another
 def register_items(category:str, ref:dict, additional:dict):
     """
@@ -124,6 +213,9 @@ class MacrosPlugin(BasePlugin):
                                     default=DEFAULT_MODULE_NAME)),
         ('modules', PluginType(list,
                                default=[])),
+        # check on PyPI the modules that could not be imported
+        # (network access; otherwise, only what is known locally):
+        ('pypi_check', PluginType(bool, default=False)),
         # How to render pages by default: yes (opt-out), no (opt-in)
         ('render_by_default', PluginType(bool, default=True)),
         # Force the rendering of those directories and files
@@ -153,7 +245,47 @@ class MacrosPlugin(BasePlugin):
         ('on_undefined',  PluginType(str, default=DEFAULT_UNDEFINED_BEHAVIOR)),
         # for CD/CI set that parameter to true
         ('on_error_fail', PluginType(bool, default=False)),
-        ('verbose', PluginType(bool, default=False))
+        ('verbose', PluginType(bool, default=False)),
+        # reuse the pages whose dependencies did not change
+        # (mkdocs serve, or from one build to the next with cache_dir);
+        # opt-in, since macros might read other data (e.g. files):
+        ('incremental', PluginType(bool, default=False)),
+        # directory for caching data between builds (relative to project);
+        # if empty, nothing is written to disk:
+        ('cache_dir', J2_STRING),
+        # maximum size of the rendered (and compiled) pages
+        # kept in cache_dir (MB)
+        ('cache_max_size', PluginType(int, default=100)),
+        # compression of those pages: 'none', 'zlib' or 'lzma'
+        ('cache_compression', PluginType(str, default='zlib')),
+        # number of worker processes for pre-rendering pages
+        # (0 or 1: pages are rendered one by one):
+        ('parallel', PluginType(int, default=0)),
+        # time the calls of macros and filters (report at the end):
+        ('profile', PluginType(bool, default=False)),
+        # time the phases of each page, and display the N slowest
+        # (0: no timing):
+        ('page_timing', PluginType(int, default=0)),
+        # mount the `key: filename` entries of include_yaml lazily,
+        # and keep at most N subtrees in memory (0: load at startup):
+        ('lazy_yaml', PluginType(int, default=0)),
+        # tabular data files (CSV, JSON, YAML), loaded into a SQLite
+        # database, for the query() macro: {table: filename or
+        # {file: ..., indexes: [...]}}
+        ('data_sources', PluginType(dict, default={})),
+        # compile the templates of include_dir into Python modules
+        # (in cache_dir), only those that changed:
+        ('precompile_includes', PluginType(bool, default=False)),
+        # number of templates of include_dir kept by jinja2:
+        ('include_cache_size', PluginType(int, default=400)),
+        # check whether those templates were modified, before reusing them
+        # (by default, only with mkdocs serve):
+        ('include_auto_reload', PluginType(bool, default=None)),
+        # maximum size of each cache kept in memory (MB):
+        ('cache_memory', PluginType(int, default=64)),
+        # report the memory used by the variables and caches,
+        # after each build:
+        ('memory_report', PluginType(bool, default=False)),
     )
 
 
@@ -165,6 +297,36 @@ class MacrosPlugin(BasePlugin):
     _add_filters   = {}
     _add_variables = {}
 
+    # incremental rendering of pages (only for mkdocs serve)
+    _tracker = None
+
+    # rendering of the pages with async macros (if any)
+    _async = None
+
+    # profiling of the macros and filters (if required)
+    _profiler = None
+
+    # number of yaml files mounted lazily
+    _lazy_mounts = 0
+
+    # the mkdocs command (build, serve, etc.), if known
+    _command = None
+
+    # the key of the environment kept for the next build
+    # (mkdocs serve), if any
+    _warm = None
+
+    # between on_config() and the end of the build
+    # (external items are then registered directly):
+    _configured = False
+
+    # macros, filters or variables registered by other plugins
+    _registered = False
+
+    # in a worker process (parallel rendering): the caches
+    # on disk are read, but only the main process writes them
+    _worker = False
+
     def start_chatting(self, prefix: str, color: str = 'yellow'):
         "Generate a chatter function (trace for macros)"
         def chatter(*args):
@@ -249,7 +411,7 @@ class MacrosPlugin(BasePlugin):
         CONFIG_FILE = self.conf['config_file_path']
         return os.path.dirname(os.path.abspath(CONFIG_FILE))
 
-    def macro(self, v, name=''):
+    def macro(self, v=None, name='', cache=None):
         """
         Registers a variable as a macro in the template,
         i.e. in the variables dictionary:
@@ -267,15 +429,25 @@ class MacrosPlugin(BasePlugin):
         def foo(a):
             return a ** 2
 
+        The results can be kept, for macros that are pure functions
+        of their arguments (see `cache_policy()`):
+
+        @env.macro(cache=True)      # or an LRU size, e.g. cache=128,
+        def foo(a):                 # or cache={'size': 128, 'ttl': 60}
+            return a ** 2
+
         More info:
         https://stackoverflow.com/questions/6036082/call-a-python-function-from-jinja2
         """
-
+        if v is None:
+            # decorator with arguments
+            return lambda v: self.macro(v, name, cache)
         name = name or v.__name__
-        self.macros[name] = v
+        func = memoize(v, cache) if cache else v
+        self.macros[name] = self._instrument('macro', name, func)
         return v
 
-    def filter(self, v, name=''):
+    def filter(self, v=None, name='', cache=None):
         """
         Register a filter in the template,
         i.e. in the filters dictionary:
@@ -294,13 +466,40 @@ class MacrosPlugin(BasePlugin):
             "Reverse a string (and uppercase)"
             return x.upper().[::-1]
 
+        The results can be kept, as for macros:
+
+        @env.filter(cache=128)
+        def reverse(x):
+            ...
+
         See: https://jinja.palletsprojects.com/en/2.10.x/api/#custom-filters
         """
-
+        if v is None:
+            # decorator with arguments
+            return lambda v: self.filter(v, name, cache)
         name = name or v.__name__
-        self.filters[name] = v
+        func = memoize(v, cache) if cache else v
+        self.filters[name] = self._instrument('filter', name, func)
         return v
 
+    def _instrument(self, category: str, name: str, func):
+        "Wrap a macro or filter for profiling (if required)"
+        if self._profiler is None:
+            return func
+        return self._profiler.wrap(category, name, func)
+
+    def _instrument_items(self, category: str, items: dict) -> dict:
+        "Wrap a dictionary of macros or filters for profiling"
+        return {name: self._instrument(category, name, func)
+                for name, func in items.items()}
+
+    def _current_page_name(self):
+        "The source path of the page being rendered (or None)"
+        try:
+            return self.page.file.src_path
+        except AttributeError:
+            return None
+
 
 
 
@@ -314,6 +513,9 @@ class MacrosPlugin(BasePlugin):
         """
         The current page's information
         """
+        page = _CURRENT_PAGE.get()
+        if page is not None:
+            return page
         try:
             return self._page
         except AttributeError:
@@ -325,6 +527,9 @@ class MacrosPlugin(BasePlugin):
         """
         The markdown of the current page, after interpretation
         """
+        markdown = _CURRENT_MARKDOWN.get()
+        if markdown is not None:
+            return markdown
         try:
             return self._markdown
         except AttributeError:
@@ -344,7 +549,10 @@ class MacrosPlugin(BasePlugin):
                              "should be a string")
         # check whether attribute is accessible:
         self.markdown
-        self._markdown = value
+        if _CURRENT_MARKDOWN.get() is not None:
+            _CURRENT_MARKDOWN.set(value)
+        else:
+            self._markdown = value
 
 
     @property
@@ -374,13 +582,14 @@ class MacrosPlugin(BasePlugin):
         These will be added last, and raise an exception if already present.
         """
         trace(f"Registering external macros: {list(items)}")
-        try:
-            # after on_config
-            self._macros
+        # the environment cannot be reused (mkdocs serve):
+        self._registered = True
+        if self._configured:
+            items = self._instrument_items('macro', items)
             register_items('macro', self.macros, items)
             self.variables["macros"].update(self.macros)
             self.env.globals.update(self.macros)
-        except AttributeError:
+        else:
             # before on_config: store for later
             self._add_macros.update(items)
 
@@ -390,12 +599,13 @@ class MacrosPlugin(BasePlugin):
         These will be added last, and raise an exception if already present.
         """
         trace(f"Registering external filters: {list(items)}")
-        try:
-            self._filters
+        self._registered = True
+        if self._configured:
+            items = self._instrument_items('filter', items)
             register_items('filter', self.filters, items)
             self.variables["filters"].update(self.filters)
             self.env.filters.update(self.filters)
-        except AttributeError:
+        else:
             # before on_config: store for later
             self._add_filters.update(items)
 
@@ -405,11 +615,10 @@ class MacrosPlugin(BasePlugin):
         These will be added last, and raise an exception if already present.
         """
         trace(f"Registering external variables: {list(items)}")
-        try:
-            # after on_config
-            self._variables
+        self._registered = True
+        if self._configured:
             register_items('variables', self.variables, items)
-        except AttributeError:
+        else:
             # before on_config: store for later
             self._add_variables.update(items)
 
@@ -475,6 +684,8 @@ class MacrosPlugin(BasePlugin):
 
     def _load_yaml(self):
         "Load the the external yaml files"
+        # the files, with the key under which they are mounted (if any):
+        entries = []
         for el in self.config['include_yaml']:
             # el is either a filename or {key: filename} single-entry dict
             try:
@@ -485,17 +696,58 @@ class MacrosPlugin(BasePlugin):
             # Paths are be relative to the project root.
             filename = os.path.join(self.project_dir, filename)
             if os.path.isfile(filename):
-                with open(filename, encoding="utf-8") as f:
-                    # load the yaml file
-                    # NOTE: for the SafeLoader argument, see: https://github.com/yaml/pyyaml/wiki/PyYAML-yaml.load(input)-Deprecation
-                    content = yaml.load(f, Loader=yaml.SafeLoader)
-                    trace("Loading yaml file:", filename)
-                if key is not None:
-                    content = {key: content}
-                update(self.variables, content)
+                entries.append((key, filename))
             else:
                 trace("WARNING: YAML configuration file was not found!",
                       filename)
+        # files mounted lazily (only their top-level keys are indexed):
+        mounts = {}
+        if self.config['lazy_yaml'] > 0:
+            SUBTREES.size = self.config['lazy_yaml']
+            SUBTREES.hits = SUBTREES.misses = 0
+            for key, filename in entries:
+                if key is None:
+                    continue
+                start = time.perf_counter()
+                index = index_yaml(filename)
+                if index is None:
+                    trace("WARNING: YAML file cannot be mounted lazily "
+                          "(not a mapping, or with anchors):", filename)
+                    continue
+                mounts[filename] = LazyYaml(filename, index)
+                trace("Mounting yaml file:", filename,
+                      "(%s key(s), %.3f s)" %
+                      (len(index), time.perf_counter() - start))
+        self._lazy_mounts = len(mounts)
+        to_load = [filename for _, filename in entries
+                   if filename not in mounts]
+        loaded = {}
+        if to_load:
+            # the parsed content of the files can be kept on disk:
+            cache_dir = self.config['cache_dir']
+            if cache_dir:
+                store = OutputCache(
+                    os.path.join(self.project_dir, cache_dir, 'yaml'),
+                    max_size=self.config['cache_max_size'] * 1024 * 1024,
+                    compression=self.config['cache_compression'])
+                store.read_only = self._worker
+            else:
+                store = None
+            loaded = load_yaml_files(to_load, store=store)
+            if store is not None:
+                store.flush()
+        # merge, in the order of the config file:
+        for key, filename in entries:
+            if filename in mounts:
+                # not merged: it replaces any previous value
+                self.variables[key] = mounts[filename]
+                continue
+            content, duration, origin = loaded[filename]
+            trace("Loading yaml file:", filename,
+                  "(%.3f s, %s)" % (duration, origin))
+            if key is not None:
+                content = {key: content}
+            update(self.variables, content)
 
     def _load_module(self, module, module_name):
         """
@@ -531,6 +783,8 @@ class MacrosPlugin(BasePlugin):
             return
         trace("Found external Python module '%s' in:" % module_name,
               self.project_dir)
+        # for the validity of the rendered pages kept from previous builds:
+        self._module_fingerprints.append(module_fingerprint(module))
         # execute the hook for the macros
         function_found = False
         if hasattr(module, 'define_env'):
@@ -558,11 +812,39 @@ class MacrosPlugin(BasePlugin):
                             "in module '%s':\n%s" %
                             (module_name, STANDARD_FUNCTIONS))
 
+    def _pluglet_error(self, source_name: str, module_name: str) -> str:
+        "The error message for a pluglet that could not be imported"
+        cache_dir = self.config['cache_dir']
+        if cache_dir:
+            cache_file = os.path.join(self.project_dir, cache_dir,
+                                      PYPI_CACHE_FILE)
+        else:
+            cache_file = ''
+        status = find_pluglet(source_name, online=self.config['pypi_check'],
+                              cache_file=cache_file)
+        if status == 'installed':
+            modules = ', '.join(installed_modules(source_name))
+            return (f"Could not import module '{module_name}' of pluglet "
+                    f"'{source_name}', which is installed "
+                    f"(it provides: {modules})")
+        elif status == 'on_pypi':
+            return (f"Could not import pluglet '{source_name}'. "
+                    f"Please install it from Pypi:\n\n"
+                    f"    pip install {source_name}")
+        elif status == 'not_found':
+            return f"Could not import module '{module_name}' (missing?)"
+        else:
+            return (f"Could not import module '{module_name}' (missing?). "
+                    f"If it is a pluglet, install it, e.g.:\n\n"
+                    f"    pip install {source_name}\n\n"
+                    f"(set `pypi_check: true` to check on Pypi)")
+
     def _load_modules(self):
         "Load all modules"
         self._pre_macro_functions = []
         self._post_macro_functions = []
         self._post_build_functions = []
+        self._module_fingerprints = []
 
         # pluglets installed modules (as in pip list)
         modules = self.config['modules']
@@ -574,13 +856,9 @@ class MacrosPlugin(BasePlugin):
             try:
                 module = importlib.import_module(module_name)
             except ModuleNotFoundError:
-                if is_on_pypi(source_name, fail_silently=True):
-                    err_msg = (f"Counld not import pluglet '{source_name}'. "
-                                f"Please install it from Pypi:\n\n    pip install {source_name}")
-                    raise ModuleNotFoundError(err_msg, name=module_name)
-                else:
-                    raise ModuleNotFoundError(f"Could not import "
-                        "module '{module_name}' (missing?)")
+                raise ModuleNotFoundError(
+                    self._pluglet_error(source_name, module_name),
+                    name=module_name)
             self._load_module(module, module_name)
         # local module (file or dir)
         local_module_name = self.config['module_name']
@@ -618,6 +896,17 @@ class MacrosPlugin(BasePlugin):
         except AttributeError:
             raise AttributeError("Jinja2 environment is not defined yet!")
 
+    @property
+    def template_cache(self) -> TemplateCache:
+        """
+        The cache of compiled templates (for the pages),
+        defined in `on_config`.
+        """
+        try:
+            return self._template_cache
+        except AttributeError:
+            raise AttributeError("Template cache is not defined yet!")
+
     def render(self, markdown: str, force_rendering:bool=False) -> str:
         """
         Render a page through jinja2: it reads the code and
@@ -653,15 +942,66 @@ class MacrosPlugin(BasePlugin):
 
         # Process meta_variables
         # ----------------------
-        # copy the page variables and update with the meta data
-        # in the YAML header:
-        page_variables = copy(self.variables)
+        page = _CURRENT_PAGE.get()
+        if page is None:
+            # this is None for a premature rendering
+            page = self.variables.get('page')
+        meta_variables = page.meta if page is not None else {}
+        return self._render_page(markdown, page, meta_variables,
+                                 force_rendering)
+
+    def render_page(self, markdown: str, page: Page, meta: dict = None,
+                    force_rendering: bool = False) -> str:
+        """
+        Render the markdown of a page, with the page-scoped state
+        passed explicitly: contrary to `render()`, it does not read
+        nor change the attributes of the plugin.
+
+        During the rendering, `env.page` and `env.markdown`
+        give the page and its markdown (through context variables),
+        so that several pages can be rendered concurrently,
+        from threads or tasks of an event loop.
+
+        Arguments
+        ---------
+        - markdown: the markdown/HTML page (with the jinja2 macros)
+        - page: the page
+        - meta: the meta variables (by default, those of the page)
+        - force_rendering: see `render()`
+
+        Returns
+        -------
+        A pure markdown/HTML page.
+        """
+        if meta is None:
+            meta = page.meta if page is not None else {}
+        page_token = _CURRENT_PAGE.set(page)
+        markdown_token = _CURRENT_MARKDOWN.set(markdown)
         try:
-            meta_variables = self.variables['page'].meta
-        except KeyError as e:
-            # this is a premature rendering, no meta variables in the page
-            meta_variables = {}
+            return self._render_page(markdown, page, meta, force_rendering)
+        finally:
+            _CURRENT_MARKDOWN.reset(markdown_token)
+            _CURRENT_PAGE.reset(page_token)
+
+    def _render_page(self, markdown: str, page, meta_variables: dict,
+                     force_rendering: bool = False) -> str:
+        "Render a markdown, if required by the meta variables and config"
+        if not self._must_render(meta_variables, force_rendering):
+            return markdown
 
+        # Fast path: nothing to render
+        if not self.has_j2(markdown):
+            self._unmarked_count += 1
+            return markdown
+
+        return self._render_markdown(markdown, page, meta_variables)
+
+    def _must_render(self, meta_variables: dict,
+                     force_rendering: bool = False) -> bool:
+        """
+        Predicate: must the page be rendered, according to
+        its meta variables and the config file?
+        """
         # Warning this is ternary logic(True, False, None: nothing said)
         render_macros = None
         
@@ -682,42 +1022,71 @@ class MacrosPlugin(BasePlugin):
 
         # this takes precedence over any other consideration:
         if render_macros == False:
-            return markdown
+            return False
         
         if self.config['render_by_default'] == False:
             # opt-in
-            if force_rendering or render_macros == True:
-                pass # opt-in
-            else:
-                return markdown
-        
-        # Update the page with meta variables
-        # i.e. what's in the yaml header of the page
-        page_variables.update(meta_variables)
+            return bool(force_rendering or render_macros == True)
+        return True
 
-        # Rendering
-        # ----------------------
-        # expand the template
-        on_error_fail = self.config['on_error_fail']
+    def _template_context(self, markdown: str, page, meta_variables: dict):
+        """
+        Get the template of a markdown (from the cache),
+        and the context for rendering it.
+        """
+        md_template = self.template_cache.from_string(markdown)
+        # Layered context, read-through (no copy of the variables);
+        # writes go only to the top layer:
+        #   meta variables (i.e. what's in the yaml header of the page)
+        #   > page > variables > globals (macros)
+        page_layer = {'page': page} if page is not None else {}
+        context = ChainMap({}, meta_variables, page_layer,
+                           self.variables, md_template.globals)
+        return md_template, context
+
+    def _render_markdown(self, markdown: str, page,
+                         meta_variables: dict) -> str:
+        "Render a markdown (with j2 markers) and handle the errors"
+        if self._async:
+            return self._async.run(
+                self._render_markdown_async(markdown, page, meta_variables))
         try:
-            md_template = self.env.from_string(markdown)
+            md_template, context = self._template_context(markdown, page,
+                                                          meta_variables)
             # Execute the jinja2 template and return
-            return md_template.render(**page_variables)
-
+            if meta_variables.get('render_stream'):
+                return render_template_stream(md_template, context)
+            return render_template(md_template, context)
         except Exception as error:
-            error_message = format_error(
-                error,
-                markdown=markdown,
-                page=self.page,
-            )
+            return self._render_error(error, markdown)
 
-            trace('ERROR', error_message, level='warning')
-            if on_error_fail:
-                exit(ERROR_MACRO)
+    async def _render_markdown_async(self, markdown: str, page,
+                                     meta_variables: dict) -> str:
+        "Same as `_render_markdown()`, for an async environment"
+        try:
+            md_template, context = self._template_context(markdown, page,
+                                                          meta_variables)
+            return await self._async.render(
+                md_template, context, markdown,
+                stream=bool(meta_variables.get('render_stream')))
+        except Exception as error:
+            return self._render_error(error, markdown)
+
+    def _render_error(self, error: Exception, markdown: str) -> str:
+        "Report a rendering error, and return the error message"
+        # the result of that page must not be reused:
+        uncacheable()
+        error_message = format_error(
+            error,
+            markdown=markdown,
+            page=self.page,
+        )
 
-            else:
-                return error_message
-            
+        trace('ERROR', error_message, level='warning')
+        if self.config['on_error_fail']:
+            exit(ERROR_MACRO)
+        else:
+            return error_message
 
     def has_j2(self, s:str) -> bool:
         """
@@ -727,13 +1096,10 @@ class MacrosPlugin(BasePlugin):
         such as, e.g., `{{`?
 
         It takes into account the j2_..._start_string
-        parameters of the config file.
+        parameters of the config file, as well as the
+        line statement and line comment prefixes.
         """
-        env = self.env
-        CANDIDATES = [env.variable_start_string, 
-                      env.block_start_string,
-                      env.comment_start_string]
-        return any(item in s for item in CANDIDATES)
+        return self._markers_re.search(s) is not None
         
 
 
@@ -741,6 +1107,17 @@ class MacrosPlugin(BasePlugin):
     # Standard Hooks for a mkdocs plugin
     # ----------------------------------
 
+    def on_startup(self, *, command, dirty):
+        """
+        Called once, at the start of the mkdocs command (mkdocs >= 1.4).
+
+        NOTE: The presence of this method means that mkdocs keeps
+        the same instance of the plugin across the rebuilds
+        of `mkdocs serve`, so that the results of the previous
+        build can be reused.
+        """
+        self._command = command
+
     def on_config(self, config):
         """
         Called once (initialization)
@@ -750,10 +1127,33 @@ class MacrosPlugin(BasePlugin):
         debug("Configuring the macros environment...")
         # WARNING: this is not the config argument:
         debug("Macros arguments\n", self.config)
-        # define the variables and macros as dictionaries
-        # (for update function to work):
-        self._variables = SuperDict()
-        self._macros = SuperDict()
+        # warm restart (mkdocs serve): if nothing that defines
+        # the environment changed, the previous one is reused
+        self._conf = config
+        self._warm_key = self._environment_key(config)
+        warm = (self._warm == self._warm_key and self._command == 'serve')
+        self._warm = None
+        if not warm:
+            # define the variables and macros as dictionaries
+            # (for update function to work):
+            self._variables = Variables()
+            self._macros = SuperDict()
+            self._filters = {}
+
+        # budget of the caches kept in memory:
+        max_bytes = self.config['cache_memory'] * 1024 * 1024
+        set_memory_budget(max_bytes)
+        for cache in self._memory_caches().values():
+            cache.max_bytes = max_bytes
+            cache.shrink()
+        if self.config['memory_report']:
+            from mkdocs_macros.profiling import start_memory_tracing
+            if start_memory_tracing():
+                trace("Tracing the memory allocations (slower)")
+        if warm:
+            self._warm_restart(config)
+            self._configured = True
+            return
 
         # load the extra variables
         extra = dict(config.get(YAML_VARIABLES))
@@ -768,6 +1168,16 @@ class MacrosPlugin(BasePlugin):
         self.variables['config'] = copy(config)
         assert self.variables['config'] is not config
 
+        # profiling of the macros and filters (wrapped when registered):
+        if self.config['profile']:
+            from mkdocs_macros.profiling import Profiler
+            self._profiler = Profiler(self._current_page_name)
+        else:
+            self._profiler = None
+
+        # timing of the phases of each page:
+        self._page_timer = self._new_page_timer()
+
         # load other yaml files
         self._load_yaml()
 
@@ -792,8 +1202,10 @@ class MacrosPlugin(BasePlugin):
         # self._add_macros['bar'] = bar
         # self._add_filters['baz'] = lambda s: s.upper()
         register_items('variable', self.variables, self._add_variables)
-        register_items('macro'   , self.macros   , self._add_macros   )
-        register_items('filter'  , self.filters  , self._add_filters  )
+        register_items('macro'   , self.macros   ,
+                       self._instrument_items('macro', self._add_macros))
+        register_items('filter'  , self.filters  ,
+                       self._instrument_items('filter', self._add_filters))
 
 
         # if len(extra):
@@ -822,6 +1234,7 @@ class MacrosPlugin(BasePlugin):
             raise FileNotFoundError("MACROS ERROR: Include directory '%s' "
                                     "does not exist!" %
                                     include_dir)
+        self._include_dir = include_dir
         if self.config['include_dir']:
             trace("Includes directory:", include_dir)
         else:
@@ -832,11 +1245,18 @@ class MacrosPlugin(BasePlugin):
             raise ValueError("Illegal value for undefined macro parameter '%s'" % on_undefined)
         undefined = UNDEFINED_BEHAVIOR[on_undefined]
         debug("Undefined behavior:", undefined)
+        auto_reload = self.config['include_auto_reload']
+        if auto_reload is None:
+            # templates may be modified only while serving:
+            auto_reload = self._command in ('serve', None)
         env_config = {
             'loader': FileSystemLoader(include_dir),
-            'undefined': undefined
+            'undefined': undefined,
+            'cache_size': self.config['include_cache_size'],
+            'auto_reload': auto_reload,
         }
         # read the config variables for jinja2:
+        j2_settings = {}
         for key, value in self.config.items():
             # take definitions in config_scheme where key starts with 'j2_'
             # (if value is not empty)
@@ -846,11 +1266,74 @@ class MacrosPlugin(BasePlugin):
                 variable_name = key.split('_', 1)[1]  # remove prefix
                 trace("Found j2 variable '%s': '%s'" %
                       (variable_name, value))
-                env_config[variable_name] = value
+                j2_settings[variable_name] = value
+        # async macros or filters (`async def`) require
+        # an async environment (this changes the compiled code):
+        async_macros = {name: func for name, func in self.macros.items()
+                        if is_async(func)}
+        if async_macros or any(is_async(func)
+                               for func in self.filters.values()):
+            trace("Async macros:", list(async_macros))
+            j2_settings['enable_async'] = True
+        env_config.update(j2_settings)
 
         # finally build the environment:
         self._env = Environment(**env_config)
 
+        # incremental rendering (records kept in memory for mkdocs serve):
+        if not self.config['incremental']:
+            self._tracker = None
+        elif self._tracker is None and self._command == 'serve':
+            trace("Incremental rendering of pages")
+            self._tracker = DependencyTracker()
+
+        # cache of the compiled pages, which depends on the j2 settings
+        # (on disk only if a cache directory is specified):
+        cache_dir = self.config['cache_dir']
+        if cache_dir:
+            cache_dir = os.path.join(self.project_dir, cache_dir)
+            trace("Cache directory:", cache_dir)
+            self._template_cache = TemplateCache(self.env, j2_settings,
+                cache_dir=os.path.join(cache_dir, 'templates'),
+                max_size=self.config['cache_max_size'] * 1024 * 1024)
+        else:
+            self._template_cache = TemplateCache(self.env, j2_settings)
+        self._template_cache.read_only = self._worker
+        if cache_dir and self.config['incremental']:
+            # the rendered pages are also kept from one build to the next:
+            if self._tracker is None:
+                self._tracker = DependencyTracker(in_memory=False)
+            self._tracker.store = OutputCache(
+                os.path.join(cache_dir, 'pages'),
+                max_size=self.config['cache_max_size'] * 1024 * 1024,
+                compression=self.config['cache_compression'])
+            self._tracker.store.read_only = self._worker
+        elif self._tracker:
+            self._tracker.store = None
+        if self.config['precompile_includes']:
+            if cache_dir:
+                # the compiled code depends on the j2 settings:
+                compiled_dir = os.path.join(cache_dir, 'includes',
+                                            self.template_cache.fingerprint)
+                self._env.loader = IncludeLoader(self._env.loader,
+                                                 compiled_dir)
+                if not self._worker:
+                    compiled, removed = precompile(self._env, include_dir,
+                                                   compiled_dir)
+                    trace("Precompiled includes:",
+                          "%s compiled, %s removed" % (compiled, removed))
+            else:
+                trace("WARNING: `precompile_includes` requires "
+                      "a cache directory (`cache_dir`)")
+        if self._tracker:
+            # record the dependencies of each page:
+            self._env.context_class = TrackingContext
+        # detection of the j2 markers, for pages with nothing to render:
+        self._markers_re = j2_markers_regex(self.env)
+        self._unmarked_count = 0
+        # pool of worker processes (if any), started in on_nav:
+        self._parallel = None
+
         # -------------------
         # Process macros
         # -------------------
@@ -858,6 +1341,16 @@ class MacrosPlugin(BasePlugin):
         self.variables['macros'] = copy(self.macros)
         # add the macros to the environment's global (not to the template!)
         self.env.globals.update(self.macros)
+        if self.env.is_async:
+            # shared event loop (kept for the rebuilds of mkdocs serve)
+            if self._async is None:
+                from mkdocs_macros.asynchronous import AsyncRenderer
+                self._async = AsyncRenderer()
+            self.env.globals.update(
+                self._async.new_build(self.env, async_macros))
+        elif self._async:
+            self._async.close()
+            self._async = None
 
         # -------------------
         # Process filters
@@ -870,8 +1363,106 @@ class MacrosPlugin(BasePlugin):
         # update environment with the custom filters:
         self.env.filters.update(self.filters)
 
+        if self._tracker:
+            self._tracker.new_build(self.env, self.variables,
+                                    self._tracker_key())
+
+        # for a warm restart (mkdocs serve):
+        self._initial_variables = dict(dict.items(self.variables))
+        self._configured = True
         debug("End of environment config")
 
+    def _tracker_key(self) -> str:
+        """
+        What affects the rendering of all pages, for incremental
+        rendering: Jinja2 settings, filters, modules, files that
+        define the environment and all the variables
+        (macros may read them through `env.variables`).
+        """
+        return fingerprint([self.template_cache.fingerprint,
+                            self.config['on_undefined'], self.env.filters,
+                            self._module_fingerprints, self._warm_key,
+                            variables_fingerprint(self.variables)])
+
+    def _environment_key(self, config) -> str:
+        """
+        Fingerprint of what defines the environment: the config file
+        (with the arguments of the plugin and the extra variables),
+        the Python modules (local and pluglets), the yaml files
+        and the data sources.
+        The files are not read (only their modification time and size).
+        """
+        pathnames = [config.get('config_file_path') or '']
+        module_path = os.path.join(self.project_dir,
+                                   self.config['module_name'])
+        pathnames += [module_path + '.py', module_path]
+        for m in self.config['modules']:
+            _, module_name = parse_package(m)
+            try:
+                spec = importlib.util.find_spec(module_name)
+            except (ImportError, ValueError):
+                spec = None
+            if spec is None:
+                pathnames.append(module_name)
+            else:
+                pathnames.append(spec.origin or '')
+                pathnames += list(spec.submodule_search_locations or [])
+        for el in self.config['include_yaml']:
+            try:
+                [[_, filename]] = el.items()
+            except AttributeError:
+                filename = el
+            pathnames.append(os.path.join(self.project_dir, filename))
+        if self.config['data_sources']:
+            from mkdocs_macros.sources import source_spec
+        for name, spec in self.config['data_sources'].items():
+            try:
+                filename = source_spec(name, spec)['file']
+            except ValueError:
+                continue
+            pathnames.append(os.path.join(self.project_dir, filename))
+        return fingerprint([files_fingerprint(pathnames), dict(self.config),
+                            config.get(YAML_VARIABLES)])
+
+    def _warm_restart(self, config):
+        """
+        Reuse the environment of the previous build (mkdocs serve):
+        variables, macros, filters and Jinja2 environment.
+        Only what is specific to the build is refreshed.
+        """
+        start = time.perf_counter()
+        self._conf = config
+        # the variables as they were at the end of on_config()
+        # (the changes made by the previous build are undone,
+        # at the top level):
+        self._variables = Variables()
+        dict.update(self._variables, self._initial_variables)
+        self.variables['config'] = copy(config)
+        # cheap, as long as the repository does not change:
+        self.variables.lazy('git', get_git_info)
+        project_git_index(self)
+        self._page_timer = self._new_page_timer()
+        self._unmarked_count = 0
+        self._parallel = None
+        if isinstance(self.env.loader, IncludeLoader):
+            compiled, removed = precompile(self.env, self._include_dir,
+                                           self.env.loader.compiled_dir)
+            trace("Precompiled includes:",
+                  "%s compiled, %s removed" % (compiled, removed))
+            # the compiled templates kept by jinja2 are not checked:
+            if self.env.cache is not None:
+                self.env.cache.clear()
+        if self._async:
+            async_macros = {name: func for name, func in self.macros.items()
+                            if is_async(func)}
+            self.env.globals.update(
+                self._async.new_build(self.env, async_macros))
+        if self._tracker:
+            self._tracker.new_build(self.env, self.variables,
+                                    self._tracker_key())
+        trace("Warm restart: environment reused (%.3f s)" %
+              (time.perf_counter() - start))
+
 
 
 
@@ -885,13 +1476,16 @@ class MacrosPlugin(BasePlugin):
         of the `on_config()` of this plugin.
         """
         trace("Config variables:", list(self.variables.keys()))
-        debug("Config variables:", payload=SuperDict(self.variables).to_json())
+        debug("Config variables:",
+              payload=lambda: SuperDict(self.variables).to_json())
         if self.macros:
             trace("Config macros:", list(self.macros.keys()))
-            debug("Config macros:", payload=SuperDict(self.macros).to_json())
+            debug("Config macros:",
+                  payload=lambda: SuperDict(self.macros).to_json())
         if self.filters:
             trace("Config filters:", list(self.filters.keys()))
-            debug("Config filters:", payload=SuperDict(self.filters).to_json())
+            debug("Config filters:",
+                  payload=lambda: SuperDict(self.filters).to_json())
 
 
     def on_nav(self, nav, config, files):
@@ -908,6 +1502,87 @@ class MacrosPlugin(BasePlugin):
         # NOTE: useful for writing macros that check for the existence of files; e.g., a macro to mark a link as disabled, if its target doesn't exist
         self.variables['files'] = files
 
+        # pre-render the pages in worker processes (opt-in)
+        workers = self.config['parallel']
+        if workers > 1:
+            from mkdocs_macros.parallel import (ParallelRenderer,
+                                                is_parallel_safe)
+            hooks = self.pre_macro_functions + self.post_macro_functions
+            unsafe = [func.__name__ for func in hooks
+                      if not is_parallel_safe(func)]
+            if unsafe:
+                trace("Parallel rendering disabled, "
+                      "hooks not declared as parallel safe:",
+                      ', '.join(unsafe))
+            elif not config.get('config_file_path'):
+                trace("Parallel rendering disabled, no config file")
+            elif self._profiler:
+                trace("Parallel rendering disabled, for profiling")
+            else:
+                trace("Parallel rendering with %s workers" % workers)
+                self._parallel = ParallelRenderer(workers)
+                self._parallel.start(self, config, files)
+        # async macros: render the pages concurrently
+        if self._async and not self._parallel:
+            self._render_batch(config, files)
+
+    def _render_batch(self, config, files):
+        """
+        Pre-render the pages in one batch, on the event loop,
+        so that the async macros of different pages run concurrently.
+        `on_page_markdown()` then collects the results.
+        """
+        if self.pre_macro_functions:
+            trace("Batch rendering disabled (on_pre_page_macros hooks)")
+            return
+        jobs = {}
+        for file in files.documentation_pages():
+            page = file.page
+            if page is None:
+                continue
+            # NOTE: not page.read_source(), which would trigger the
+            # on_page_read_source event of the plugins a second time
+            # (if they change the source, the page is rendered again):
+            try:
+                try:
+                    source = file.content_string
+                except AttributeError:
+                    # mkdocs < 1.6
+                    with open(file.abs_src_path,
+                              encoding='utf-8-sig') as f:
+                        source = f.read()
+                markdown, meta = get_data(source)
+                force_rendering = self.force_page_rendering(file.src_path)
+                if not (self._must_render(meta, force_rendering)
+                        and self.has_j2(markdown)):
+                    continue
+            except Exception:
+                # will be reported when the page is rendered
+                continue
+            # for the templates (mkdocs sets it again, when reading):
+            page.meta = meta
+            jobs[file.src_path] = (markdown, meta,
+                                   self._render_page_async(page, markdown,
+                                                           meta))
+        # as `env.page`, `env.variables['page']` follows the page
+        # being rendered (until on_page_markdown() sets it):
+        self.variables.dynamic('page', _CURRENT_PAGE.get)
+        self._async.render_batch(jobs)
+
+    async def _render_page_async(self, page, markdown: str,
+                                 meta: dict) -> str:
+        """
+        Render a page of the batch, with its own context
+        (each task has its own context variables, see `render_page()`)
+        """
+        _CURRENT_PAGE.set(page)
+        _CURRENT_MARKDOWN.set(markdown)
+        render = lambda markdown: self._render_markdown_async(
+            markdown, page, meta)
+        if self._tracker:
+            return await self._tracker.render_async(page, markdown, render)
+        return await render(markdown)
+
     def on_serve(self, server, config, **kwargs):
         """
         Called when the serve command is used during development.
@@ -917,6 +1592,19 @@ class MacrosPlugin(BasePlugin):
         # define directories to add, keep non nulls
         additional = [self.config['include_dir']  # markdown includes
                       ]
+        # data files and local module, which define variables and macros
+        for el in self.config['include_yaml']:
+            try:
+                [[_, filename]] = el.items()
+            except AttributeError:
+                filename = el
+            additional.append(os.path.join(self.project_dir, filename))
+        module_path = os.path.join(self.project_dir,
+                                   self.config['module_name'])
+        for pathname in (module_path + '.py', module_path):
+            if os.path.exists(pathname):
+                additional.append(pathname)
+                break
         additional = [el for el in additional if el]
         if additional:
             trace("We will also watch:", additional)
@@ -949,7 +1637,34 @@ class MacrosPlugin(BasePlugin):
             # Update the page info in the document
             # page is an object with a number of properties (title, url, ...)
             # see: https://github.com/mkdocs/mkdocs/blob/master/mkdocs/structure/pages.py
-            self.variables["page"] = copy(page)
+            # NOTE: no copy, render() puts the page in its own layer;
+            # this is for macros that use `env.variables['page']`
+            self.variables["page"] = page
+            timer = self._page_timer
+            if timer:
+                timer.start(page.file.src_path)
+            if self._parallel:
+                # the page might already have been rendered by a worker
+                result = self._parallel.result(page, markdown)
+                if result:
+                    self._markdown, title, record, stats = result
+                    if title is not None:
+                        page.title = title
+                    if record is not None and self._tracker:
+                        self._tracker.set_record(page.file.src_path, record)
+                    # the statistics of the worker, for the trace:
+                    unmarked, reused, rendered = stats
+                    self._unmarked_count += unmarked
+                    if self._tracker:
+                        self._tracker.reused += reused
+                        self._tracker.rendered += rendered
+                    if timer:
+                        timer.lap('render')
+                    return self.markdown
+            # the page might already have been rendered in a batch
+            rendered = None
+            if self._async:
+                rendered = self._async.result(page, markdown)
             # Define whether we must force the rendering of this page,
             # based on filename (relative to docs_dir directory)
             filename = page.file.src_path
@@ -960,11 +1675,24 @@ class MacrosPlugin(BasePlugin):
             # execute the pre-macro functions in the various modules
             for func in self.pre_macro_functions:
                 func(self)
+            if timer:
+                timer.lap('pre_hooks')
             # render the macros
-            self.markdown = self.render(
-                markdown=self.markdown,
-                force_rendering=force_rendering
-            )
+            if rendered is not None:
+                self.markdown = rendered
+            elif self._tracker:
+                # reuse the previous result, if nothing changed
+                self.markdown = self._tracker.render(
+                    page, self.markdown,
+                    lambda markdown: self.render_page(
+                        markdown, page,
+                        force_rendering=force_rendering))
+            else:
+                self.markdown = self.render_page(
+                    self.markdown, page,
+                    force_rendering=force_rendering)
+            if timer:
+                timer.lap('render')
             # Convert macros in the title from render (if exists)
             # to answer 144
             # There is a bizarre issue #215 where setting the title
@@ -974,10 +1702,14 @@ class MacrosPlugin(BasePlugin):
                 page.title = self.render(markdown=page.title,
                                         force_rendering=force_rendering)
                 debug("Page title after macro rendering:",page.title)      
+            if timer:
+                timer.lap('title')
 
             # execute the post-macro functions in the various modules
             for func in self.post_macro_functions:
                 func(self)
+            if timer:
+                timer.lap('post_hooks')
             
         return self.markdown
 
@@ -986,6 +1718,134 @@ class MacrosPlugin(BasePlugin):
         Hook for post build actions, typically adding
         raw files to the setup.
         """
+        if self._parallel:
+            trace("Parallel rendering:", self._parallel.stats())
+            self._parallel.shutdown()
+        if self._async:
+            trace("Async rendering:", self._async.stats())
+        trace("Pages without Jinja2 markers (not rendered):",
+              self._unmarked_count)
+        trace("Template cache:", self.template_cache.stats())
+        self.template_cache.prune()
+        for category, items in (('macro', self.macros),
+                                ('filter', self.filters)):
+            for name, func in items.items():
+                memo = getattr(func, 'memo', None)
+                if memo is not None:
+                    trace("Cache of %s '%s':" % (category, name),
+                          memo.stats())
+        if self._lazy_mounts:
+            trace("Lazy yaml subtrees:", SUBTREES.stats())
+        if self._tracker:
+            trace("Incremental rendering:", self._tracker.stats())
+            self._tracker.end_build()
+        if self._profiler:
+            filename = self._report_file(PROFILE_FILE)
+            trace("Profile of macros and filters (see %s):" % filename,
+                  payload=self._profiler.table)
+            self._profiler.save(filename)
+        if self._page_timer:
+            filename = self._report_file(PAGE_TIMING_FILE)
+            trace("Slowest pages, in seconds (see %s):" % filename,
+                  payload=lambda: self._page_timer.table(
+                      self.config['page_timing']))
+            self._page_timer.save(filename)
+        if self.config['memory_report']:
+            trace("Memory used:", payload=self._memory_report)
         # execute the functions in the various modules
         for func in self.post_build_functions:
             func(self)
+        if (self._command == 'serve' and not self._profiler
+                and not self._registered):
+            # kept for the next build, if nothing changed:
+            self._warm = self._warm_key
+        self._end_build()
+
+    def _report_file(self, name: str) -> str:
+        """
+        The path of a report: in the cache directory if set,
+        otherwise in the temporary directory of the system
+        (not in the project, where it could be committed).
+        """
+        cache_dir = self.config['cache_dir']
+        if cache_dir:
+            directory = os.path.join(self.project_dir, cache_dir)
+            os.makedirs(directory, exist_ok=True)
+        else:
+            import tempfile
+            directory = tempfile.gettempdir()
+        return os.path.join(directory, name)
+
+    def _new_page_timer(self):
+        "The timer of the phases of pages, if `page_timing` is set"
+        if not self.config['page_timing']:
+            return None
+        from mkdocs_macros.profiling import PageTimer
+        return PageTimer()
+
+    def _memory_caches(self) -> dict:
+        "The caches kept in memory, by name"
+        r = dict(MEMORY_CACHES)
+        if self._tracker:
+            r['pages (incremental)'] = self._tracker._records
+        if self._async:
+            r['async calls'] = self._async._calls
+        for category, items in (('macro', self.macros),
+                                ('filter', self.filters)):
+            for name, func in items.items():
+                memo = getattr(func, 'memo', None)
+                if memo is not None:
+                    r["%s '%s'" % (category, name)] = memo
+        return r
+
+    def _memory_report(self) -> str:
+        "Table of the memory used, for the trace"
+        from mkdocs_macros.profiling import traced_memory, memory_table
+        rows = [('variables', len(self.variables), sizeof(self.variables),
+                 None)]
+        for name, cache in self._memory_caches().items():
+            rows.append((name, len(cache), cache.nbytes,
+                         cache.max_bytes))
+        # the templates of include_dir, kept by jinja2:
+        if self.env.cache is not None:
+            rows.append(('include templates', len(self.env.cache),
+                         sizeof(dict(self.env.cache._mapping)), None))
+        # allocated by the plugin and the local module:
+        pathnames = [os.path.dirname(__file__)]
+        module_path = os.path.join(self.project_dir,
+                                   self.config['module_name'])
+        for pathname in (module_path + '.py', module_path):
+            if os.path.exists(pathname):
+                pathnames.append(pathname)
+                break
+        rows.append(('allocated (tracemalloc)', None,
+                     traced_memory(pathnames), None))
+        return memory_table(rows)
+
+    def _end_build(self):
+        """
+        The same instance can be used for the next build
+        (mkdocs serve): from now on, external macros, filters
+        and variables must wait for the next on_config().
+
+        NOTE: The variables, macros and filters remain available
+              (e.g. for the `on_post_build` hooks of other plugins),
+              until the next on_config().
+        """
+        self._configured = False
+
+    def on_shutdown(self):
+        """
+        Called once, at the end of the mkdocs command (mkdocs >= 1.4).
+        """
+        if self._async:
+            self._async.close()
+            self._async = None
+
+    def on_build_error(self, error):
+        """
+        Clean up, in case of a failed build.
+        """
+        if getattr(self, '_parallel', None):
+            self._parallel.shutdown()
+        self._end_build()
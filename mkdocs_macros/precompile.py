@@ -0,0 +1,118 @@
+"""
+Precompiled templates of the include directory
+(`precompile_includes` parameter).
+
+The templates of `include_dir` (for `{% include %}` and `{% import %}`)
+are compiled ahead of time into Python modules
+(`Environment.compile_templates()`), in the cache directory;
+only those that changed since the last build are compiled again.
+
+They are loaded by a `ModuleLoader`, with a fallback on the sources
+(e.g. for a template with a syntax error, which must be reported
+when it is used).
+
+Laurent Franceschetti (c) 2025
+"""
+
+import os
+import json
+import glob
+import importlib
+
+from jinja2 import ChoiceLoader, ModuleLoader, FileSystemLoader
+
+
+# File where the state of the compiled templates is kept
+MANIFEST = 'manifest.json'
+
+
+class IncludeLoader(ChoiceLoader):
+    """
+    Loader that prefers the precompiled templates,
+    and falls back to the sources.
+
+    The sources are always read from the directory
+    (e.g. for the dependencies of pages).
+    """
+
+    def __init__(self, source_loader: FileSystemLoader, compiled_dir: str):
+        self.source_loader = source_loader
+        self.compiled_dir = compiled_dir
+        super().__init__([ModuleLoader(compiled_dir), source_loader])
+
+    def get_source(self, environment, template):
+        return self.source_loader.get_source(environment, template)
+
+    def list_templates(self):
+        return self.source_loader.list_templates()
+
+
+def _remove_module(compiled_dir: str, filename: str):
+    "Remove a compiled template (and its bytecode)"
+    path = os.path.join(compiled_dir, filename)
+    if os.path.exists(path):
+        os.remove(path)
+    name = os.path.splitext(filename)[0]
+    for pyc in glob.glob(os.path.join(compiled_dir, '__pycache__',
+                                      name + '.*.pyc')):
+        os.remove(pyc)
+
+
+def precompile(env, include_dir: str, compiled_dir: str) -> tuple:
+    """
+    Compile the templates of the include directory that changed
+    (by modification time and size) into `compiled_dir`,
+    and remove those whose source no longer exists.
+
+    The loader of the environment must be an `IncludeLoader`.
+
+    Returns the number of templates compiled and removed.
+    """
+    os.makedirs(compiled_dir, exist_ok=True)
+    manifest_file = os.path.join(compiled_dir, MANIFEST)
+    try:
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    names = env.loader.list_templates()
+    # templates removed:
+    removed = [name for name in manifest if name not in names]
+    for name in removed:
+        _remove_module(compiled_dir, ModuleLoader.get_module_filename(name))
+        del manifest[name]
+    # templates new or modified:
+    compiled = []
+    states = {}
+
+    def changed(name: str) -> bool:
+        "Filter: must this template be compiled again?"
+        stat = os.stat(os.path.join(include_dir, name))
+        state = [stat.st_mtime_ns, stat.st_size]
+        if manifest.get(name) == state:
+            return False
+        manifest.pop(name, None)
+        _remove_module(compiled_dir, ModuleLoader.get_module_filename(name))
+        try:
+            with open(os.path.join(include_dir, name), encoding='utf-8') as f:
+                f.read()
+        except UnicodeDecodeError:
+            # not a template
+            return False
+        states[name] = state
+        compiled.append(name)
+        return True
+
+    errors = []
+    env.compile_templates(compiled_dir, filter_func=changed, zip=None,
+                          ignore_errors=True, log_function=errors.append)
+    for name in compiled:
+        # the templates with a syntax error are not compiled:
+        if os.path.exists(os.path.join(
+                compiled_dir, ModuleLoader.get_module_filename(name))):
+            manifest[name] = states[name]
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f)
+    # new modules must be found by the import system:
+    importlib.invalidate_caches()
+    return len(compiled), len(removed)
@@ -0,0 +1,279 @@
+"""
+Profiling of the macros and filters (`profile` parameter),
+timing of the pages (`page_timing` parameter)
+and memory used (`memory_report` parameter).
+
+When profiling is on, every macro and filter is wrapped, so that
+its calls are timed: number of calls, total time, self time
+(i.e. excluding the calls to other macros or filters)
+and the page where it took the most time.
+
+When profiling is off, nothing is wrapped (no overhead).
+
+The timing of pages records the time spent in each phase of
+`on_page_markdown()` (hooks, rendering, title), for each page.
+
+The memory report gives the size of the variables and caches,
+and the memory allocated by the plugin (and the modules of the project)
+that is still in use, according to `tracemalloc`.
+
+Laurent Franceschetti (c) 2025
+"""
+
+import os
+import json
+import inspect
+import functools
+import tracemalloc
+from time import perf_counter
+from contextvars import ContextVar
+
+from mkdocs_macros.cache import format_size
+
+
+# The frame of the profiled call in progress: [time spent in sub-calls]
+_FRAME = ContextVar('macros_profile_frame', default=None)
+
+
+class CallStats(object):
+    "Statistics on the calls of a macro or filter"
+
+    def __init__(self, category: str, name: str):
+        self.category = category
+        self.name = name
+        self.calls = 0
+        self.total = 0.0
+        self.self_time = 0.0
+        # total time, by page:
+        self.pages = {}
+
+    def add(self, page: str, total: float, self_time: float):
+        "Record a call"
+        self.calls += 1
+        self.total += total
+        self.self_time += self_time
+        self.pages[page] = self.pages.get(page, 0.0) + total
+
+    @property
+    def slowest_page(self):
+        "The page where the calls took the most time (or None)"
+        if not self.pages:
+            return None
+        return max(self.pages, key=self.pages.get)
+
+    def to_dict(self) -> dict:
+        slowest_page = self.slowest_page
+        return {'category': self.category,
+                'name': self.name,
+                'calls': self.calls,
+                'total': self.total,
+                'self': self.self_time,
+                'slowest_page': slowest_page,
+                'slowest_page_time': self.pages.get(slowest_page, 0.0)}
+
+
+class Profiler(object):
+    """
+    Times the calls of the macros and filters.
+
+    Arguments:
+    - current_page: function that returns the name of the page
+      being rendered (or None)
+    """
+
+    def __init__(self, current_page):
+        self.current_page = current_page
+        # statistics by (category, name):
+        self.stats = {}
+
+    def _record(self, stats: CallStats, start: float, token):
+        "Record a call that started at `start`"
+        frame = _FRAME.get()
+        _FRAME.reset(token)
+        total = perf_counter() - start
+        parent = _FRAME.get()
+        if parent is not None:
+            parent[0] += total
+        stats.add(self.current_page(), total, total - frame[0])
+
+    def wrap(self, category: str, name: str, func):
+        "Wrap a macro or filter (possibly async), so that it is timed"
+        stats = self.stats.setdefault((category, name),
+                                      CallStats(category, name))
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                token = _FRAME.set([0.0])
+                start = perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self._record(stats, start, token)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                token = _FRAME.set([0.0])
+                start = perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._record(stats, start, token)
+        return wrapper
+
+    def report(self) -> list:
+        "The statistics of the macros and filters called, by total time"
+        r = [stats.to_dict() for stats in self.stats.values()
+             if stats.calls]
+        r.sort(key=lambda item: item['total'], reverse=True)
+        return r
+
+    def table(self, limit: int = 20) -> str:
+        "Text table of the macros and filters that took the most time"
+        lines = ['%-30s %8s %10s %10s  %s' %
+                 ('Name', 'Calls', 'Total (s)', 'Self (s)', 'Slowest page')]
+        for item in self.report()[:limit]:
+            name = '%s (%s)' % (item['name'], item['category'])
+            lines.append('%-30s %8d %10.4f %10.4f  %s' %
+                         (name, item['calls'], item['total'], item['self'],
+                          item['slowest_page']))
+        return '\n'.join(lines)
+
+    def save(self, filename: str):
+        "Write the report (json)"
+        with open(filename, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+# ------------------------------------------
+# Timing of pages
+# ------------------------------------------
+
+# The phases of the processing of a page, by `on_page_markdown()`:
+PAGE_PHASES = ('pre_hooks', 'render', 'title', 'post_hooks')
+
+# Percentiles in the report of pages:
+PERCENTILES = (50, 90, 99, 100)
+
+
+def percentile(values: list, p: float) -> float:
+    "Percentile of a list of values (nearest rank)"
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = max(1, -(-len(values) * p // 100))  # ceiling
+    return values[int(rank) - 1]
+
+
+class PageTimer(object):
+    """
+    Times the phases of the processing of each page
+    (see PAGE_PHASES).
+
+    Usage:
+        timer.start(src_path)
+        ...
+        timer.lap('pre_hooks')
+        ...
+        timer.lap('render')
+    """
+
+    def __init__(self):
+        # {page: {phase: time}}
+        self.pages = {}
+        self._current = None
+        self._last = 0.0
+
+    def start(self, page: str):
+        "Start timing a page"
+        self._current = self.pages.setdefault(
+            page, dict.fromkeys(PAGE_PHASES, 0.0))
+        self._last = perf_counter()
+
+    def lap(self, phase: str):
+        "Record the time spent in a phase, since the previous lap"
+        now = perf_counter()
+        if self._current is not None:
+            self._current[phase] += now - self._last
+        self._last = now
+
+    def rows(self) -> list:
+        "One row per page, by total time"
+        r = []
+        for page, phases in self.pages.items():
+            row = {'page': page}
+            row.update(phases)
+            row['total'] = sum(phases.values())
+            r.append(row)
+        r.sort(key=lambda row: row['total'], reverse=True)
+        return r
+
+    def report(self) -> dict:
+        "The rows of the pages, and the percentiles of each phase"
+        rows = self.rows()
+        percentiles = {}
+        for phase in PAGE_PHASES + ('total',):
+            values = [row[phase] for row in rows]
+            percentiles[phase] = {'p%s' % p: percentile(values, p)
+                                  for p in PERCENTILES}
+        return {'pages': rows, 'percentiles': percentiles}
+
+    def table(self, limit: int = 10) -> str:
+        "Text table of the slowest pages (in seconds)"
+        lines = ['%-40s' % 'Page' + ''.join('%12s' % phase for phase
+                                            in PAGE_PHASES + ('total',))]
+        for row in self.rows()[:limit]:
+            lines.append('%-40s' % row['page'] +
+                         ''.join('%12.4f' % row[phase] for phase
+                                 in PAGE_PHASES + ('total',)))
+        return '\n'.join(lines)
+
+    def save(self, filename: str):
+        "Write the report (json)"
+        with open(filename, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+# ------------------------------------------
+# Memory
+# ------------------------------------------
+
+# Frames kept by tracemalloc for each allocation (enough to find
+# the plugin under the calls to Jinja2, YAML, etc.):
+MEMORY_FRAMES = 25
+
+
+def start_memory_tracing() -> bool:
+    "Start tracing the allocations; return False if already done"
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(MEMORY_FRAMES)
+    return True
+
+
+def traced_memory(pathnames: list) -> int:
+    """
+    Memory allocated from the code of those files or directories
+    (at any level of the call stack), and still in use (bytes).
+    """
+    if not tracemalloc.is_tracing():
+        return 0
+    filters = []
+    for pathname in pathnames:
+        if os.path.isdir(pathname):
+            pathname = os.path.join(pathname, '*')
+        filters.append(tracemalloc.Filter(True, pathname, all_frames=True))
+    snapshot = tracemalloc.take_snapshot().filter_traces(filters)
+    return sum(trace.size for trace in snapshot.traces)
+
+
+def memory_table(rows: list) -> str:
+    """
+    Text table of the memory used:
+    rows are (name, number of entries or None, size, budget or None).
+    """
+    lines = ['%-30s %8s %12s %12s' % ('Name', 'Entries', 'Size', 'Budget')]
+    for name, entries, size, budget in rows:
+        lines.append('%-30s %8s %12s %12s' % (
+            name, '' if entries is None else entries, format_size(size),
+            '' if budget is None else format_size(budget)))
+    return '\n'.join(lines)
@@ -0,0 +1,489 @@
+"""
+Data sources (`data_sources` parameter): tabular data files
+(CSV, JSON Lines, JSON, YAML) loaded into a SQLite database,
+which the pages can query with the `query()` macro.
+
+Each source becomes a table, with the indexes declared;
+it is loaded again only when its file changes (the database
+is kept in the cache directory, if any, or in memory for the rebuilds
+of `mkdocs serve`).
+
+A CSV or JSON Lines file can also be read directly, as a stream
+of rows (`rows()` macro, see `Rows`), without loading it in memory.
+
+Laurent Franceschetti (c) 2025
+"""
+
+import os
+import re
+import csv
+import json
+import mmap
+import time
+import sqlite3
+import pathlib
+import threading
+
+from mkdocs_macros.cache import hash_text
+from mkdocs_macros.data import parse_yaml
+
+
+# Name of the database, in the cache directory
+DATABASE_FILE = 'data.sqlite'
+
+# Table where the state of the sources is kept
+STATE_TABLE = '_macros_sources'
+
+# Number of rows inserted at once
+BATCH_SIZE = 10000
+
+# The databases, by filename, kept for the rebuilds of `mkdocs serve`
+_DATABASES = {}
+
+
+def quote(name: str) -> str:
+    "Quote an SQL identifier (table or column)"
+    return '"%s"' % str(name).replace('"', '""')
+
+
+# The values of a CSV file that are numbers: plain decimal notation,
+# without leading zeros (e.g. zip codes or identifiers remain strings),
+# and integers that fit in SQLite (64 bits):
+INTEGER = re.compile(r'-?(0|[1-9][0-9]{0,17})')
+DECIMAL = re.compile(r'-?(0|[1-9][0-9]*)\.[0-9]+')
+
+
+def convert(value):
+    """
+    Convert a value of a CSV file (string) into a number,
+    if it is written as one (see `INTEGER` and `DECIMAL`);
+    an empty string becomes NULL.
+    """
+    if value == '' or value is None:
+        return None
+    if INTEGER.fullmatch(value):
+        return int(value)
+    if DECIMAL.fullmatch(value):
+        return float(value)
+    return value
+
+
+def source_spec(name: str, spec) -> dict:
+    """
+    Interpret the declaration of a source: either a filename,
+    or a dictionary with `file`, `indexes` (optional)
+    and `format` (optional, by default the extension of the file).
+    """
+    if isinstance(spec, str):
+        spec = {'file': spec}
+    if not isinstance(spec, dict) or 'file' not in spec:
+        raise ValueError("Data source '%s': a filename or a dictionary "
+                         "with a `file` key is expected" % name)
+    indexes = []
+    for index in spec.get('indexes', []):
+        indexes.append([index] if isinstance(index, str) else list(index))
+    file_format = spec.get('format') or \
+        os.path.splitext(spec['file'])[1].lstrip('.').lower()
+    if file_format == 'yml':
+        file_format = 'yaml'
+    if file_format not in READERS:
+        raise ValueError("Data source '%s': unknown format '%s' %s" %
+                         (name, file_format, tuple(READERS)))
+    return {'file': spec['file'], 'indexes': indexes, 'format': file_format}
+
+
+# ------------------------------------------
+# Readers: (columns, iterator of rows)
+# ------------------------------------------
+
+def read_csv(filename: str):
+    "Read a CSV file (with a header)"
+    f = open(filename, newline='', encoding='utf-8-sig')
+    reader = csv.reader(f)
+    try:
+        columns = next(reader)
+    except StopIteration:
+        f.close()
+        return [], iter(())
+
+    def rows():
+        with f:
+            for row in reader:
+                yield [convert(value) for value in row]
+    return columns, rows()
+
+
+def records_table(records) -> tuple:
+    "Columns and rows of a list of dictionaries (e.g. from JSON or YAML)"
+    if not isinstance(records, list):
+        raise ValueError("A list of records is expected")
+    columns = {}
+    for record in records:
+        if not isinstance(record, dict):
+            raise ValueError("A list of records is expected")
+        columns.update(dict.fromkeys(record))
+    columns = list(columns)
+
+    def rows():
+        for record in records:
+            row = []
+            for column in columns:
+                value = record.get(column)
+                if isinstance(value, (dict, list)):
+                    # nested values, as JSON:
+                    value = json.dumps(value)
+                row.append(value)
+            yield row
+    return columns, rows()
+
+
+def read_jsonl(filename: str):
+    "Read a JSON Lines file (one object per line)"
+    # the columns of all records (first pass):
+    columns = {}
+    for record in Rows(filename, file_format='jsonl'):
+        columns.update(dict.fromkeys(record))
+    columns = list(columns)
+
+    def rows():
+        for record in Rows(filename, file_format='jsonl'):
+            row = []
+            for column in columns:
+                value = record.get(column)
+                if isinstance(value, (dict, list)):
+                    value = json.dumps(value)
+                row.append(value)
+            yield row
+    return columns, rows()
+
+
+def read_json(filename: str):
+    "Read a JSON file (list of objects)"
+    with open(filename, encoding='utf-8') as f:
+        return records_table(json.load(f))
+
+
+def read_yaml(filename: str):
+    "Read a YAML file (list of mappings)"
+    content, _ = parse_yaml(filename)
+    return records_table(content)
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl, 'json': read_json,
+           'yaml': read_yaml}
+
+
+# ------------------------------------------
+# Streaming of rows
+# ------------------------------------------
+
+# Operators of the predicates (`where` argument of `Rows`)
+OPERATORS = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b,
+    'in': lambda a, b: a in b,
+}
+
+
+def mapped_lines(filename: str):
+    "Iterate over the lines of a file (bytes), memory-mapped"
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from iter(mm.readline, b'')
+
+
+class Rows(object):
+    """
+    The rows of a CSV or JSON Lines file, read from the file
+    (memory-mapped) as they are iterated; the file is read again
+    at each iteration (e.g. in two loops).
+
+    Arguments:
+    - filename: the file
+    - columns: the columns to keep (by default, all)
+    - where: conditions on the rows: {column: value}, or
+      {column: [operator, value]}, with an operator in OPERATORS
+    - limit: maximum number of rows
+    - file_format: 'csv' or 'jsonl' (by default, the extension)
+
+    The lines that cannot contain a value required by a condition
+    (`=` or `in`) are skipped before being parsed.
+    """
+
+    def __init__(self, filename: str, columns: list = None,
+                 where: dict = None, limit: int = None,
+                 file_format: str = ''):
+        self.filename = filename
+        self.columns = [columns] if isinstance(columns, str) else columns
+        self.file_format = (file_format or
+            os.path.splitext(filename)[1].lstrip('.').lower())
+        if self.file_format not in ('csv', 'jsonl'):
+            raise ValueError("Rows: unknown format '%s' ('csv', 'jsonl')" %
+                             self.file_format)
+        self.conditions = []
+        for column, condition in (where or {}).items():
+            if isinstance(condition, (list, tuple)):
+                operator, value = condition
+            else:
+                operator, value = '=', condition
+            if operator not in OPERATORS:
+                raise ValueError("Rows: unknown operator '%s' %s" %
+                                 (operator, tuple(OPERATORS)))
+            self.conditions.append((column, OPERATORS[operator], value))
+        self.limit = limit
+        # texts that a line must contain (one of each set), if any;
+        # only for simple strings, which appear as such in the file:
+        self._required = []
+        for column, test, value in self.conditions:
+            if test is OPERATORS['=']:
+                values = [value]
+            elif test is OPERATORS['in']:
+                values = value
+            else:
+                continue
+            if all(isinstance(value, str) and value.isascii()
+                   and '"' not in value and '\\' not in value
+                   for value in values):
+                self._required.append({value.encode() for value in values})
+
+    def _may_match(self, line: bytes) -> bool:
+        "Predicate: could that line match the conditions?"
+        return all(any(text in line for text in texts)
+                   for texts in self._required)
+
+    def _records(self):
+        "The records of the file (dictionaries)"
+        if self.file_format == 'jsonl':
+            for line in mapped_lines(self.filename):
+                if line.strip() and self._may_match(line):
+                    yield json.loads(line)
+            return
+        lines = (line.decode('utf-8-sig') for line in self._csv_lines())
+        reader = csv.reader(lines)
+        header = next(reader, None)
+        if header is None:
+            return
+        # only the columns needed are converted:
+        if self.columns is None:
+            positions = list(enumerate(header))
+        else:
+            needed = set(self.columns)
+            needed.update(column for column, _, _ in self.conditions)
+            positions = [(i, column) for i, column in enumerate(header)
+                         if column in needed]
+        for row in reader:
+            yield {column: convert(row[i]) if i < len(row) else None
+                   for i, column in positions}
+
+    def _csv_lines(self):
+        """
+        The lines of a CSV file, without those that cannot match
+        (only complete records are skipped: a quoted value
+        may span several lines)
+        """
+        inside = False
+        first = True
+        for line in mapped_lines(self.filename):
+            odd = line.count(b'"') % 2 == 1
+            if first or inside or odd or self._may_match(line):
+                yield line
+            first = False
+            inside = inside != odd
+
+    def __iter__(self):
+        count = 0
+        for record in self._records():
+            if self.limit is not None and count >= self.limit:
+                return
+            if not all(test(record.get(column), value)
+                       for column, test, value in self.conditions):
+                continue
+            if self.columns is not None:
+                record = {column: record.get(column)
+                          for column in self.columns}
+            count += 1
+            yield record
+
+    def first(self):
+        "The first row (or None)"
+        return next(iter(self), None)
+
+    def __repr__(self):
+        return "<Rows %s>" % self.filename
+
+
+# ------------------------------------------
+# Database
+# ------------------------------------------
+
+class QueryResult(object):
+    """
+    The rows of a query, read only when iterated
+    (and read again at each iteration, e.g. in two loops).
+
+    Each row can be used as a dictionary: `row.name` or `row['name']`.
+    """
+
+    def __init__(self, database, sql: str, params: dict,
+                 version: str = ''):
+        self.database = database
+        self.sql = sql
+        self.params = params
+        # version of the data:
+        self.version = version
+
+    def __iter__(self):
+        cursor = self.database.connection.execute(self.sql, self.params)
+        # rows are read by batches, not all at once:
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            yield from (dict(row) for row in rows)
+
+    def first(self):
+        "The first row (or None)"
+        return next(iter(self), None)
+
+    def all(self) -> list:
+        "All rows, as a list"
+        return list(self)
+
+    def __repr__(self):
+        return "<QueryResult %r %r (%s)>" % (self.sql, self.params,
+                                             self.version)
+
+
+class Database(object):
+    """
+    SQLite database containing the data sources
+    (one table for each).
+
+    Arguments:
+    - filename: file of the database (':memory:' for a database
+      in memory)
+    - read_only: open an existing file, that is only queried
+      (e.g. in worker processes)
+    """
+
+    def __init__(self, filename: str = ':memory:', read_only: bool = False):
+        self.filename = filename
+        self.lock = threading.RLock()
+        if read_only:
+            self.connection = sqlite3.connect(
+                pathlib.Path(filename).resolve().as_uri() + '?mode=ro',
+                uri=True,
+                check_same_thread=False)
+            self.connection.row_factory = sqlite3.Row
+            self.version = self._version()
+            return
+        if filename != ':memory:':
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("CREATE TABLE IF NOT EXISTS %s "
+                                "(name TEXT PRIMARY KEY, state TEXT)" %
+                                STATE_TABLE)
+        # fingerprint of the state of all sources:
+        self.version = ''
+
+    def _states(self) -> dict:
+        return dict(self.connection.execute(
+            "SELECT name, state FROM %s" % STATE_TABLE).fetchall())
+
+    def _version(self) -> str:
+        return hash_text(repr(sorted(self._states().items())))
+
+    def _load(self, name: str, spec: dict, filename: str):
+        "(Re)create the table of a source"
+        table = quote(name)
+        columns, rows = READERS[spec['format']](filename)
+        con = self.connection
+        con.execute("DROP TABLE IF EXISTS %s" % table)
+        con.execute("CREATE TABLE %s (%s)" %
+                    (table, ', '.join(quote(col) for col in columns)))
+        insert = "INSERT INTO %s VALUES (%s)" % (
+            table, ', '.join('?' * len(columns)))
+        count = 0
+        batch = []
+        for row in rows:
+            # same number of values as columns:
+            row = (list(row) + [None] * len(columns))[:len(columns)]
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                con.executemany(insert, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            con.executemany(insert, batch)
+            count += len(batch)
+        for index in spec['indexes']:
+            index_name = quote('%s_%s' % (name, '_'.join(index)))
+            con.execute("CREATE INDEX %s ON %s (%s)" %
+                        (index_name, table,
+                         ', '.join(quote(col) for col in index)))
+        return count
+
+    def update(self, sources: dict, project_dir: str) -> dict:
+        """
+        Load the sources that changed (or are new),
+        and drop the tables of the sources that were removed.
+
+        Arguments:
+        - sources: {table name: declaration} (see `source_spec()`)
+        - project_dir: the directory of the files
+
+        Returns {name: (number of rows or None if unchanged, time in s)}.
+        """
+        r = {}
+        with self.lock, self.connection as con:
+            states = self._states()
+            for name, spec in sources.items():
+                start = time.perf_counter()
+                spec = source_spec(name, spec)
+                filename = os.path.join(project_dir, spec['file'])
+                stat = os.stat(filename)
+                state = json.dumps([os.path.abspath(filename),
+                                    stat.st_mtime_ns, stat.st_size,
+                                    spec['format'], spec['indexes']])
+                if states.pop(name, None) == state:
+                    r[name] = (None, time.perf_counter() - start)
+                    continue
+                count = self._load(name, spec, filename)
+                con.execute("INSERT OR REPLACE INTO %s VALUES (?, ?)" %
+                            STATE_TABLE, (name, state))
+                r[name] = (count, time.perf_counter() - start)
+            # sources no longer declared:
+            for name in states:
+                con.execute("DROP TABLE IF EXISTS %s" % quote(name))
+                con.execute("DELETE FROM %s WHERE name = ?" % STATE_TABLE,
+                            (name,))
+            self.version = self._version()
+        return r
+
+    def query(self, sql: str, params: dict,
+              version: str = '') -> QueryResult:
+        "Query the database"
+        return QueryResult(self, sql, params, version or self.version)
+
+    def close(self):
+        "Close the database"
+        self.connection.close()
+
+
+def get_database(filename: str = ':memory:',
+                 read_only: bool = False) -> Database:
+    """
+    Get the database of a file (see `Database`);
+    the same object is reused from one build to the next.
+    """
+    database = _DATABASES.get(filename)
+    if database is None:
+        database = _DATABASES[filename] = Database(filename, read_only)
+    return database
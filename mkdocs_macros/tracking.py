@@ -0,0 +1,311 @@
+"""
+Incremental rendering of pages, for `mkdocs serve`
+(and from one build to the next, if the results are stored on disk).
+
+While a page is rendered, the engine records its dependencies:
+the names it resolved (variables and macros) and the templates it
+loaded (`{% include %}`, `{% import %}`, etc.).
+At the next rebuild, if the source of the page, its metadata
+and all those dependencies are unchanged, the previous result
+is reused.
+
+All the variables are also part of the key of every page
+(see `variables_fingerprint()`), so that a macro that reads
+`env.variables` sees the changes; as well as the config file,
+the modules and the yaml files (through the `env_key`).
+
+NOTE: Other data read by macros (e.g. external files) is not tracked:
+      incremental rendering can be disabled (`incremental` parameter).
+
+Laurent Franceschetti (c) 2025
+"""
+
+from contextvars import ContextVar
+
+from jinja2 import Environment, TemplateNotFound
+from jinja2.runtime import Context
+
+from mkdocs_macros.cache import fingerprint, hash_text, sizeof, LRUCache
+from mkdocs_macros.util import LazyVariable
+
+
+# The dependencies of the page being rendered (if tracked)
+_DEPENDENCIES = ContextVar('macros_dependencies', default=None)
+
+# Fingerprint of a name that could not be resolved
+MISSING = '#missing'
+
+# Those variables are specific to each page (never memorized)
+PAGE_VARIABLES = ('page',)
+
+# Those variables are set at each build (not in the fingerprint of the
+# variables: they are tracked by name, or covered by the config file)
+BUILD_VARIABLES = PAGE_VARIABLES + ('navigation', 'files', 'config', 'plugin')
+
+
+def variables_fingerprint(variables: dict) -> str:
+    """
+    Fingerprint of the variables, except those of the build
+    and the lazy variables not yet computed.
+    """
+    return fingerprint({name: value for name, value in dict.items(variables)
+                        if name not in BUILD_VARIABLES
+                        and not isinstance(value, LazyVariable)})
+
+
+class Dependencies(object):
+    "The dependencies of a page, recorded while it is rendered"
+
+    def __init__(self):
+        self.names = set()
+        self.templates = set()
+        # set to False if the result must not be reused (e.g. error):
+        self.cacheable = True
+
+
+def uncacheable():
+    """
+    Declare that the result of the page currently rendered
+    must not be reused (e.g. in case of error).
+    """
+    dependencies = _DEPENDENCIES.get()
+    if dependencies is not None:
+        dependencies.cacheable = False
+
+
+class TrackingContext(Context):
+    """
+    Jinja2 context that records the names resolved
+    and the templates loaded, for the page being rendered.
+    """
+
+    def __init__(self, environment, parent, name, *args, **kwargs):
+        super().__init__(environment, parent, name, *args, **kwargs)
+        dependencies = _DEPENDENCIES.get()
+        if dependencies is not None and name is not None:
+            # an included or imported template
+            dependencies.templates.add(name)
+
+    def resolve_or_missing(self, key):
+        dependencies = _DEPENDENCIES.get()
+        if dependencies is not None:
+            dependencies.names.add(key)
+        return super().resolve_or_missing(key)
+
+
+class Record(object):
+    "The result of the rendering of a page, with its dependencies"
+
+    def __init__(self, key: tuple, names: dict, templates: dict, output: str):
+        self.key = key
+        self.names = names
+        self.templates = templates
+        self.output = output
+
+    def __sizeof__(self):
+        # with the content (for the budget of the cache):
+        return object.__sizeof__(self) + sizeof(
+            (self.key, self.names, self.templates, self.output))
+
+
+class DependencyTracker(object):
+    """
+    Reuses the result of pages whose dependencies did not change,
+    from one build to the next.
+
+    The environment must use `TrackingContext` as its context class.
+
+    Arguments:
+    - in_memory: keep the records in memory (`mkdocs serve`)
+    - store: an `OutputCache` object, to keep the records on disk
+      (from one build to the next)
+    """
+
+    def __init__(self, in_memory: bool = True, store=None):
+        self.in_memory = in_memory
+        self.store = store
+        # records, by source path of the page
+        # (those evicted are looked up in the store, or rendered again):
+        self._records = LRUCache()
+        self.env = None
+        self.variables = {}
+        self.env_key = ''
+        self._names = {}
+        self._templates = {}
+        # statistics, for the trace:
+        self.reused = 0
+        self.rendered = 0
+
+    def new_build(self, env: Environment, variables: dict, env_key: str):
+        """
+        Start a new build.
+
+        Arguments:
+        - env: the Jinja2 environment
+        - variables: the variables of the environment
+        - env_key: fingerprint of what affects all pages (filters, etc.)
+        """
+        self.env = env
+        self.variables = variables
+        self.env_key = env_key
+        # fingerprints of macros (globals) and templates,
+        # computed once per build:
+        self._names = {}
+        self._templates = {}
+        self.reused = 0
+        self.rendered = 0
+
+    # ----------------------------------
+    # Fingerprints of dependencies
+    # ----------------------------------
+
+    def _name_fingerprint(self, name: str, page) -> str:
+        """
+        Fingerprint of a variable or macro.
+
+        NOTE: The variables are fingerprinted for each page, since
+              they can be changed from one page to the next
+              (e.g. by an `on_pre_page_macros()` hook).
+        """
+        if name in page.meta:
+            # covered by the key of the page
+            return ''
+        if name in self.variables:
+            return fingerprint(self.variables[name])
+        try:
+            return self._names[name]
+        except KeyError:
+            pass
+        if name in self.env.globals:
+            r = fingerprint(self.env.globals[name])
+        else:
+            r = MISSING
+        self._names[name] = r
+        return r
+
+    def _template_fingerprint(self, name: str) -> str:
+        "Fingerprint of a template loaded by a page (source)"
+        try:
+            return self._templates[name]
+        except KeyError:
+            pass
+        try:
+            source, _, _ = self.env.loader.get_source(self.env, name)
+            r = hash_text(source)
+        except TemplateNotFound:
+            r = MISSING
+        self._templates[name] = r
+        return r
+
+    def _page_key(self, page, markdown: str) -> tuple:
+        "Key of the page, for its source, metadata and environment"
+        return (hash_text(markdown), fingerprint(page.meta), self.env_key)
+
+    def _is_valid(self, record: Record, page) -> bool:
+        "Predicate: are the dependencies of that record unchanged?"
+        for name, value in record.names.items():
+            if self._name_fingerprint(name, page) != value:
+                return False
+        for name, value in record.templates.items():
+            if self._template_fingerprint(name) != value:
+                return False
+        return True
+
+    # ----------------------------------
+    # Records
+    # ----------------------------------
+
+    def get_record(self, src_path: str):
+        "Get the record of a page, from memory or disk (or None)"
+        record = self._records.get(src_path)
+        if record is None and self.store is not None:
+            record = self.store.get(hash_text(src_path))
+        return record
+
+    def set_record(self, src_path: str, record: Record):
+        "Store the record of a page (None: discard it)"
+        if record is None:
+            self._records.pop(src_path, None)
+        elif self.in_memory:
+            self._records[src_path] = record
+        if self.store is not None:
+            if record is None:
+                self.store.discard(hash_text(src_path))
+            else:
+                self.store.set(hash_text(src_path), record)
+
+    def end_build(self):
+        "End of build: save what must be saved"
+        if self.store is not None:
+            self.store.flush()
+
+    # ----------------------------------
+    # Rendering
+    # ----------------------------------
+
+    def _reusable(self, page, markdown: str):
+        """
+        Return the key of the page, and its previous record
+        if it can be reused (otherwise None).
+        """
+        key = self._page_key(page, markdown)
+        record = self.get_record(page.file.src_path)
+        if (record is not None and record.key == key
+                and self._is_valid(record, page)):
+            self.reused += 1
+            return key, record
+        return key, None
+
+    def _save(self, page, key: tuple, dependencies: Dependencies,
+              output: str):
+        "Save the record of a page that was rendered"
+        self.rendered += 1
+        src_path = page.file.src_path
+        if dependencies.cacheable:
+            names = {name: self._name_fingerprint(name, page)
+                     for name in dependencies.names}
+            templates = {name: self._template_fingerprint(name)
+                         for name in dependencies.templates}
+            self.set_record(src_path,
+                            Record(key, names, templates, output))
+        else:
+            self.set_record(src_path, None)
+
+    def render(self, page, markdown: str, render_func) -> str:
+        """
+        Render the markdown of a page with render_func(markdown),
+        unless the previous result can be reused.
+        """
+        key, record = self._reusable(page, markdown)
+        if record is not None:
+            return record.output
+        dependencies = Dependencies()
+        token = _DEPENDENCIES.set(dependencies)
+        try:
+            output = render_func(markdown)
+        finally:
+            _DEPENDENCIES.reset(token)
+        self._save(page, key, dependencies, output)
+        return output
+
+    async def render_async(self, page, markdown: str, render_func) -> str:
+        """
+        Same as `render()`, with a coroutine function
+        (the rendering of several pages can be concurrent).
+        """
+        key, record = self._reusable(page, markdown)
+        if record is not None:
+            return record.output
+        dependencies = Dependencies()
+        token = _DEPENDENCIES.set(dependencies)
+        try:
+            output = await render_func(markdown)
+        finally:
+            _DEPENDENCIES.reset(token)
+        self._save(page, key, dependencies, output)
+        return output
+
+    def stats(self) -> str:
+        "Short description, for the trace"
+        return ("%s page(s) reused, %s rendered" %
+                (self.reused, self.rendered))
@@ -9,17 +9,17 @@ from copy import deepcopy
 import os, sys, importlib.util, shutil
 from typing import Literal
 from packaging.version import Version
+import re
 import json
 import inspect
-import requests
+import functools
 from datetime import datetime
 from typing import Any
 
 
 
-from termcolor import colored
 import mkdocs
-import hjson
+from super_collections import SuperDict
 
 
 
@@ -45,12 +45,16 @@ def format_trace(*args, payload:str=''):
     for the mkdocs-macros framework;
     it will appear if --verbose option is activated
 
-    The payload is simply some text that will be added after a newline.
+    The payload is simply some text that will be added after a newline;
+    it can also be a function that returns that text (called only here).
     """
     first = args[0]
     rest = [str(el) for el in args[1:]]
+    if callable(payload):
+        payload = payload()
     if payload:
         rest.append(f"\n{payload}")
+    from termcolor import colored
     text = "[%s] - %s" % (TRACE_PREFIX, first)
     emphasized = colored(text, TRACE_COLOR)
     return ' '.join([emphasized] + rest)
@@ -71,18 +75,25 @@ def trace(*args, payload:str='', level:str='info'):
     it will appear unless --quiet option is activated.
 
     Payload is an information that goes to the next lines
-    (typically a json dump)
+    (typically a json dump); if it is costly to produce,
+    pass a function that returns it (e.g. a lambda).
 
     The level is 'debug', 'info', 'warning', 'error' or 'critical'.
+
+    The message is formatted only if that level is enabled
+    (otherwise, None is returned).
     """
-    msg = format_trace(*args, payload=payload)
     try:
-        LOG.log(TRACE_LEVELS[level], msg)
+        log_level = TRACE_LEVELS[level]
     except KeyError:
         raise ValueError("Unknown level '%s' %s" % (level, 
                                                   tuple(TRACE_LEVELS.keys())
                                                   )
                             )
+    if not LOG.isEnabledFor(log_level):
+        return None
+    msg = format_trace(*args, payload=payload)
+    LOG.log(log_level, msg)
     return msg
     # LOG.info(msg)
 
@@ -93,9 +104,13 @@ def debug(*args, payload:str=''):
     General purpose print function, as trace,
     for the mkdocs-macros framework;
     it will appear if --verbose option is activated
+
+    As for trace(), the payload can be a function,
+    which is called only in that case.
     """
-    msg = format_trace(*args, payload=payload)
-    LOG.debug(msg)
+    if LOG.isEnabledFor(logging.DEBUG):
+        msg = format_trace(*args, payload=payload)
+        LOG.debug(msg)
 
 
 def get_log_level(level_name:str) -> bool:
@@ -109,6 +124,7 @@ def format_chatter(*args, prefix:str, color:str=TRACE_COLOR):
     Format information for env.chatter() in macros.
     (This is specific for macros)
     """
+    from termcolor import colored
     full_prefix = colored('[%s - %s] -' % (TRACE_PREFIX, prefix), 
                             color)
     args = [full_prefix] + [str(arg) for arg in args]
@@ -160,6 +176,8 @@ def is_on_pypi(source_name: str, fail_silently: bool = False) -> bool:
       (will raise a RunTime error on network error, 
       unless fail_silently=True: will report False)
     """
+    # imported here, since it is slow to import (and rarely needed):
+    import requests
     url = f"https://pypi.org/pypi/{source_name}/json"
     try:
         response = requests.get(url, timeout=3)
@@ -170,6 +188,110 @@ def is_on_pypi(source_name: str, fail_silently: bool = False) -> bool:
         raise RuntimeError(f"Unable to reach PyPI to check for '{source_name}': {e}")
 
 
+# Results of the checks on PyPI (in the cache directory):
+PYPI_CACHE_FILE = 'pypi.json'
+
+# A package that was not found on PyPI is checked again after (s):
+PYPI_CACHE_TTL = 24 * 3600
+
+
+def installed_modules(source_name: str):
+    """
+    Return the top-level modules of an installed distribution
+    (as in `pip list`), or None if it is not installed.
+    """
+    from importlib.metadata import distribution, PackageNotFoundError
+    try:
+        dist = distribution(source_name)
+    except PackageNotFoundError:
+        return None
+    top_level = dist.read_text('top_level.txt')
+    if top_level:
+        return sorted(set(top_level.split()))
+    r = set()
+    for path in dist.files or []:
+        name = path.parts[0]
+        if name.endswith('.py'):
+            r.add(name[:-3])
+        elif (len(path.parts) > 1 and '.' not in name
+                and name != '__pycache__'):
+            r.add(name)
+    return sorted(r)
+
+
+def package_key(name: str) -> str:
+    "Normalized name of a package (for comparisons)"
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+@functools.lru_cache(maxsize=None)
+def known_packages() -> frozenset:
+    """
+    The packages that are known to exist without network access:
+    the requirements declared by the installed distributions
+    (including optional ones, e.g. the pluglets for the tests).
+
+    Returns a set of normalized names (see `package_key()`).
+    """
+    from importlib.metadata import distributions
+    r = set()
+    for dist in distributions():
+        for requirement in dist.requires or []:
+            name = re.match(r'\s*([A-Za-z0-9][A-Za-z0-9._-]*)', requirement)
+            if name:
+                r.add(package_key(name.group(1)))
+    return frozenset(r)
+
+
+def find_pluglet(source_name: str, online: bool = False,
+                 cache_file: str = '') -> str:
+    """
+    Find out why a pluglet could not be imported, without network
+    access unless `online` is set.
+
+    Parameters:
+    - source_name: the name of the package (for pip install)
+    - online: check on PyPI, if not known locally
+    - cache_file: json file where the results of PyPI are kept (optional)
+
+    Returns:
+    - 'installed': the package is installed (wrong module name?)
+    - 'on_pypi': the package exists on PyPI (not installed)
+    - 'not_found': the package does not exist on PyPI
+    - 'unknown': could not tell (offline)
+    """
+    if installed_modules(source_name) is not None:
+        return 'installed'
+    key = package_key(source_name)
+    if key in known_packages():
+        return 'on_pypi'
+    cache = {}
+    if cache_file and os.path.isfile(cache_file):
+        try:
+            with open(cache_file) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+    entry = cache.get(key)
+    if entry is not None:
+        found, timestamp = entry
+        if found or datetime.now().timestamp() - timestamp < PYPI_CACHE_TTL:
+            return 'on_pypi' if found else 'not_found'
+    if not online:
+        return 'unknown'
+    try:
+        found = is_on_pypi(source_name)
+    except RuntimeError:
+        # network error (not cached)
+        return 'unknown'
+    if cache_file:
+        cache[key] = [found, datetime.now().timestamp()]
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file, 'w') as f:
+            json.dump(cache, f, indent=2)
+    return 'on_pypi' if found else 'not_found'
+
+
 def import_local_module(project_dir, module_name):
     """
     Import a module from a pathname.
@@ -206,6 +328,80 @@ def import_local_module(project_dir, module_name):
         raise ImportError(f"Cannot import module '{module_name}'")
 
 
+def is_async(func) -> bool:
+    "Predicate: is this function a coroutine function (`async def`)?"
+    while isinstance(func, functools.partial):
+        func = func.func
+    return inspect.iscoroutinefunction(func)
+
+
+# ------------------------------------------
+# Variables
+# ------------------------------------------
+
+class LazyVariable(object):
+    """
+    A variable whose value is computed by a factory (function without
+    arguments), the first time it is accessed.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+
+    def __repr__(self):
+        name = getattr(self.factory, '__name__', type(self.factory).__name__)
+        return '<lazy: %s()>' % name
+
+
+class DynamicVariable(LazyVariable):
+    """
+    A variable whose value is computed by a factory each time
+    it is accessed (it is not kept).
+    """
+
+
+class Variables(SuperDict):
+    """
+    The variables of the environment.
+
+    A variable can be lazy: its value is computed the first time
+    it is accessed (e.g. by a template), and then kept for the rest
+    of the build:
+
+        env.variables.lazy('git', get_git_info)
+
+    NOTE: `items()` and `values()` return the lazy variables
+          that were not yet evaluated as such (`LazyVariable`).
+    """
+
+    def lazy(self, name: str, factory):
+        "Declare a lazy variable"
+        dict.__setitem__(self, name, LazyVariable(factory))
+
+    def dynamic(self, name: str, factory):
+        "Declare a dynamic variable"
+        dict.__setitem__(self, name, DynamicVariable(factory))
+
+    def is_lazy(self, name: str) -> bool:
+        "Predicate: is this a lazy variable, not yet evaluated?"
+        return isinstance(dict.get(self, name), LazyVariable)
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if isinstance(value, DynamicVariable):
+            return value.factory()
+        if isinstance(value, LazyVariable):
+            value = value.factory()
+            dict.__setitem__(self, key, value)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
 # ------------------------------------------
 # Arithmetic
 # ------------------------------------------
@@ -269,6 +465,20 @@ def setup_directory(reference_dir: str, dir_name: str,
         os.makedirs(new_dir)
     return new_dir
 
+
+# Size of the output kept in memory, in streaming mode, before it is
+# spooled to a temporary file (bytes):
+SPOOL_MAX_SIZE = 1024 * 1024
+
+def spooled_output():
+    """
+    Temporary text file, for writing a large output by chunks:
+    it is kept in memory up to SPOOL_MAX_SIZE, then on disk.
+    """
+    import tempfile
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='w+',
+                                         encoding='utf-8', newline='')
+
 if __name__ == '__main__':
     # test merging of dictionaries
     a = {'foo': 4, 'bar': 5}
@@ -0,0 +1,157 @@
+"""
+Testing the async macros (`async def`)
+"""
+
+import os
+import json
+import asyncio
+from collections import ChainMap
+from contextvars import ContextVar
+
+from jinja2 import Environment
+
+from mkdocs_macros.asynchronous import AsyncRenderer, constant_calls
+from .fixture import MacrosDocProject
+
+
+# ----------------------
+# Within a page
+# ----------------------
+
+class Probe(object):
+    "Count the calls in progress"
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+
+    async def fetch(self, name, delay=0.05):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.in_flight, self.max_in_flight)
+        await asyncio.sleep(delay)
+        self.in_flight -= 1
+        return name.upper()
+
+
+SOURCE = ("{{ fetch('a') }} {{ fetch('b', delay=0.01) }} "
+          "{% if false %}{{ fetch('c') }}{% endif %}{{ fetch(x) }}")
+
+# calls that might not be executed:
+CONDITIONAL_SOURCE = """
+{% if fetch('test') %}{{ fetch('then') }}{% else %}{{ fetch('else') }}{% endif %}
+{% for item in fetch('items') %}{{ fetch('loop') }}{% endfor %}
+{% macro show() %}{{ fetch('macro') }}{% endmacro %}
+{% call fetch('call') %}{{ fetch('caller') }}{% endcall %}
+{{ fetch('yes') if x else fetch('no') }} {{ x and fetch('and') }}
+"""
+
+
+def test_constant_calls():
+    "Only the calls with constant arguments, always executed, are found"
+    ast = Environment().parse(SOURCE)
+    assert constant_calls(ast, ['fetch']) == [
+        ('fetch', ('a',), ()),
+        ('fetch', ('b',), (('delay', 0.01),))]
+    assert constant_calls(ast, ['foo']) == []
+    ast = Environment().parse(CONDITIONAL_SOURCE)
+    assert [args for _, args, _ in constant_calls(ast, ['fetch'])] == [
+        ('test',), ('items',), ('call',)]
+
+
+def test_async_render():
+    "The independent calls of a page overlap"
+    probe = Probe()
+    renderer = AsyncRenderer()
+    env = Environment(enable_async=True)
+    env.globals.update(renderer.new_build(env, {'fetch': probe.fetch}))
+    template = env.from_string(SOURCE)
+    context = ChainMap({'x': 'd'}, template.globals)
+    result = renderer.run(renderer.render(template, context, SOURCE))
+    renderer.close()
+    assert result == 'A B D'
+    assert probe.max_in_flight == 2
+    assert renderer.prefetched == 2
+
+
+def test_run_nested():
+    "A coroutine run while the loop is running sees the context variables"
+    var = ContextVar('var', default=None)
+    renderer = AsyncRenderer()
+
+    async def inner():
+        return var.get()
+
+    async def outer():
+        var.set('page')
+        return renderer.run(inner())
+
+    assert renderer.run(outer()) == 'page'
+    renderer.close()
+
+
+# ----------------------
+# Whole project
+# ----------------------
+
+MODULE = '''
+import os
+import json
+import asyncio
+
+STATS = {'in_flight': 0, 'max_in_flight': 0}
+
+def define_env(env):
+    "Async macro"
+
+    @env.macro
+    async def fetch(name):
+        "Simulate a call to a service"
+        STATS['in_flight'] += 1
+        STATS['max_in_flight'] = max(STATS['max_in_flight'],
+                                     STATS['in_flight'])
+        await asyncio.sleep(0.05)
+        STATS['in_flight'] -= 1
+        return name.upper() + ' of ' + env.page.file.src_path
+
+    @env.macro
+    async def where():
+        "The page and markdown, as seen by a macro"
+        await asyncio.sleep(0.01)
+        return 'In %s (%s chars)' % (env.variables['page'].file.src_path,
+                                     len(env.markdown))
+
+def on_post_build(env):
+    "Save the statistics"
+    with open(os.path.join(env.project_dir, 'stats.json'), 'w') as f:
+        json.dump(STATS, f)
+'''
+
+NO_PAGES = 4
+
+def test_async_project():
+    "The pages are rendered concurrently"
+    p = MacrosDocProject(os.path.join('_temp', 'async'), new=True)
+    p.clear()
+    p.make_config(site_name='Async', plugins=['search', 'test', 'macros'])
+    p.add_file('main.py', MODULE)
+    for no in range(NO_PAGES):
+        p.add_source_page(f"page{no}.md",
+                          f"# Page {no}\n\n{{{{ fetch('hello') }}}}, "
+                          f"{{{{ fetch('bye') }}}}\n\n{{{{ where() }}}}\n")
+    # rendered serially:
+    p.add_source_page('title.md', "No call",
+                      meta={'title': "{{ fetch('title') }}"})
+    p.build(strict=True)
+    assert p.success
+    for no in range(NO_PAGES):
+        page = p.get_page(f'page{no}')
+        assert page.find_text(f'HELLO of page{no}.md, BYE of page{no}.md')
+        assert page.find_text(rf'In page{no}.md \(\d+ chars\)')
+    assert p.get_page('title').find_text('TITLE of title.md')
+    entry = p.find_entry('Async rendering:', source='macros')
+    assert f'{NO_PAGES} page(s) rendered in batch' in entry.title
+    with open(os.path.join(p.project_dir, 'stats.json')) as f:
+        stats = json.load(f)
+    assert stats['max_in_flight'] == 2 * NO_PAGES
@@ -0,0 +1,606 @@
+"""
+Testing the caches of the macros engine
+
+(C) Laurent Franceschetti 2025
+"""
+
+import os
+
+from jinja2 import Environment
+
+from mkdocs_macros.cache import (
+    TemplateCache, clear_template_cache, fingerprint
+)
+
+
+# ----------------------
+# Compiled templates
+# ----------------------
+
+SOURCE = "Hello {{ name }}!"
+
+def test_template_cache_memory():
+    "The same content is compiled only once"
+    clear_template_cache()
+    env = Environment()
+    cache = TemplateCache(env, {})
+    assert cache.from_string(SOURCE).render(name='world') == 'Hello world!'
+    assert cache.misses == 1
+    # a new environment (e.g. rebuild) reuses the code
+    env = Environment()
+    env.globals['name'] = 'globe'
+    cache = TemplateCache(env, {})
+    assert cache.from_string(SOURCE).render() == 'Hello globe!'
+    assert cache.misses == 0
+    assert cache.hits == 1
+
+
+def test_template_cache_settings():
+    "A change of markers invalidates the cache"
+    clear_template_cache()
+    cache = TemplateCache(Environment(), {})
+    cache.from_string(SOURCE)
+    settings = {'variable_start_string': '<<',
+                'variable_end_string': '>>'}
+    cache = TemplateCache(Environment(**settings), settings)
+    assert cache.from_string(SOURCE).render(name='world') == SOURCE
+    assert cache.misses == 1
+
+
+def test_template_cache_disk(tmp_path):
+    "The compiled code survives the process, through the disk"
+    clear_template_cache()
+    cache_dir = str(tmp_path)
+    cache = TemplateCache(Environment(), {}, cache_dir=cache_dir)
+    cache.from_string(SOURCE)
+    assert cache.misses == 1
+    assert os.listdir(cache_dir)
+    # simulate a new process
+    clear_template_cache()
+    cache = TemplateCache(Environment(), {}, cache_dir=cache_dir)
+    assert cache.from_string(SOURCE).render(name='world') == 'Hello world!'
+    assert cache.misses == 0
+    assert cache.disk_hits == 1
+
+
+def test_template_cache_prune(tmp_path):
+    "The files of the compiled code that were least used are removed"
+    clear_template_cache()
+    cache_dir = str(tmp_path)
+    cache = TemplateCache(Environment(), {}, cache_dir=cache_dir)
+    for no in range(3):
+        cache.from_string(SOURCE + str(no))
+    sizes = [os.path.getsize(os.path.join(cache_dir, name))
+             for name in os.listdir(cache_dir)]
+    assert len(sizes) == 3
+    # another settings fingerprint (the previous files are stale):
+    settings = {'variable_start_string': '[['}
+    cache = TemplateCache(Environment(**settings), settings,
+                          cache_dir=cache_dir, max_size=max(sizes) * 2)
+    cache.from_string(SOURCE)
+    cache.prune()
+    assert len(os.listdir(cache_dir)) == 2
+    # the file of the template in use is kept:
+    clear_template_cache()
+    cache.from_string(SOURCE)
+    assert cache.disk_hits == 1
+
+
+# ----------------------
+# Rendered pages (on disk)
+# ----------------------
+import pytest
+from mkdocs_macros.cache import OutputCache
+
+@pytest.mark.parametrize('compression', ['none', 'zlib', 'lzma'])
+def test_output_cache(tmp_path, compression):
+    "Objects are kept from one instance to the next"
+    cache = OutputCache(str(tmp_path), max_size=10000,
+                        compression=compression)
+    cache.set('foo', {'output': 'Hello' * 10})
+    cache.flush()
+    cache = OutputCache(str(tmp_path), max_size=10000,
+                        compression=compression)
+    assert cache.get('foo') == {'output': 'Hello' * 10}
+    assert cache.get('bar') is None
+
+
+def test_output_cache_eviction(tmp_path):
+    "The least recently used entries are evicted first"
+    data = os.urandom(400)
+    cache = OutputCache(str(tmp_path), max_size=1000, compression='none')
+    for name in ('a', 'b', 'c'):
+        cache.set(name, data)
+    # use 'a' again
+    assert cache.get('a') == data
+    cache.set('d', data)
+    cache.flush()
+    assert cache.size <= 1000
+    assert cache.get('b') is None
+    assert cache.get('a') == data
+    assert cache.get('d') == data
+
+
+def test_output_cache_compression(tmp_path):
+    "Wrong compression"
+    with pytest.raises(ValueError):
+        OutputCache(str(tmp_path), max_size=1000, compression='foo')
+
+
+# ----------------------
+# Rendered pages, from one build to the next
+# ----------------------
+import shutil
+from .fixture import MacrosDocProject
+
+CACHE_PROJECT = os.path.join('_temp', 'cache')
+
+def build_cached(title: str) -> MacrosDocProject:
+    "Build the project (new object, to get a fresh log)"
+    p = MacrosDocProject(CACHE_PROJECT)
+    p.build(strict=True)
+    assert p.success
+    entry = p.find_entry('Incremental rendering:', source='macros')
+    assert title in entry.title
+    return p
+
+def test_build_with_cache():
+    "Second build: the pages are reused"
+    p = MacrosDocProject(CACHE_PROJECT, new=True)
+    p.clear()
+    shutil.rmtree(os.path.join(p.project_dir, '.cache'), ignore_errors=True)
+    p.make_config(site_name='Cache', content="extra:\n  price: 50\n",
+                  plugins=['search', 'test',
+                           {'macros': {'cache_dir': '.cache/macros',
+                                       'incremental': True}}])
+    p.add_source_page('index.md', "# Home\n\nPrice is {{ price }}.")
+    p.add_source_page('other.md', "# Other\n\n{{ 2 + 2 }}")
+    build_cached('0 page(s) reused, 2 rendered')
+    p = build_cached('2 page(s) reused, 0 rendered')
+    assert p.get_page('index').find_text('Price is 50')
+    # change of source
+    p.add_source_page('other.md', "# Other\n\n{{ 2 + 3 }}")
+    p = build_cached('1 page(s) reused, 1 rendered')
+    assert p.get_page('other').find_text('5')
+
+
+TOTAL_MODULE = """
+def define_env(env):
+    @env.macro
+    def total(n):
+        return env.variables['unit_price'] * n
+"""
+
+def test_build_cache_variables():
+    "A macro that reads env.variables: the pages are rendered again"
+    p = MacrosDocProject(CACHE_PROJECT, new=True)
+    p.clear()
+    shutil.rmtree(os.path.join(p.project_dir, '.cache'), ignore_errors=True)
+    plugins = ['search', 'test', {'macros': {'cache_dir': '.cache/macros',
+                                             'incremental': True}}]
+    p.make_config(site_name='Cache', content="extra:\n  unit_price: 10\n",
+                  plugins=plugins)
+    p.add_file('main.py', TOTAL_MODULE)
+    p.add_source_page('index.md', "Total {{ total(3) }}")
+    build_cached('0 page(s) reused, 1 rendered')
+    build_cached('1 page(s) reused, 0 rendered')
+    p.make_config(site_name='Cache', content="extra:\n  unit_price: 20\n",
+                  plugins=plugins)
+    p = build_cached('0 page(s) reused, 1 rendered')
+    assert p.get_page('index').find_text('Total 60')
+    # disabled:
+    plugins[2]['macros']['incremental'] = False
+    p.make_config(site_name='Cache', content="extra:\n  unit_price: 20\n",
+                  plugins=plugins)
+    p = MacrosDocProject(CACHE_PROJECT)
+    p.build(strict=True)
+    assert p.success
+    assert p.find_entry('Incremental rendering:', source='macros') is None
+
+
+def test_build_cache_always_changed():
+    "Pages that use now() or objects without a stable repr are not reused"
+    p = MacrosDocProject(CACHE_PROJECT, new=True)
+    p.clear()
+    shutil.rmtree(os.path.join(p.project_dir, '.cache'), ignore_errors=True)
+    p.make_config(site_name='Cache', content="extra:\n  price: 50\n",
+                  plugins=['search', 'test',
+                           {'macros': {'cache_dir': '.cache/macros',
+                                       'incremental': True}}])
+    p.add_source_page('index.md', "Price is {{ price }}.")
+    p.add_source_page('time.md', "Time {{ now().microsecond }}")
+    p.add_source_page('files.md', "There are {{ files | list | length }} files")
+    p = build_cached('0 page(s) reused, 3 rendered')
+    text = p.get_page('files').find_text(r'There are \d+ files')
+    count = int(text.split()[2])
+    p.add_source_page('new.md', "New page")
+    p = build_cached('1 page(s) reused, 3 rendered')
+    assert p.get_page('files').find_text(f'There are {count + 1} files')
+
+
+def test_fingerprint_opaque():
+    "An object with the default repr is always considered as changed"
+    class Item(object):
+        pass
+    item = Item()
+    assert fingerprint(item) != fingerprint(item)
+    assert fingerprint({'a': [1, 2]}) == fingerprint({'a': [1, 2]})
+
+
+def test_fingerprint_closure():
+    "The data that a macro closes over is part of its fingerprint"
+    def make_macro(data, plugin):
+        def price(name):
+            return plugin, data[name]
+        return price
+    plugin = object()
+    before = fingerprint(make_macro({'apple': 1}, plugin))
+    assert fingerprint(make_macro({'apple': 1}, plugin)) == before
+    assert fingerprint(make_macro({'apple': 2}, plugin)) != before
+
+
+# ----------------------
+# Results of macros
+# ----------------------
+from mkdocs_macros.cache import memoize
+
+def test_memoize():
+    "Results are kept, including for unhashable arguments"
+    calls = []
+    def double(x):
+        calls.append(x)
+        return x * 2
+    func = memoize(double, True)
+    assert func(2) == 4
+    assert func(2) == 4
+    assert func([1]) == [1, 1]
+    assert func([1]) == [1, 1]
+    assert calls == [2, [1]]
+    assert func.memo.stats() == '2 hit(s), 2 miss(es)'
+
+
+def test_memoize_distinct_objects():
+    "Distinct objects with the same repr are different arguments"
+    class Item(object):
+        def __init__(self, v):
+            self.v = v
+    func = memoize(lambda items: [i.v for i in items], True)
+    assert func([Item(1)]) == [1]
+    assert func([Item(2)]) == [2]
+    func = memoize(lambda d: d['a'].v, True)
+    assert func({'a': Item(3)}) == 3
+    assert func({'a': Item(4)}) == 4
+    # equal containers are the same arguments:
+    item = Item(5)
+    assert func({'a': item}) == func({'a': item}) == 5
+    assert func.memo.hits == 1
+    # not hashable: not memoized
+    class Unhashable(Item):
+        __hash__ = None
+    func = memoize(lambda x: x.v, True)
+    assert func(Unhashable(6)) == 6
+    assert func(Unhashable(7)) == 7
+    assert func.memo.hits == func.memo.misses == 0
+
+def test_memoize_lru():
+    "The least recently used entries are evicted"
+    func = memoize(lambda x: x, 2)
+    for x in (1, 2, 1, 3):
+        func(x)
+    assert func.memo.misses == 3
+    func(1)
+    assert func.memo.misses == 3
+    func(2)
+    assert func.memo.misses == 4
+
+
+def test_memoize_ttl():
+    "The entries expire"
+    func = memoize(lambda x: x, {'ttl': 0})
+    func(1)
+    func(1)
+    assert func.memo.hits == 0
+    with pytest.raises(ValueError):
+        memoize(lambda x: x, 'foo')
+
+
+MEMO_MODULE = '''
+def define_env(env):
+    "Macro and filter with a cache"
+
+    @env.macro(cache=True)
+    def version_table(versions):
+        return ', '.join(versions)
+
+    @env.filter(cache={'size': 10})
+    def shout(s):
+        return s.upper()
+'''
+
+def test_build_memoized():
+    "The statistics of the caches are in the log"
+    p = MacrosDocProject(os.path.join('_temp', 'memo'), new=True)
+    p.clear()
+    p.make_config(site_name='Memo', content="extra:\n  versions: [a, b]\n",
+                  plugins=['search', 'test', 'macros'])
+    p.add_file('main.py', MEMO_MODULE)
+    for name in ('one', 'two', 'three'):
+        p.add_source_page(f'{name}.md',
+                          "{{ version_table(versions) | shout }}")
+    p.build(strict=True)
+    assert p.success
+    assert p.get_page('two').find_text('A, B')
+    entry = p.find_entry("Cache of macro 'version_table'", source='macros')
+    assert '2 hit(s), 1 miss(es)' in entry.title
+    entry = p.find_entry("Cache of filter 'shout'", source='macros')
+    assert '2 hit(s), 1 miss(es)' in entry.title
+
+
+# ----------------------
+# YAML files
+# ----------------------
+from mkdocs_macros import data
+from mkdocs_macros.cache import LRUCache
+from mkdocs_macros.data import load_yaml_files
+
+def test_yaml_cache(tmp_path, monkeypatch):
+    "The parsed files are kept in memory and on disk"
+    monkeypatch.setattr(data, '_YAML_CACHE', LRUCache())
+    filenames = []
+    for name in ('a', 'b'):
+        filename = str(tmp_path / f'{name}.yml')
+        with open(filename, 'w') as f:
+            f.write(f"name: {name}\nitems: [1, 2]\n")
+        filenames.append(filename)
+    store = OutputCache(str(tmp_path / 'yaml'), max_size=100000)
+    r = load_yaml_files(filenames, store=store)
+    assert r[filenames[0]][0] == {'name': 'a', 'items': [1, 2]}
+    assert [origin for _, _, origin in r.values()] == ['parsed', 'parsed']
+    r = load_yaml_files(filenames, store=store)
+    assert [origin for _, _, origin in r.values()] == ['memory', 'memory']
+    monkeypatch.setattr(data, '_YAML_CACHE', LRUCache())
+    r = load_yaml_files(filenames, store=store)
+    assert [origin for _, _, origin in r.values()] == ['disk', 'disk']
+    # modified file:
+    with open(filenames[1], 'w') as f:
+        f.write("name: modified\n")
+    r = load_yaml_files(filenames, store=store)
+    assert r[filenames[1]][0] == {'name': 'modified'}
+    assert r[filenames[1]][2] == 'parsed'
+
+
+def test_yaml_parallel(tmp_path, monkeypatch):
+    "Large files are parsed by several processes"
+    monkeypatch.setattr(data, '_YAML_CACHE', LRUCache())
+    monkeypatch.setattr(data, 'PARALLEL_MIN_SIZE', 0)
+    monkeypatch.setattr(data, 'available_cpus', lambda: 2)
+    filenames = []
+    for no in range(3):
+        filename = str(tmp_path / f'{no}.yml')
+        with open(filename, 'w') as f:
+            f.write(f"index: {no}\n")
+        filenames.append(filename)
+    r = load_yaml_files(filenames)
+    assert [r[filename][0]['index'] for filename in filenames] == [0, 1, 2]
+
+
+def test_yaml_parallel_fallback(tmp_path, monkeypatch):
+    "If the processes cannot be started, the files are parsed serially"
+    import concurrent.futures
+    from concurrent.futures.process import BrokenProcessPool
+    def broken_pool(*args, **kwargs):
+        raise BrokenProcessPool("cannot spawn")
+    monkeypatch.setattr(concurrent.futures, 'ProcessPoolExecutor',
+                        broken_pool)
+    filenames = []
+    for no in range(2):
+        filename = str(tmp_path / f'{no}.yml')
+        with open(filename, 'w') as f:
+            f.write(f"index: {no}\n")
+        filenames.append(filename)
+    r = data.parse_yaml_files(filenames)
+    assert [r[filename][0]['index'] for filename in filenames] == [0, 1]
+
+
+def test_build_yaml():
+    "The load time of each file is in the log"
+    p = MacrosDocProject(os.path.join('_temp', 'yaml'), new=True)
+    p.clear()
+    p.make_config(site_name='Yaml', plugins=['search', 'test',
+                  {'macros': {'include_yaml': ['a.yml', {'b': 'b.yml'}]}}])
+    p.add_file('a.yml', "x: 1\nshared: {one: 1}\n")
+    p.add_file('b.yml', "y: 2\n")
+    p.add_source_page('index.md', "# Home\n\n{{ x }}-{{ b.y }}")
+    p.build(strict=True)
+    assert p.success
+    assert p.get_page('index').find_text('1-2')
+    entry = p.find_entry('Loading yaml file:', source='macros')
+    assert ' s, ' in entry.title
+
+
+from mkdocs_macros.data import index_yaml, LazyYaml, SUBTREES
+
+LARGE_YAML = """\
+products:
+  - name: Widget
+    price: 10
+  - {name: Gadget, price: 20}
+notes: |
+  Some text
+  on two lines
+'élan': 3
+regions:
+  europe:
+    countries: [fr, de]
+"""
+
+def test_lazy_yaml(tmp_path):
+    "The subtrees are loaded when accessed"
+    filename = str(tmp_path / 'large.yml')
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(LARGE_YAML)
+    index = index_yaml(filename)
+    assert list(index) == ['products', 'notes', 'élan', 'regions']
+    mount = LazyYaml(filename, index)
+    SUBTREES.hits = SUBTREES.misses = 0
+    assert mount.regions == {'europe': {'countries': ['fr', 'de']}}
+    assert mount['products'][1]['name'] == 'Gadget'
+    assert mount['regions']['europe']['countries'] == ['fr', 'de']
+    assert (SUBTREES.hits, SUBTREES.misses) == (1, 2)
+    assert dict(mount) == data.yaml.safe_load(LARGE_YAML)
+    # anchors and non-mappings cannot be loaded by parts:
+    for content in ("a: &x 1\nb: *x\n", "- 1\n- 2\n"):
+        with open(filename, 'w') as f:
+            f.write(content)
+        assert index_yaml(filename) is None
+
+
+def test_build_lazy_yaml():
+    "The mounted file is used like a dictionary"
+    p = MacrosDocProject(os.path.join('_temp', 'lazy_yaml'), new=True)
+    p.clear()
+    p.make_config(site_name='Lazy', plugins=['search', 'test',
+                  {'macros': {'include_yaml': [{'catalog': 'large.yml'}],
+                              'lazy_yaml': 10}}])
+    p.add_file('large.yml', LARGE_YAML)
+    p.add_source_page('index.md',
+                      "# Home\n\n{{ catalog.products[0].name }}, "
+                      "{{ catalog.regions.europe.countries | join('/') }}")
+    p.build(strict=True)
+    assert p.success
+    assert p.get_page('index').find_text('Widget, fr/de')
+    entry = p.find_entry('Mounting yaml file:', source='macros')
+    assert '4 key(s)' in entry.title
+    entry = p.find_entry('Lazy yaml subtrees:', source='macros')
+    assert '2 miss(es)' in entry.title
+
+
+# ----------------------
+# Precompiled includes
+# ----------------------
+from jinja2 import FileSystemLoader, TemplateSyntaxError
+from mkdocs_macros.precompile import IncludeLoader, precompile
+
+def test_precompile(tmp_path):
+    "Only the modified templates are compiled again"
+    include_dir = tmp_path / 'include'
+    include_dir.mkdir()
+    (include_dir / 'a.md').write_text("A{{ x }}")
+    (include_dir / 'b.md').write_text("B{% include 'a.md' %}")
+    compiled_dir = str(tmp_path / 'compiled')
+
+    def new_env():
+        env = Environment()
+        env.loader = IncludeLoader(FileSystemLoader(str(include_dir)),
+                                   compiled_dir)
+        return env
+
+    assert precompile(new_env(), str(include_dir), compiled_dir) == (2, 0)
+    env = new_env()
+    assert precompile(env, str(include_dir), compiled_dir) == (0, 0)
+    template = env.get_template('b.md')
+    # loaded from the module:
+    assert template.filename.startswith(compiled_dir)
+    assert template.render(x=1) == 'BA1'
+    assert env.loader.get_source(env, 'a.md')[0] == 'A{{ x }}'
+    # modified, removed, and syntax error:
+    (include_dir / 'a.md').write_text("New A{{ x }}, longer")
+    (include_dir / 'b.md').unlink()
+    (include_dir / 'c.md').write_text("{% if %}")
+    env = new_env()
+    assert precompile(env, str(include_dir), compiled_dir) == (2, 1)
+    assert env.get_template('a.md').render(x=2) == 'New A2, longer'
+    with pytest.raises(TemplateSyntaxError):
+        env.get_template('c.md')
+
+
+def test_build_precompiled():
+    "The includes are precompiled in the cache directory"
+    p = MacrosDocProject(os.path.join('_temp', 'precompile'), new=True)
+    p.clear()
+    shutil.rmtree(os.path.join(p.project_dir, '.cache'), ignore_errors=True)
+    p.make_config(site_name='Precompile', plugins=['search', 'test',
+                  {'macros': {'cache_dir': '.cache/macros',
+                              'include_dir': 'include',
+                              'precompile_includes': True}}])
+    p.add_file('include/note.md', "Note: {{ price }}")
+    p.add_file('include/macros.j2',
+               "{% macro shout(s) %}{{ s | upper }}{% endmacro %}")
+    p.add_source_page('index.md',
+                      "---\nprice: 5\n---\n# Home\n\n{% include 'note.md' %}\n\n"
+                      "{% import 'macros.j2' as m %}{{ m.shout('hi') }}")
+    for title in ('2 compiled', '0 compiled'):
+        p = MacrosDocProject(os.path.join('_temp', 'precompile'))
+        p.build(strict=True)
+        assert p.success
+        entry = p.find_entry('Precompiled includes:', source='macros')
+        assert title in entry.title
+    page = p.get_page('index')
+    assert page.find_text('Note: 5')
+    assert page.find_text('HI')
+
+
+# ----------------------
+# Memory
+# ----------------------
+from mkdocs_macros.cache import sizeof
+
+def test_lru_cache_budget():
+    "The least recently used entries are evicted, by size"
+    value = 'x' * 1000
+    cache = LRUCache(max_bytes=(sizeof('a') + sizeof(value)) * 3)
+    for key in 'abc':
+        cache[key] = value
+    assert len(cache) == 3
+    cache['a']
+    cache['d'] = value
+    assert list(cache.keys()) == ['c', 'a', 'd']
+    assert cache.evictions == 1
+    assert cache.nbytes == 3 * (sizeof('a') + sizeof(value))
+    # a value larger than the budget is not kept (the others are):
+    cache['e'] = value * 4
+    assert list(cache.keys()) == ['c', 'a', 'd']
+    assert cache.rejected == 1
+    # with a known size, the value is not walked:
+    cache.set('f', value, size=10)
+    assert list(cache.keys()) == ['a', 'd', 'f']
+    # a smaller budget:
+    cache.max_bytes = 1
+    cache.shrink()
+    assert len(cache) == 0
+    cache.clear()
+    assert cache.nbytes == 0
+
+
+def test_sizeof_limit():
+    "The size of a large value can be estimated cheaply"
+    value = [{'n': n} for n in range(1000)]
+    assert sizeof(value, limit=10) < sizeof(value)
+
+
+def test_memoize_budget():
+    "The results of macros are also bounded in size"
+    func = memoize(lambda n: 'x' * n, {'max_bytes': 10000})
+    for n in range(20):
+        func(n * 1000)
+    assert func.memo.nbytes <= 20000
+    assert len(func.memo) < 20
+
+
+def test_build_memory_report():
+    "The memory used is reported after the build"
+    p = MacrosDocProject(os.path.join('_temp', 'memory'), new=True)
+    p.clear()
+    p.make_config(site_name='Memory', content="extra:\n  versions: [a, b]\n",
+                  plugins=['search', 'test',
+                           {'macros': {'memory_report': True,
+                                       'cache_memory': 1}}])
+    p.add_file('main.py', MEMO_MODULE)
+    p.add_source_page('index.md', "{{ version_table(versions) | shout }}")
+    p.build(strict=True)
+    assert p.success
+    entry = p.find_entry('Memory used:', source='macros')
+    for name in ('variables', 'templates', "macro 'version_table'",
+                 'allocated (tracemalloc)'):
+        assert name in entry.payload
+    assert '1.0 MB' in entry.payload
@@ -0,0 +1,103 @@
+"""
+Testing the parallel pre-rendering of pages (`parallel` parameter)
+"""
+
+import os
+
+from .fixture import MacrosDocProject
+
+
+DIR_NAME = '_temp'
+NO_PAGES = 6
+
+CONFIG = """
+         extra:
+             unit_price: 50
+         """
+
+MODULE = '''
+from mkdocs_macros import parallel_safe
+
+def define_env(env):
+    "Variables, macros and filters"
+
+    @env.macro
+    def price(unit_price, no):
+        "Calculate price"
+        return unit_price * no
+
+@parallel_safe
+def on_post_page_macros(env):
+    "Add a footer"
+    env.markdown += "\\n\\nFooter of " + env.page.file.src_path
+'''
+
+# same, without declaring the hook as safe:
+UNSAFE_MODULE = MODULE.replace('@parallel_safe\n', '')
+
+PAGE = """
+       # Page {no}
+
+       The total cost is {{{{ price(unit_price, {no}) }}}} euros.
+       """
+
+
+def make_project(name: str, module: str) -> MacrosDocProject:
+    "Make a project with several pages, rendered in parallel"
+    path = os.path.join(DIR_NAME, name)
+    p = MacrosDocProject(path, new=True)
+    p.clear()
+    p.make_config(site_name=name, content=CONFIG,
+                  plugins=['search', 'test', {'macros': {'parallel': 2}}])
+    p.add_file('main.py', module)
+    for no in range(NO_PAGES):
+        p.add_source_page(f"page{no}.md", PAGE.format(no=no))
+    p.build(strict=True)
+    assert p.success
+    return p
+
+
+def test_parallel():
+    "Pages are rendered by the workers"
+    p = make_project('parallel', MODULE)
+    for no in range(NO_PAGES):
+        page = p.get_page(f'page{no}')
+        assert page.find_text(f'{50 * no} euros')
+        assert page.find_text(f'Footer of page{no}.md')
+    entry = p.find_entry('Parallel rendering:', source='macros')
+    assert entry, "No trace of parallel rendering"
+    assert f'{NO_PAGES} page(s) rendered by 2 workers' in entry.title
+
+
+def test_parallel_unsafe_hook():
+    "Hooks not declared as safe: serial rendering"
+    p = make_project('parallel_unsafe', UNSAFE_MODULE)
+    page = p.get_page('page3')
+    assert page.find_text('150 euros')
+    assert page.find_text('Footer of page3.md')
+    assert p.find_entry('Parallel rendering disabled', source='macros')
+
+
+def test_parallel_stats():
+    "The statistics of the workers are reported; the caches are not written"
+    path = os.path.join(DIR_NAME, 'parallel_stats')
+    p = MacrosDocProject(path, new=True)
+    p.clear()
+    p.make_config(site_name='Stats', content=CONFIG,
+                  plugins=['search', 'test',
+                           {'macros': {'parallel': 2,
+                                       'cache_dir': '.cache/macros'}}])
+    p.add_file('main.py', MODULE)
+    for no in range(NO_PAGES):
+        p.add_source_page(f"page{no}.md", PAGE.format(no=no))
+    for no in range(2):
+        p.add_source_page(f"plain{no}.md", f"# Plain {no}\n\nNo macros.")
+    p.build(strict=True)
+    assert p.success
+    entry = p.find_entry('Parallel rendering:', source='macros')
+    assert f'{NO_PAGES + 2} page(s) rendered by 2 workers' in entry.title
+    entry = p.find_entry('Pages without Jinja2 markers', source='macros')
+    assert entry.title.endswith(': 2')
+    # the compiled pages were not written by the workers:
+    templates = os.path.join(p.project_dir, '.cache', 'macros', 'templates')
+    assert not os.listdir(templates)
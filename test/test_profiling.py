@@ -0,0 +1,152 @@
+"""
+Testing the profiling of macros and filters (`profile` parameter)
+"""
+
+import os
+import json
+import time
+import tempfile
+
+from mkdocs_macros.profiling import Profiler
+from .fixture import MacrosDocProject
+
+
+def test_profiler():
+    "Calls, total and self time, slowest page"
+    page = ['a.md']
+    profiler = Profiler(lambda: page[0])
+
+    def inner():
+        time.sleep(0.02)
+    inner = profiler.wrap('macro', 'inner', inner)
+
+    def outer(n):
+        for _ in range(n):
+            inner()
+    outer = profiler.wrap('macro', 'outer', outer)
+
+    outer(1)
+    page[0] = 'b.md'
+    outer(2)
+    report = {item['name']: item for item in profiler.report()}
+    assert list(report) == ['outer', 'inner']
+    assert report['inner']['calls'] == 3
+    assert report['outer']['self'] < report['outer']['total'] / 2
+    assert report['outer']['slowest_page'] == 'b.md'
+    assert 'outer (macro)' in profiler.table()
+
+
+MODULE = '''
+import time
+
+def define_env(env):
+    "Macros and filter"
+
+    @env.macro
+    def slow(x):
+        time.sleep(0.01)
+        return x
+
+    @env.filter
+    def shout(s):
+        return s.upper()
+'''
+
+def test_profile_project():
+    "The report is written"
+    p = MacrosDocProject(os.path.join('_temp', 'profile'), new=True)
+    p.clear()
+    p.make_config(site_name='Profile',
+                  plugins=['search', 'test', {'macros': {'profile': True}}])
+    p.add_file('main.py', MODULE)
+    p.add_source_page('index.md', "{{ slow('hello') | shout }}")
+    p.add_source_page('other.md', "{{ slow('a') }} {{ slow('b') }}")
+    old_report = os.path.join(p.project_dir, 'macros_profile.json')
+    if os.path.exists(old_report):
+        os.remove(old_report)
+    p.build(strict=True)
+    assert p.success
+    assert p.get_page('index').find_text('HELLO')
+    assert p.find_entry('Profile of macros and filters', source='macros')
+    # no cache directory:
+    filename = os.path.join(tempfile.gettempdir(), 'macros_profile.json')
+    assert not os.path.exists(old_report)
+    with open(filename) as f:
+        report = {item['name']: item for item in json.load(f)}
+    assert report['slow']['calls'] == 3
+    assert report['slow']['slowest_page'] == 'other.md'
+    assert report['shout']['category'] == 'filter'
+
+
+# ----------------------
+# Timing of pages
+# ----------------------
+from mkdocs_macros.profiling import PageTimer, percentile
+
+def test_percentile():
+    "Nearest rank"
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([3.0], 90) == 3.0
+    assert percentile([], 50) == 0.0
+
+
+def test_page_timer():
+    "The phases of each page are recorded"
+    timer = PageTimer()
+    for page, delay in (('a.md', 0.0), ('b.md', 0.02)):
+        timer.start(page)
+        timer.lap('pre_hooks')
+        time.sleep(delay)
+        timer.lap('render')
+        timer.lap('title')
+        timer.lap('post_hooks')
+    report = timer.report()
+    assert [row['page'] for row in report['pages']] == ['b.md', 'a.md']
+    assert report['pages'][0]['render'] >= 0.02
+    assert report['percentiles']['total']['p100'] == report['pages'][0]['total']
+    assert timer.table(1).count('\n') == 1
+
+
+PAGE_MODULE = '''
+import time
+
+def define_env(env):
+    "Slow macro"
+
+    @env.macro
+    def slow(x):
+        time.sleep(x)
+        return x
+
+def on_post_page_macros(env):
+    "Footer"
+    env.markdown += "\\n\\nFooter"
+'''
+
+def test_page_timing_project():
+    "The report is written, with the slowest pages"
+    p = MacrosDocProject(os.path.join('_temp', 'page_timing'), new=True)
+    p.clear()
+    p.make_config(site_name='Page timing',
+                  plugins=['search', 'test',
+                           {'macros': {'page_timing': 1,
+                                       'cache_dir': '.cache/macros'}}])
+    p.add_file('main.py', PAGE_MODULE)
+    p.add_source_page('index.md', "{{ slow(0) }}")
+    p.add_source_page('other.md', "{{ slow(0.05) }}")
+    p.build(strict=True)
+    assert p.success
+    entry = p.find_entry('Slowest pages', source='macros')
+    assert 'other.md' in entry.payload
+    assert 'index.md' not in entry.payload
+    with open(os.path.join(p.project_dir, '.cache', 'macros',
+                           'macros_page_timing.json')) as f:
+        report = json.load(f)
+    slowest = report['pages'][0]
+    assert slowest['page'] == 'other.md'
+    assert slowest['render'] >= 0.05
+    assert set(report['percentiles']['render']) == {'p50', 'p90', 'p99',
+                                                    'p100'}
@@ -0,0 +1,208 @@
+"""
+Testing the data sources (`data_sources` parameter)
+"""
+
+import os
+import json
+
+import pytest
+
+from mkdocs_macros.sources import Database, source_spec, convert
+from .fixture import MacrosDocProject
+
+
+PRODUCTS_CSV = """name,category,price
+Widget,tools,10
+Gadget,toys,20.5
+Gizmo,tools,
+"""
+
+REGIONS = [{'name': 'Europe', 'countries': ['fr', 'de']},
+           {'name': 'Asia', 'code': 'AS'}]
+
+
+def write_sources(path) -> dict:
+    "Write the files, and return the declaration of the sources"
+    (path / 'products.csv').write_text(PRODUCTS_CSV)
+    (path / 'regions.json').write_text(json.dumps(REGIONS))
+    return {'products': {'file': 'products.csv',
+                         'indexes': ['category', ['category', 'price']]},
+            'regions': 'regions.json'}
+
+
+def test_source_spec():
+    "Declarations of sources"
+    assert source_spec('a', 'data/a.yml') == {
+        'file': 'data/a.yml', 'indexes': [], 'format': 'yaml'}
+    with pytest.raises(ValueError):
+        source_spec('a', 'data/a.txt')
+    with pytest.raises(ValueError):
+        source_spec('a', {'indexes': ['x']})
+
+
+def test_convert():
+    "Only the values written as numbers are converted"
+    assert convert('10') == 10
+    assert convert('-20.5') == -20.5
+    assert convert('0') == 0
+    assert convert('') is None
+    # zip codes, identifiers and other strings:
+    for value in ('00501', '0123', '1_000', 'nan', 'Infinity', '1e3',
+                  ' 12', '+5', '12.', '98765432109876543210'):
+        assert convert(value) == value
+
+
+def test_database(tmp_path):
+    "The sources are loaded once, and queried"
+    sources = write_sources(tmp_path)
+    database = Database(str(tmp_path / 'cache' / 'data.sqlite'))
+    loaded = database.update(sources, str(tmp_path))
+    assert loaded['products'][0] == 3
+    assert loaded['regions'][0] == 2
+    result = database.query("SELECT name, price FROM products "
+                            "WHERE category = :category ORDER BY name",
+                            {'category': 'tools'})
+    # can be iterated more than once:
+    for _ in range(2):
+        assert list(result) == [{'name': 'Gizmo', 'price': None},
+                                {'name': 'Widget', 'price': 10}]
+    row = database.query("SELECT * FROM regions WHERE code IS NULL",
+                         {}).first()
+    assert json.loads(row['countries']) == ['fr', 'de']
+    # the indexes are used:
+    plan = database.query("EXPLAIN QUERY PLAN SELECT * FROM products "
+                          "WHERE category = 'toys'", {}).all()
+    assert 'INDEX' in str(plan)
+    version = database.version
+    database.close()
+
+    # same files: nothing is loaded again
+    database = Database(str(tmp_path / 'cache' / 'data.sqlite'))
+    loaded = database.update(sources, str(tmp_path))
+    assert loaded['products'][0] is None
+    assert database.version == version
+    # read only (e.g. in a worker process):
+    reader = Database(str(tmp_path / 'cache' / 'data.sqlite'),
+                      read_only=True)
+    assert reader.version == version
+    assert reader.query("SELECT count(*) AS n FROM products",
+                        {}).first()['n'] == 3
+    reader.close()
+    # one source modified, one removed:
+    (tmp_path / 'products.csv').write_text("name,price\nFoo,1\n")
+    del sources['regions']
+    loaded = database.update(sources, str(tmp_path))
+    assert loaded == {'products': (1, loaded['products'][1])}
+    assert database.version != version
+    assert database.query("SELECT count(*) AS n FROM sqlite_master "
+                          "WHERE name = 'regions'", {}).first()['n'] == 0
+
+
+def test_database_read_only_path(tmp_path):
+    "A database can be read in a directory whose name has URI characters"
+    directory = tmp_path / 'data #1?' / '50%'
+    directory.mkdir(parents=True)
+    filename = str(directory / 'data.sqlite')
+    database = Database(filename)
+    database.connection.execute("CREATE TABLE items (name TEXT)")
+    database.connection.execute("INSERT INTO items VALUES ('a')")
+    database.connection.commit()
+    database.close()
+    reader = Database(filename, read_only=True)
+    assert reader.query("SELECT count(*) AS n FROM items",
+                        {}).first()['n'] == 1
+    reader.close()
+
+
+def test_query_project():
+    "The query() macro"
+    p = MacrosDocProject(os.path.join('_temp', 'sources'), new=True)
+    p.clear()
+    p.make_config(site_name='Sources', plugins=['search', 'test',
+                  {'macros': {'data_sources': {
+                      'products': {'file': 'products.csv',
+                                   'indexes': ['category']}}}}])
+    p.add_file('products.csv', PRODUCTS_CSV)
+    p.add_source_page('index.md',
+        "# Home\n\n"
+        "{% for row in query('SELECT * FROM products WHERE "
+        "category = :cat ORDER BY name', cat='tools') %}"
+        "{{ row.name }};{% endfor %}\n\n"
+        "Total: {{ query('SELECT sum(price) AS total "
+        "FROM products').first().total }}")
+    p.build(strict=True)
+    assert p.success
+    page = p.get_page('index')
+    assert page.find_text('Gizmo;Widget;')
+    assert page.find_text('Total: 30.5')
+    entry = p.find_entry("Data source 'products'", source='macros')
+    assert '3 row(s) loaded' in entry.title
+
+
+# ----------------------
+# Streaming of rows
+# ----------------------
+from mkdocs_macros.sources import Rows
+
+EVENTS_CSV = '''name,category,price
+Widget,tools,10
+"Multi
+line",toys,20.5
+Gizmo,tools,
+"Big ""tool""",tools,3
+'''
+
+def test_rows_csv(tmp_path):
+    "Rows of a CSV file, with projection and conditions"
+    filename = str(tmp_path / 'events.csv')
+    with open(filename, 'w', newline='') as f:
+        f.write(EVENTS_CSV)
+    rows = Rows(filename)
+    assert [row['name'] for row in rows] == ['Widget', 'Multi\nline',
+                                            'Gizmo', 'Big "tool"']
+    # again:
+    assert len(list(rows)) == 4
+    rows = Rows(filename, columns=['name'],
+                where={'category': 'tools', 'price': ['>', 5]})
+    assert list(rows) == [{'name': 'Widget'}]
+    rows = Rows(filename, where={'category': ['in', ['toys']]})
+    assert rows.first() == {'name': 'Multi\nline', 'category': 'toys',
+                            'price': 20.5}
+    assert len(list(Rows(filename, limit=2))) == 2
+    with pytest.raises(ValueError):
+        Rows(filename, where={'price': ['~', 2]})
+
+
+def test_rows_jsonl(tmp_path):
+    "Rows of a JSON Lines file; also as a data source"
+    filename = str(tmp_path / 'events.jsonl')
+    with open(filename, 'w') as f:
+        for no in range(100):
+            f.write(json.dumps({'no': no, 'kind': 'even' if no % 2 else 'odd',
+                                'tags': ['a']}) + '\n')
+    rows = Rows(filename, columns=['no'], where={'kind': 'odd',
+                                                 'no': ['<', 10]})
+    assert [row['no'] for row in rows] == [0, 2, 4, 6, 8]
+    database = Database()
+    database.update({'events': 'events.jsonl'}, str(tmp_path))
+    assert database.query("SELECT count(*) AS n FROM events "
+                          "WHERE kind = 'odd'", {}).first()['n'] == 50
+
+
+def test_rows_project():
+    "The rows() macro"
+    p = MacrosDocProject(os.path.join('_temp', 'rows'), new=True)
+    p.clear()
+    p.make_config(site_name='Rows', plugins=['search', 'test',
+                  {'macros': {'data_sources': {'events': 'events.csv'}}}])
+    p.add_file('events.csv', EVENTS_CSV)
+    p.add_source_page('index.md',
+        "# Home\n\n"
+        "{% for row in rows('events', columns=['name'], "
+        "where={'category': 'tools'}) %}{{ row.name }};{% endfor %}\n\n"
+        "{{ rows('events.csv', limit=1).first().price }}")
+    p.build(strict=True)
+    assert p.success
+    page = p.get_page('index')
+    assert page.find_text('Widget;Gizmo;Big "tool";')
+    assert page.find_text('10')
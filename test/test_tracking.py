@@ -0,0 +1,205 @@
+"""
+Testing the incremental rendering of pages (mkdocs serve)
+"""
+
+from types import SimpleNamespace
+
+from jinja2 import Environment, DictLoader
+
+from mkdocs_macros.tracking import (
+    DependencyTracker, TrackingContext, uncacheable
+)
+
+
+SOURCE = "{{ greeting }}, {% include 'name.md' %} ({{ price(3) }})"
+
+
+def make_page(src_path: str = 'index.md', meta: dict = None):
+    "Minimal page object"
+    return SimpleNamespace(file=SimpleNamespace(src_path=src_path),
+                           meta=meta or {})
+
+
+def build(tracker, variables: dict, templates: dict, factor: int = 2):
+    "Simulate a build, and return the rendering function"
+    env = Environment(loader=DictLoader(templates))
+    env.context_class = TrackingContext
+    def price(x):
+        return x * factor
+    env.globals['price'] = price
+    tracker.new_build(env, variables, env_key='')
+    def render(markdown):
+        return env.from_string(markdown).render(**variables)
+    return render
+
+
+def test_reuse():
+    "Pages are reused unless a dependency changed"
+    tracker = DependencyTracker()
+    variables = {'greeting': 'Hello', 'other': 1}
+    templates = {'name.md': 'Joe'}
+    page = make_page()
+    render = build(tracker, variables, templates)
+    assert tracker.render(page, SOURCE, render) == 'Hello, Joe (6)'
+    assert tracker.rendered == 1
+
+    # unrelated change
+    variables = {'greeting': 'Hello', 'other': 2}
+    render = build(tracker, variables, templates)
+    assert tracker.render(page, SOURCE, render) == 'Hello, Joe (6)'
+    assert tracker.reused == 1
+
+    # change of variable
+    variables = {'greeting': 'Hi', 'other': 2}
+    render = build(tracker, variables, templates)
+    assert tracker.render(page, SOURCE, render) == 'Hi, Joe (6)'
+    assert tracker.rendered == 1
+
+    # change of include
+    templates = {'name.md': 'Jane'}
+    render = build(tracker, variables, templates)
+    assert tracker.render(page, SOURCE, render) == 'Hi, Jane (6)'
+    assert tracker.rendered == 1
+
+    # change of macro
+    render = build(tracker, variables, templates, factor=3)
+    assert tracker.render(page, SOURCE, render) == 'Hi, Jane (9)'
+    assert tracker.rendered == 1
+
+    # change of metadata
+    page.meta = {'title': 'New'}
+    render = build(tracker, variables, templates, factor=3)
+    tracker.render(page, SOURCE, render)
+    assert tracker.rendered == 1
+
+
+def test_variables_per_page():
+    "A variable set for each page (e.g. by a hook) is checked for each page"
+    tracker = DependencyTracker()
+    variables = {}
+    pages = {'a.md': 1, 'b.md': 2}
+    render = build(tracker, variables, {})
+    for _ in range(2):
+        tracker.new_build(tracker.env, variables, env_key='')
+        for src_path, pos in pages.items():
+            variables['pos'] = pos
+            assert tracker.render(make_page(src_path), "Position {{ pos }}",
+                                  render) == 'Position %s' % pos
+    assert tracker.reused == 2
+    pages['b.md'] = 3
+    tracker.new_build(tracker.env, variables, env_key='')
+    for src_path, pos in pages.items():
+        variables['pos'] = pos
+        assert tracker.render(make_page(src_path), "Position {{ pos }}",
+                              render) == 'Position %s' % pos
+    assert (tracker.reused, tracker.rendered) == (1, 1)
+
+
+def test_uncacheable():
+    "A page in error is always rendered again"
+    tracker = DependencyTracker()
+    variables = {'greeting': 'Hello'}
+    page = make_page()
+    for _ in range(2):
+        render = build(tracker, variables, {'name.md': 'Joe'})
+        def render_error(markdown):
+            uncacheable()
+            return render(markdown)
+        tracker.render(page, SOURCE, render_error)
+        assert tracker.rendered == 1
+
+
+# ----------------------
+# Warm restart (mkdocs serve)
+# ----------------------
+import os
+import shutil
+from mkdocs.config import load_config
+from mkdocs_macros.git_index import _INDEXES
+from .fixture import MacrosDocProject
+
+MAIN_WARM = """
+NAME = '%s'
+
+def define_env(env):
+    env.variables['counter'] = 0
+
+    @env.macro
+    def greet():
+        return 'Hello ' + NAME
+
+    @env.macro
+    def bump():
+        env.variables['counter'] += 1
+        return env.variables['counter']
+"""
+
+def test_warm_restart(monkeypatch):
+    "The environment is reused, unless a file that defines it changed"
+    p = MacrosDocProject(os.path.join('_temp', 'warm'), new=True)
+    p.clear()
+    shutil.rmtree(os.path.join(p.project_dir, '.cache'), ignore_errors=True)
+    p.make_config(site_name='Warm',
+                  plugins=[{'macros': {'include_yaml': ['data.yml'],
+                                       'include_dir': 'include',
+                                       'cache_dir': '.cache',
+                                       'precompile_includes': True}}])
+    p.add_file('main.py', MAIN_WARM % 'A')
+    p.add_file('data.yml', 'price: 1\n')
+    p.add_file('include/version.md', 'Version A')
+    # the include directory is relative to the current directory:
+    monkeypatch.chdir(p.project_dir)
+    p.add_source_page('index.md', "Hello")
+    config = load_config(os.path.join(p.project_dir, 'mkdocs.yml'))
+    plugin = config.plugins['macros']
+    loads = []
+    load_modules = plugin._load_modules
+    def counted():
+        loads.append(1)
+        load_modules()
+    monkeypatch.setattr(plugin, '_load_modules', counted)
+
+    def serve_build() -> str:
+        "Simulate a build of mkdocs serve"
+        plugin.on_config(config)
+        result = plugin.render_page("{{ greet() }} {{ price }}", make_page())
+        plugin.on_post_build(config)
+        return result
+
+    plugin.on_startup(command='serve', dirty=False)
+    assert serve_build() == 'Hello A 1'
+    for index in _INDEXES.values():
+        index._loaded = True
+    assert serve_build() == 'Hello A 1'
+    assert len(loads) == 1
+    # the git index is checked again for new commits:
+    assert not any(index._loaded for index in _INDEXES.values())
+    # the changes of variables are undone:
+    assert plugin.render_page("{{ bump() }}", make_page()) == '1'
+    plugin.on_post_build(config)
+    plugin.on_config(config)
+    assert plugin.render_page("{{ bump() }}", make_page()) == '1'
+    # modified include (precompiled):
+    assert plugin.render_page("{% include 'version.md' %}",
+                              make_page()) == 'Version A'
+    plugin.on_post_build(config)
+    p.add_file('include/version.md', 'Version B2')
+    plugin.on_config(config)
+    assert plugin.render_page("{% include 'version.md' %}",
+                              make_page()) == 'Version B2'
+    plugin.on_post_build(config)
+    assert len(loads) == 1
+    # modified module:
+    p.add_file('main.py', MAIN_WARM % 'Bob')
+    assert serve_build() == 'Hello Bob 1'
+    assert len(loads) == 2
+    # modified yaml file:
+    p.add_file('data.yml', 'price: 10\n')
+    assert serve_build() == 'Hello Bob 10'
+    assert serve_build() == 'Hello Bob 10'
+    assert len(loads) == 3
+    # not with mkdocs build:
+    plugin.on_startup(command='build', dirty=False)
+    serve_build()
+    serve_build()
+    assert len(loads) == 5
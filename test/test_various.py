@@ -30,3 +30,391 @@ def test_network_failure(monkeypatch):
 
     with pytest.raises(RuntimeError):
         is_on_pypi("requests", fail_silently=False)
+
+
+from mkdocs_macros import util
+from mkdocs_macros.util import find_pluglet
+
+def test_find_pluglet_offline(monkeypatch):
+    "No network access, unless required"
+    def no_network(*args, **kwargs):
+        raise AssertionError("Network access")
+    monkeypatch.setattr(util, "is_on_pypi", no_network)
+    assert find_pluglet("jinja2") == 'installed'
+    assert find_pluglet("mkdocs_macros_test") == 'installed'
+    assert find_pluglet("this_package_does_not_exist_123456") == 'unknown'
+    monkeypatch.setattr(util, "known_packages",
+                        lambda: frozenset({'mkdocs-macros-foo'}))
+    assert find_pluglet("mkdocs_macros_foo") == 'on_pypi'
+
+
+def test_known_packages():
+    "The requirements of the installed distributions are known"
+    # e.g. the pluglet for the tests of this package:
+    assert 'mkdocs-macros-test' in util.known_packages()
+    assert util.package_key('Mkdocs_Macros.Test') == 'mkdocs-macros-test'
+
+
+def test_find_pluglet_cache(tmp_path, monkeypatch):
+    "The results of PyPI are kept on disk"
+    calls = []
+    def on_pypi(source_name):
+        calls.append(source_name)
+        return source_name == 'mkdocs-macros-bar'
+    monkeypatch.setattr(util, "is_on_pypi", on_pypi)
+    cache_file = str(tmp_path / 'cache' / 'pypi.json')
+    for _ in range(2):
+        assert find_pluglet('mkdocs-macros-bar', online=True,
+                            cache_file=cache_file) == 'on_pypi'
+        assert find_pluglet('mkdocs-macros-baz', online=True,
+                            cache_file=cache_file) == 'not_found'
+    assert calls == ['mkdocs-macros-bar', 'mkdocs-macros-baz']
+    # offline, the cache is still used:
+    assert find_pluglet('mkdocs-macros-bar', cache_file=cache_file) == 'on_pypi'
+
+
+# ----------------------
+# Trace and debug
+# ----------------------
+import logging
+from mkdocs_macros.util import trace, debug, LOG
+
+def test_lazy_payload():
+    "The payload is produced only if the level is enabled"
+    calls = []
+    def payload():
+        calls.append(1)
+        return 'PAYLOAD'
+    level = LOG.level
+    try:
+        LOG.setLevel(logging.WARNING)
+        assert trace("Hello", payload=payload) is None
+        debug("Hello", payload=payload)
+        assert calls == []
+        assert 'PAYLOAD' in trace("Hello", payload=payload, level='warning')
+        LOG.setLevel(logging.DEBUG)
+        debug("Hello", payload=payload)
+        assert len(calls) == 2
+        with pytest.raises(ValueError):
+            trace("Hello", level='foo')
+    finally:
+        LOG.setLevel(level)
+
+
+# ----------------------
+# Detection of j2 markers
+# ----------------------
+from jinja2 import Environment
+from mkdocs_macros.plugin import j2_markers_regex
+
+def test_markers_default():
+    markers_re = j2_markers_regex(Environment())
+    assert not markers_re.search("# Title\n\nNo macros here { foo }.")
+    for s in ("{{ foo }}", "{% if x %}", "{# comment #}"):
+        assert markers_re.search(f"Text\n{s}\nText")
+
+def test_markers_custom():
+    env = Environment(variable_start_string='<<', variable_end_string='>>',
+                      line_statement_prefix='#!', line_comment_prefix='%%')
+    markers_re = j2_markers_regex(env)
+    assert markers_re.search("Hello << name >>")
+    assert not markers_re.search("Hello {{ name }}, #!not a statement")
+    assert markers_re.search("Hello\n   #! for x in y")
+    assert markers_re.search("Hello %% a comment")
+
+
+# ----------------------
+# Layered context
+# ----------------------
+from collections import ChainMap
+from mkdocs_macros.plugin import render_template
+
+def test_render_layered_context():
+    env = Environment()
+    env.globals['greet'] = lambda name: f"Hello {name}"
+    template = env.from_string("{% set x = 2 %}{{ greet(name) }} {{ x }} {{ y }}")
+    variables = {'name': 'world', 'y': 1}
+    meta = {'y': 3}
+    context = ChainMap({}, meta, variables, template.globals)
+    assert render_template(template, context) == "Hello world 2 3"
+    # the layers are unchanged
+    assert variables == {'name': 'world', 'y': 1}
+    assert meta == {'y': 3}
+
+
+from mkdocs_macros.plugin import render_template_stream
+
+def test_render_stream(monkeypatch):
+    "Large output, with less memory"
+    import tracemalloc
+    env = Environment()
+    template = env.from_string("{% for i in range(n) %}"
+                               "| {{ i }} | row {{ i }} |\n{% endfor %}")
+    context = ChainMap({'n': 50000}, template.globals)
+    peaks = []
+    for render in (render_template, render_template_stream):
+        tracemalloc.start()
+        result = render(template, context)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        assert result.endswith('| 49999 | row 49999 |\n')
+    assert peaks[1] < peaks[0] / 2
+    # in memory only:
+    monkeypatch.setattr(util, 'SPOOL_MAX_SIZE', 10 ** 9)
+    assert (render_template_stream(template, context) ==
+            render_template(template, context))
+
+
+# ----------------------
+# Lazy variables
+# ----------------------
+from mkdocs_macros.util import Variables
+from mkdocs_macros.context import format_value
+
+def test_lazy_variables():
+    "Lazy variables are computed once, only when accessed"
+    calls = []
+    def get_data():
+        calls.append(1)
+        return {'answer': 42}
+    variables = Variables(price=5)
+    variables.lazy('data', get_data)
+    # listed without evaluation
+    assert format_value(dict(variables.items())['data']) == '<lazy: get_data()>'
+    assert variables.is_lazy('data')
+    assert calls == []
+    # evaluated on access, through a template
+    env = Environment()
+    template = env.from_string("{{ data.answer }} {{ data.answer }}")
+    context = ChainMap({}, variables, template.globals)
+    assert render_template(template, context) == '42 42'
+    assert calls == [1]
+    assert not variables.is_lazy('data')
+    assert variables.data == {'answer': 42}
+    assert variables.get('foo') is None
+    assert calls == [1]
+
+
+# ----------------------
+# Git information
+# ----------------------
+import os
+import subprocess
+from mkdocs_macros import context as macros_context
+
+def git_commit(path, message: str):
+    "Make a commit in a repository"
+    subprocess.check_call(['git', '-c', 'user.name=Joe',
+                           '-c', 'user.email=joe@example.com',
+                           'commit', '--allow-empty', '-q', '-m', message],
+                          cwd=path)
+
+
+def test_git_info(tmp_path, monkeypatch):
+    "Git is called only if the repository changed"
+    subprocess.check_call(['git', 'init', '-q'], cwd=tmp_path)
+    git_commit(tmp_path, 'First commit')
+    monkeypatch.chdir(tmp_path)
+    info = macros_context.get_git_info()
+    assert info['status']
+    assert info['message'] == 'First commit'
+    assert info['author'] == 'Joe'
+    assert info['author_email'] == 'joe@example.com'
+    assert info['date'].year >= 2025
+    assert info['raw'].startswith('commit ' + info['commit'])
+    assert info['commit'].startswith(info['short_commit'])
+    assert os.path.samefile(info['root_dir'], tmp_path)
+    assert info['tag'] == ''
+
+    # no change: git is not called
+    def no_git(*args, **kwargs):
+        raise AssertionError("git called")
+    with monkeypatch.context() as m:
+        m.setattr(macros_context.subprocess, 'check_output', no_git)
+        assert macros_context.get_git_info() == info
+
+    # new commit, then new tag
+    git_commit(tmp_path, 'Second commit')
+    info = macros_context.get_git_info()
+    assert info['message'] == 'Second commit'
+    subprocess.check_call(['git', 'tag', 'v1.0'], cwd=tmp_path)
+    assert macros_context.get_git_info()['short_tag'] == 'v1.0'
+
+
+def test_git_info_no_repo(tmp_path, monkeypatch):
+    "Not a repository"
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('GIT_CEILING_DIRECTORIES', str(tmp_path.parent))
+    info = macros_context.get_git_info()
+    assert info['status'] is False
+    assert info['commit'] == ''
+
+
+# ----------------------
+# Git index, by file
+# ----------------------
+from mkdocs_macros.git_index import GitIndex
+from .fixture import MacrosDocProject
+
+def write_commit(path, filename: str, content: str, message: str):
+    "Write a file and commit it"
+    with open(os.path.join(path, filename), 'w') as f:
+        f.write(content)
+    subprocess.check_call(['git', 'add', filename], cwd=path)
+    git_commit(path, message)
+
+
+def test_git_index(tmp_path):
+    "One pass on the log, then only the new commits"
+    subprocess.check_call(['git', 'init', '-q'], cwd=tmp_path)
+    write_commit(tmp_path, 'a.md', 'A', 'Create a')
+    write_commit(tmp_path, 'b.md', 'B', 'Create b')
+    write_commit(tmp_path, 'a.md', 'AA', 'Update a')
+    filename = str(tmp_path / 'cache' / 'git_index.json')
+    index = GitIndex(str(tmp_path), filename)
+    info = index.get('a.md')
+    assert info['message'] == 'Update a'
+    assert info['author'] == 'Joe'
+    assert info['commits'] == 2
+    assert info['created'] <= info['date']
+    assert index.get('b.md')['commits'] == 1
+    assert index.get('c.md') is None
+    assert index.commits_read == 3
+
+    # next build: only the new commit is read
+    write_commit(tmp_path, 'b.md', 'BB', 'Update b')
+    index = GitIndex(str(tmp_path), filename)
+    info = index.get('b.md')
+    assert index.commits_read == 1
+    assert info['message'] == 'Update b'
+    assert info['commits'] == 2
+    assert index.get('a.md')['message'] == 'Update a'
+
+
+def test_git_file_info():
+    "The macro, in a project"
+    p = MacrosDocProject(os.path.join('_temp', 'git_file_info'), new=True)
+    p.clear()
+    p.make_config(site_name='Git', plugins=['search', 'test', 'macros'])
+    p.add_source_page('index.md',
+                      "Modified by {{ git_file_info().author }} "
+                      "({{ git_file_info('other.md').message }})")
+    p.add_source_page('other.md', "Other")
+    subprocess.check_call(['git', 'init', '-q'], cwd=p.project_dir)
+    subprocess.check_call(['git', 'add', '.'], cwd=p.project_dir)
+    git_commit(p.project_dir, 'Initial')
+    p.build(strict=True)
+    assert p.success
+    assert p.get_page('index').find_text(r'Modified by Joe \(Initial\)')
+
+
+# ----------------------
+# Import time
+# ----------------------
+import sys
+
+# Modules that must not be imported with the plugin (used only by some
+# macros or functions, or by options that are not enabled):
+DEFERRED_MODULES = ['requests', 'dateutil.parser', 'termcolor',
+                    'mkdocs.structure.nav',
+                    'asyncio', 'sqlite3', 'multiprocessing', 'tracemalloc',
+                    'mkdocs_macros.asynchronous', 'mkdocs_macros.sources',
+                    'mkdocs_macros.profiling']
+
+def import_times(module: str) -> dict:
+    "Import a module in a new interpreter: {module: cumulative time (s)}"
+    result = subprocess.run([sys.executable, '-X', 'importtime',
+                             '-c', 'import ' + module],
+                            capture_output=True, text=True, check=True)
+    r = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        r[name.strip()] = int(cumulative) / 1e6
+    return r
+
+def test_import_time():
+    "The plugin is imported without the heavy dependencies"
+    times = import_times('mkdocs_macros.plugin')
+    assert 'mkdocs_macros.plugin' in times
+    for module in DEFERRED_MODULES:
+        assert module not in times, f"{module} imported with the plugin"
+
+
+# ----------------------
+# Reentrant rendering
+# ----------------------
+import time
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from mkdocs.config import load_config
+
+MAIN_REENTRANT = """
+import time
+
+def define_env(env):
+    @env.macro
+    def who(delay=0.0):
+        "The title of the page, after a delay"
+        title = env.page.title
+        time.sleep(delay)
+        assert env.page.title == title
+        return title + ':' + str(len(env.markdown))
+"""
+
+def test_render_page_threads():
+    "Pages rendered concurrently, each with its own page"
+    p = MacrosDocProject(os.path.join('_temp', 'render_page'), new=True)
+    p.clear()
+    p.make_config(site_name='Reentrant', plugins=['search', 'macros'])
+    p.add_file('main.py', MAIN_REENTRANT)
+    p.add_source_page('index.md', "Hello")
+    config = load_config(os.path.join(p.project_dir, 'mkdocs.yml'))
+    plugin = config.plugins['macros']
+    plugin.on_config(config)
+
+    def render(i: int) -> str:
+        page = SimpleNamespace(title='Page %s' % i, meta={'foo': i},
+                               file=SimpleNamespace(src_path='p%s.md' % i))
+        markdown = "{{ who(0.01) }}" + ' ' * i
+        return plugin.render_page(markdown, page)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(render, range(32)))
+    for i, result in enumerate(results):
+        assert result == 'Page %s:%s' % (i, 15 + i) + ' ' * i
+    # serial use: the page-scoped state was not kept
+    with pytest.raises(AttributeError):
+        plugin.page
+    page = SimpleNamespace(title='Serial', meta={},
+                           file=SimpleNamespace(src_path='serial.md'))
+    plugin._page = page
+    plugin.variables['page'] = page
+    plugin._markdown = "{{ who() }}"
+    assert plugin.render(plugin.markdown) == 'Serial:11'
+
+
+def test_variables_after_build():
+    "The environment is still available after the build"
+    p = MacrosDocProject(os.path.join('_temp', 'after_build'), new=True)
+    p.clear()
+    p.make_config(site_name='After', content="extra:\n  price: 5\n",
+                  plugins=['search', 'macros'])
+    p.add_source_page('index.md', "Hello")
+    config = load_config(os.path.join(p.project_dir, 'mkdocs.yml'))
+    plugin = config.plugins['macros']
+    plugin.on_config(config)
+    plugin.on_post_build(config)
+    assert plugin.variables['price'] == 5
+    assert 'now' in plugin.macros
+    # registered at the next on_config():
+    plugin.register_variables({'foo': 1})
+    try:
+        assert 'foo' not in plugin.variables
+        plugin.on_config(config)
+        assert plugin.variables['foo'] == 1
+    finally:
+        # NOTE: shared by the instances
+        plugin._add_variables.pop('foo')